@@ -1,7 +1,8 @@
 import { useEffect, useMemo, useState } from "react";
 import { Link } from "react-router-dom";
 import DashboardLayout from "../layouts/DashboardLayout";
-import { fetchAnomalies, type Anomaly } from "../services/anomalies";
+import { fetchAnomalies, toAnomaly, type Anomaly } from "../services/anomalies";
+import { subscribeLive } from "../services/live";
 
 const severityTone: Record<Anomaly["severity"], string> = {
   high: "bg-red-500/10 text-red-200 ring-red-500/30",
@@ -61,8 +62,19 @@ export default function Alerts() {
 
     load();
 
+    const unsubscribe = subscribeLive({
+      anomaly: (data) => {
+        const anomaly = toAnomaly(data);
+        setAnomalies((current) =>
+          current.some((item) => item.id === anomaly.id) ? current : [anomaly, ...current]
+        );
+      },
+      resync: load,
+    });
+
     return () => {
       active = false;
+      unsubscribe();
     };
   }, []);
 
@@ -3,6 +3,7 @@ import DashboardLayout from "../layouts/DashboardLayout";
 import PlotCard from "../components/PlotCard";
 import { createPlot, fetchPlotStatus } from "../services/plots";
 import type { PlotStatus } from "../services/plots";
+import { subscribeLive } from "../services/live";
 
 export default function Dashboard() {
   const [plots, setPlots] = useState<PlotStatus[]>([]);
@@ -30,6 +31,20 @@ export default function Dashboard() {
     };
 
     load();
+
+    return subscribeLive({
+      plot_status: (data) =>
+        setPlots((current) =>
+          current.map((plot) => (plot.id === data.plot ? { ...plot, status: data.status } : plot))
+        ),
+      resync: async () => {
+        try {
+          setPlots(await fetchPlotStatus());
+        } catch {
+          setError("Failed to refresh plot status.");
+        }
+      },
+    });
   }, []);
 
   const handleRefresh = async () => {
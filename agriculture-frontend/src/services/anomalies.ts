@@ -38,18 +38,20 @@ const normalizePayload = (data: unknown): AnomalyPayload[] => {
   return [];
 };
 
+export const toAnomaly = (item: AnomalyPayload, index = 0): Anomaly => ({
+  id: typeof item.id === "number" ? item.id : index,
+  plot: typeof item.plot === "number" ? item.plot : -1,
+  metric: isMetric(item.metric) ? item.metric : "temperature",
+  value: typeof item.value === "number" && Number.isFinite(item.value) ? item.value : NaN,
+  severity: isSeverity(item.severity) ? item.severity : "low",
+  message: typeof item.message === "string" ? item.message : "",
+  recommendation: typeof item.recommendation === "string" ? item.recommendation : "",
+  created_at: typeof item.created_at === "string" ? item.created_at : "",
+});
+
 export async function fetchAnomalies(): Promise<Anomaly[]> {
   const response = await api.get<AnomalyPayload[] | PaginatedResponse>("/anomalies/");
   const items = normalizePayload(response.data);
 
-  return items.map((item, index) => ({
-    id: typeof item.id === "number" ? item.id : index,
-    plot: typeof item.plot === "number" ? item.plot : -1,
-    metric: isMetric(item.metric) ? item.metric : "temperature",
-    value: typeof item.value === "number" && Number.isFinite(item.value) ? item.value : NaN,
-    severity: isSeverity(item.severity) ? item.severity : "low",
-    message: typeof item.message === "string" ? item.message : "",
-    recommendation: typeof item.recommendation === "string" ? item.recommendation : "",
-    created_at: typeof item.created_at === "string" ? item.created_at : "",
-  }));
+  return items.map((item, index) => toAnomaly(item, index));
 }
@@ -0,0 +1,68 @@
+import type { Anomaly } from "./anomalies";
+import { getAccessToken } from "./auth";
+
+const API_URL = import.meta.env.VITE_API_URL ?? "http://127.0.0.1:8000/api";
+
+export type LivePlotStatus = {
+  plot: number;
+  status: "OK" | "WARNING" | "CRITICAL";
+  previous_status: "OK" | "WARNING" | "CRITICAL";
+  last_anomaly_at: string | null;
+  last_reading_at: string | null;
+};
+
+export type LiveReading = {
+  plot: number;
+  id: number;
+  timestamp: string;
+  soil_moisture: number;
+  air_temperature: number;
+  humidity: number;
+};
+
+export type LiveHandlers = {
+  anomaly?: (data: Partial<Anomaly>) => void;
+  plot_status?: (data: LivePlotStatus) => void;
+  reading?: (data: LiveReading) => void;
+  // Events were dropped server-side: refetch whatever the page shows.
+  resync?: () => void;
+};
+
+type LiveOptions = {
+  plots?: number[];
+  farms?: number[];
+  readings?: boolean;
+};
+
+// Subscribes to /api/live/ (server-sent events); returns an unsubscribe function.
+export function subscribeLive(handlers: LiveHandlers, options: LiveOptions = {}): () => void {
+  const token = getAccessToken();
+  if (!token || typeof EventSource === "undefined") {
+    return () => undefined;
+  }
+
+  const params = new URLSearchParams({ token });
+  if (options.plots?.length) params.set("plot", options.plots.join(","));
+  if (options.farms?.length) params.set("farm", options.farms.join(","));
+  if (options.readings) params.set("readings", "1");
+
+  const source = new EventSource(`${API_URL}/live/?${params.toString()}`);
+
+  const listen = <T,>(name: string, handler?: (data: T) => void) => {
+    if (!handler) return;
+    source.addEventListener(name, (event) => {
+      try {
+        handler(JSON.parse((event as MessageEvent).data) as T);
+      } catch {
+        // Ignore malformed events.
+      }
+    });
+  };
+
+  listen("anomaly", handlers.anomaly);
+  listen("plot_status", handlers.plot_status);
+  listen("reading", handlers.reading);
+  listen("resync", handlers.resync ? () => handlers.resync?.() : undefined);
+
+  return () => source.close();
+}
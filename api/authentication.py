@@ -0,0 +1,27 @@
+# api/authentication.py
+"""
+JWT authentication for the plain (non-DRF) async views.
+"""
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+def authenticate_jwt(request, query_param=None):
+    """
+    Active user for the request's bearer token, or None. ``query_param``
+    also accepts the token from the query string (EventSource cannot set
+    headers).
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None and query_param:
+        raw_token = request.GET.get(query_param)
+    if not raw_token:
+        return None
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
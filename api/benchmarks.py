@@ -0,0 +1,255 @@
+# api/benchmarks.py
+"""
+Query-count, latency and memory benchmarks for the API endpoints.
+
+``run_suite`` seeds datasets of increasing size (farms x plots x days of
+readings from core.dataset, with anomaly events, recommendations, rollups
+and plot status produced by the real pipeline) and, for every endpoint in
+ENDPOINTS plus ``run_batch_inference``, records:
+
+    queries   SQL statements per request
+    time_ms   median wall time over ``repeat`` requests
+    peak_kb   peak Python allocation during one request (tracemalloc)
+
+An endpoint fails when its query count at the largest dataset is above the
+count at the smallest one (an N+1), when it does not answer 2xx, or when it
+needs more queries than in a baseline report. Each
+dataset is seeded and measured inside a transaction that is rolled back,
+so the database is left as it was. Runs on SQLite or PostgreSQL with no
+other service; used by the bench_api command and api.tests.
+"""
+
+import datetime
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.dataset import generate_days, load_readings
+from core.models import AgentRecommendation, AnomalyEvent, FarmProfile, FieldPlot, SensorReading
+from core.rollups import rebuild_rollups
+from core.services import rebuild_plot_status
+from ml.models import BatchInferenceRun
+from ml.services import run_batch_inference
+
+DEFAULT_SIZES = (1, 3, 9)
+
+PLOTS_PER_FARM = 5
+DAYS_PER_SIZE = 2
+READING_INTERVAL = 1800
+BULK_READINGS = 100
+
+BENCH_USERNAME = "bench-api"
+
+# Measurements that write with bulk_create. SQLite splits those into batches
+# of at most 999 parameters, so their statement count follows the row count
+# there by design; the growth check only applies to them on other backends.
+BULK_WRITERS = {"ml.run_batch_inference"}
+
+
+class Endpoint:
+    def __init__(self, name, path, method="GET", payload=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.payload = payload
+
+    def call(self, client, ids):
+        path = self.path.format(**ids)
+        if self.method == "GET":
+            return client.get(path)
+        return client.post(path, self.payload(ids) if self.payload else None, format="json")
+
+
+def _reading_payload(ids):
+    return {"plot": ids["plot"], "soil_moisture": 35.0, "air_temperature": 21.0, "humidity": 60.0}
+
+
+def _bulk_payload(ids):
+    return [_reading_payload(ids) for _ in range(BULK_READINGS)]
+
+
+# Router endpoints of backend/urls.py; ``{...}`` fields come from seed_dataset().
+ENDPOINTS = [
+    Endpoint("api-root", "/api/"),
+    Endpoint("farms-list", "/api/farms/"),
+    Endpoint("farms-detail", "/api/farms/{farm}/"),
+    Endpoint("plots-list", "/api/plots/"),
+    Endpoint("plots-detail", "/api/plots/{plot}/"),
+    Endpoint("plots-status", "/api/plots/status/"),
+    Endpoint("plots-status-all-farms", "/api/plots/status/?scope=all"),
+    Endpoint("plots-aggregates", "/api/plots/{plot}/aggregates/?bucket=1h&from={since}&to={until}"),
+    Endpoint("sensor-readings-list", "/api/sensor-readings/"),
+    Endpoint("sensor-readings-list-all-farms", "/api/sensor-readings/?scope=all"),
+    Endpoint("sensor-readings-list-plot", "/api/sensor-readings/?plot={plot}"),
+    Endpoint("sensor-readings-list-plot-columnar", "/api/sensor-readings/?plot={plot}&layout=columnar"),
+    Endpoint("sensor-readings-detail", "/api/sensor-readings/{reading}/"),
+    Endpoint("sensor-readings-create", "/api/sensor-readings/", "POST", _reading_payload),
+    Endpoint("sensor-readings-bulk", "/api/sensor-readings/bulk/", "POST", _bulk_payload),
+    Endpoint("sensor-readings-run-inference", "/api/sensor-readings/{reading}/run-inference/", "POST"),
+    Endpoint("sensor-readings-batch-inference-progress", "/api/sensor-readings/batch-inference/{run}/"),
+    Endpoint("sensor-readings-inference-queue", "/api/sensor-readings/inference-queue/"),
+    Endpoint("anomalies-list", "/api/anomalies/"),
+    Endpoint("anomalies-list-all-farms", "/api/anomalies/?scope=all"),
+    Endpoint("anomalies-list-plot", "/api/anomalies/?plot={plot}"),
+    Endpoint("anomalies-detail", "/api/anomalies/{anomaly}/"),
+    Endpoint("recommendations-list", "/api/recommendations/"),
+    Endpoint("recommendations-detail", "/api/recommendations/{recommendation}/"),
+]
+
+
+def seed_dataset(size, seed=0):
+    """
+    ``size`` farms of PLOTS_PER_FARM plots with DAYS_PER_SIZE * size days of
+    readings, run through batch inference, rollups and plot status. The
+    first farm belongs to an admin user. Returns (admin user, ids for the
+    endpoint paths, row counts, run_batch_inference measurement).
+    """
+    users = User.objects.bulk_create(User(username=f"{BENCH_USERNAME}-{index}") for index in range(size))
+    farms = FarmProfile.objects.bulk_create(
+        FarmProfile(user=user, farm_name=f"Benchmark farm {index}", location="-",
+                    role="admin" if index == 0 else "farmer")
+        for index, user in enumerate(users)
+    )
+    plots = FieldPlot.objects.bulk_create(
+        FieldPlot(farm=farm, name=f"Plot {index}", size_hectares=1)
+        for farm in farms
+        for index in range(PLOTS_PER_FARM)
+    )
+    plot_ids = [plot.pk for plot in plots]
+
+    days = DAYS_PER_SIZE * size
+    start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(days=days)
+    for columns in generate_days(plot_ids, start, days, interval=READING_INTERVAL, seed=seed):
+        load_readings(columns)
+
+    inference = measure(lambda: run_batch_inference(
+        SensorReading.objects.filter(plot_id__in=plot_ids), chunk_size=10 ** 7,
+    ))
+    rebuild_rollups(plot_ids=plot_ids)
+    rebuild_plot_status()
+
+    first_plot = plots[0]
+    anomaly = AnomalyEvent.objects.filter(plot=first_plot).order_by("-created_at").first()
+    run = BatchInferenceRun.objects.create(plot=first_plot)
+    ids = {
+        "farm": farms[0].pk,
+        "plot": first_plot.pk,
+        "reading": SensorReading.objects.filter(plot=first_plot).values_list("pk", flat=True).first(),
+        "anomaly": anomaly.pk if anomaly else 0,
+        "recommendation": AgentRecommendation.objects.filter(anomaly=anomaly).values_list("pk", flat=True).first() or 0,
+        "run": run.pk,
+        "since": start.strftime("%Y-%m-%d"),
+        "until": (start + datetime.timedelta(days=days)).strftime("%Y-%m-%d"),
+    }
+    rows = {
+        "farms": len(farms),
+        "plots": len(plot_ids),
+        "readings": SensorReading.objects.filter(plot_id__in=plot_ids).count(),
+        "anomalies": AnomalyEvent.objects.filter(plot_id__in=plot_ids).count(),
+    }
+    return users[0], ids, rows, inference
+
+
+def measure(call, repeat=1):
+    """
+    Queries, median wall time and peak traced memory of ``call()``. The
+    first call is the measured one for queries and memory; ``repeat`` more
+    untraced calls give the timing.
+    """
+    statements = []
+
+    def count(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    # execute_wrapper rather than CaptureQueriesContext: the test client's
+    # request_started signal resets connection.queries_log mid-capture.
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(count):
+            result = call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "queries": len(statements),
+        "time_ms": round(statistics.median(timings) * 1000, 2) if timings else None,
+        "peak_kb": round(peak / 1024, 1),
+        "status": getattr(result, "status_code", None),
+    }
+
+
+def run_size(size, repeat, endpoints=None):
+    """
+    Seed one dataset and measure every endpoint against it, then roll back.
+    """
+    results = {}
+    # Measure the views, not the response cache (api.caching).
+    with transaction.atomic(), override_settings(RESPONSE_CACHE_SECONDS=0):
+        user, ids, rows, inference = seed_dataset(size)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        for endpoint in endpoints or ENDPOINTS:
+            # Warm-up: per-process caches (URL resolver, rule engine, ...).
+            endpoint.call(client, ids)
+            results[endpoint.name] = measure(lambda: endpoint.call(client, ids), repeat=repeat)
+        results["ml.run_batch_inference"] = inference
+
+        transaction.set_rollback(True)
+    return rows, results
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat=5, endpoints=None, baseline=None):
+    """
+    Measure every endpoint at every size and return the report dict. Its
+    ``failures`` list names endpoints whose query count grows with the
+    dataset, that answer non-2xx, or that need more queries than in
+    ``baseline`` (a previous report).
+    """
+    sizes = sorted(sizes)
+    report = {
+        "generated_at": timezone.now().isoformat(),
+        "database": connection.vendor,
+        "sizes": [],
+        "endpoints": {},
+        "failures": [],
+    }
+
+    for size in sizes:
+        rows, results = run_size(size, repeat, endpoints)
+        report["sizes"].append({"size": size, **rows})
+        for name, result in results.items():
+            report["endpoints"].setdefault(name, []).append({"size": size, **result})
+
+    baseline_endpoints = (baseline or {}).get("endpoints", {})
+    for name, results in report["endpoints"].items():
+        counts = [result["queries"] for result in results]
+        batched = name in BULK_WRITERS and connection.vendor == "sqlite"
+        if counts[-1] > counts[0] and not batched:
+            report["failures"].append(f"{name}: queries grow with dataset size ({counts[0]} -> {counts[-1]}).")
+        bad = [str(result["status"]) for result in results if result["status"] and not 200 <= result["status"] < 300]
+        if bad:
+            report["failures"].append(f"{name}: HTTP {', '.join(bad)}.")
+        previous = {result["size"]: result["queries"] for result in baseline_endpoints.get(name, [])}
+        for result in results:
+            before = previous.get(result["size"])
+            if before is not None and result["queries"] > before:
+                report["failures"].append(
+                    f"{name}: {result['queries']} queries at size {result['size']}, baseline {before}."
+                )
+
+    return report
@@ -0,0 +1,101 @@
+# api/caching.py
+"""
+Response cache and conditional GET for the endpoints dashboards poll:
+
+    GET /api/plots/status/
+    GET /api/anomalies/[?plot=]
+    GET /api/sensor-readings/[?plot=]
+
+A rendered JSON response is cached under an ETag derived from the user,
+the full path (query string included), the negotiated media type and the
+data version of the plot in ``?plot=`` - or of every plot without it - from
+core.versions. Writes bump those versions, so a new version means a new
+key and the old entry simply ages out.
+
+A poll whose If-None-Match (or If-Modified-Since) matches the cached entry
+gets a 304 without running the view; a repeat without validators gets the
+cached body. Either way only authentication touches the database. A 304
+is only sent while the entry is cached, which bounds staleness to
+RESPONSE_CACHE_SECONDS when versions are per process (local-memory cache).
+The browsable API is not cached; RESPONSE_CACHE_SECONDS = 0 turns the
+cache off.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from backend.db_routers import use_primary
+from core.versions import bump_plot_versions, data_version
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """
+    Viewset mixin: list() goes through cached_response(); other read-only
+    actions can call it themselves. Updates and deletes made through the
+    viewset bump the versions of the plots they touch.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def response_cache_plot(self, request):
+        """
+        Plot whose version keys this request; None means every plot.
+        """
+        return request.query_params.get("plot") or None
+
+    def cached_response(self, request, produce):
+        seconds = getattr(settings, "RESPONSE_CACHE_SECONDS", 60)
+        if seconds <= 0 or request.accepted_renderer.format != "json":
+            return produce()
+        try:
+            version = data_version(self.response_cache_plot(request))
+        except (TypeError, ValueError):
+            # Malformed ?plot=: let the view answer.
+            return produce()
+
+        etag = make_etag(request.user.pk, request.get_full_path(), request.accepted_media_type, version)
+        key = f"response:{etag}"
+        entry = cache.get(key)
+        if entry is not None:
+            body, content_type, last_modified = entry
+            response = HttpResponse(body, content_type=content_type)
+        else:
+            # Stored under the current version, so it must include the write
+            # that bumped it: read it from the primary, not a lagging replica.
+            with use_primary():
+                response = produce()
+            if response.status_code != 200:
+                return response
+            if isinstance(response, Response):
+                response = self.finalize_response(request, response)
+                response.render()
+            last_modified = int(time.time())
+            cache.set(key, (response.content, response["Content-Type"], last_modified), seconds)
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        # Browsers keep the body but revalidate on every poll.
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Authorization",))
+        return get_conditional_response(request._request, etag, last_modified, response)
+
+    def perform_update(self, serializer):
+        before = getattr(serializer.instance, "plot_id", None)
+        super().perform_update(serializer)
+        bump_plot_versions([before, getattr(serializer.instance, "plot_id", None)])
+
+    def perform_destroy(self, instance):
+        bump_plot_versions([getattr(instance, "plot_id", None)])
+        super().perform_destroy(instance)
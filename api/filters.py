@@ -0,0 +1,124 @@
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from core.models import FarmProfile, FieldPlot
+from core.services import get_user_farm
+
+
+def parse_time_param(params, name):
+    """
+    Parse an ISO-8601 datetime (or plain date) query parameter, or None.
+    """
+    raw = params.get(name)
+    if not raw:
+        return None
+
+    value = parse_datetime(raw)
+    if value is None:
+        day = parse_date(raw)
+        if day is not None:
+            value = datetime.datetime.combine(day, datetime.time.min)
+    if value is None:
+        raise ValidationError({name: "Expected an ISO-8601 datetime."})
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return value
+
+
+def parse_id_param(params, name):
+    """
+    Parse a positive integer id query parameter, or None.
+    """
+    raw = params.get(name)
+    if not raw:
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise ValidationError({name: "Expected a positive integer id."})
+    return value
+
+
+def parse_choice_param(params, name, choices):
+    """
+    Return the query parameter if it is one of ``choices``, or None.
+    """
+    raw = params.get(name)
+    if not raw:
+        return None
+    if raw not in choices:
+        raise ValidationError({name: f"Expected one of: {', '.join(choices)}."})
+    return raw
+
+
+def filter_time_window(queryset, params, field, since="since", until="until"):
+    """
+    Restrict ``queryset`` to ``since <= field < until`` from the query string.
+    """
+    start = parse_time_param(params, since)
+    end = parse_time_param(params, until)
+
+    if start is not None:
+        queryset = queryset.filter(**{f"{field}__gte": start})
+    if end is not None:
+        queryset = queryset.filter(**{f"{field}__lt": end})
+    return queryset
+
+
+def is_cross_farm(params, user):
+    """
+    Whether ``?scope=all`` asks for every farm's data; only admins may.
+    The default, ``scope=farm``, is the user's own farm.
+    """
+    scope = params.get("scope") or "farm"
+    if scope not in ("farm", "all"):
+        raise ValidationError({"scope": "Expected 'farm' or 'all'."})
+    if scope == "farm":
+        return False
+    if get_user_farm(user)[1] != "admin":
+        raise PermissionDenied("Only admins can read across farms.")
+    return True
+
+
+def scope_to_farm(queryset, params, user, lookup):
+    """
+    Restrict ``queryset`` to the user's farm through ``lookup`` (the path to
+    the farm id, e.g. "plot__farm_id"), unless an admin asked for every farm.
+    """
+    if is_cross_farm(params, user):
+        return queryset
+    farm_id = get_user_farm(user)[0]
+    if farm_id is None:
+        return queryset.none()
+    return queryset.filter(**{lookup: farm_id})
+
+
+def writable_farms(user):
+    """
+    Farms ``user`` may attach rows to: their own, or any farm for admins.
+    """
+    farm_id, role = get_user_farm(user)
+    if role == "admin":
+        return FarmProfile.objects.all()
+    if farm_id is None:
+        return FarmProfile.objects.none()
+    return FarmProfile.objects.filter(pk=farm_id)
+
+
+def writable_plots(user):
+    """
+    Plots ``user`` may write readings to or run inference on: their farm's,
+    or any plot for admins.
+    """
+    farm_id, role = get_user_farm(user)
+    if role == "admin":
+        return FieldPlot.objects.all()
+    if farm_id is None:
+        return FieldPlot.objects.none()
+    return FieldPlot.objects.filter(farm_id=farm_id)
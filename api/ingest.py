@@ -0,0 +1,124 @@
+# api/ingest.py
+"""
+Sensor reading ingestion shared by the DRF bulk endpoint and the async
+ingest view.
+
+    POST /api/ingest/   one reading object, an array of up to MAX_BATCH, or
+                        packed binary records (see api.packed)
+
+The async view keeps the event loop free while the request body arrives
+and the response goes out, so slow or keep-alive sensor connections no
+longer hold a worker. All database work for a request (plot validation,
+insert, rollups, inference scheduling) runs in one sync_to_async hop and
+one transaction; the async ORM would cost a thread hop per query and
+cannot run atomic blocks. Readings are only accepted for the plots of the
+sender's farm (any plot for admins).
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse
+from rest_framework.exceptions import ParseError, ValidationError
+
+from api.authentication import authenticate_jwt
+from api.filters import writable_plots
+from api.packed import CONTENT_TYPE as PACKED_CONTENT_TYPE, DEVICE_HEADER, columns_from_records, decode_records
+from api.serializers import BulkSensorReadingSerializer
+from core.ingest import insert_readings
+from core.models import SensorReading
+from core.rollups import update_rollups_columns
+from core.versions import bump_plot_versions
+from ml.inference_queue import enqueue_inference_ids, inference_is_queued, schedule_inference
+
+MAX_BATCH = 5000
+
+
+def store_readings(plot_ids, soil_moisture, air_temperature, humidity,
+                   timestamps=None, device_ids=None, sequences=None):
+    """
+    Insert validated reading columns with a fixed number of queries.
+    Inserts bypass the post_save signal, so rollups and inference are
+    handled here for the whole batch. Retries of an already stored
+    (device_id, sequence) are skipped and counted as duplicates.
+    """
+    submitted = len(plot_ids)
+    with transaction.atomic():
+        ids, plot_ids, timestamps, soil_moisture, air_temperature, humidity = insert_readings(
+            plot_ids, soil_moisture, air_temperature, humidity,
+            timestamps=timestamps, device_ids=device_ids, sequences=sequences,
+        )
+        update_rollups_columns(plot_ids, timestamps, soil_moisture, air_temperature, humidity)
+        bump_plot_versions(set(plot_ids))
+        if inference_is_queued():
+            stats = {"queued": enqueue_inference_ids(ids)}
+        else:
+            stats = schedule_inference([
+                SensorReading(id=pk, plot_id=plot_id, timestamp=timestamp,
+                              soil_moisture=soil, air_temperature=air, humidity=hum)
+                for pk, plot_id, timestamp, soil, air, hum
+                in zip(ids, plot_ids, timestamps, soil_moisture, air_temperature, humidity)
+            ])
+
+    return {
+        "created": len(ids),
+        "duplicates": submitted - len(ids),
+        "ids": ids,
+        **stats,
+    }
+
+
+def validate_and_store(items, user, max_length=MAX_BATCH):
+    serializer = BulkSensorReadingSerializer(data=items, many=True, max_length=max_length, context={"user": user})
+    serializer.is_valid(raise_exception=True)
+    items = serializer.validated_data
+    return store_readings(
+        [item["plot_id"] for item in items],
+        [item["soil_moisture"] for item in items],
+        [item["air_temperature"] for item in items],
+        [item["humidity"] for item in items],
+        timestamps=[item["timestamp"].timestamp() if "timestamp" in item else None for item in items],
+        device_ids=[item.get("device_id") for item in items],
+        sequences=[item.get("sequence") for item in items],
+    )
+
+
+def store_packed(records, user, max_length=MAX_BATCH, device_id=None):
+    return store_readings(**columns_from_records(
+        records, writable_plots(user), max_length=max_length, device_id=device_id,
+    ))
+
+
+async def ingest_readings(request):
+    """
+    POST /api/ingest/
+    """
+    if request.method != "POST":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await sync_to_async(authenticate_jwt)(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        if request.content_type == PACKED_CONTENT_TYPE:
+            records = decode_records(request.body, request.content_params.get("version"))
+            result = await sync_to_async(store_packed)(records, user, device_id=request.headers.get(DEVICE_HEADER))
+        else:
+            try:
+                payload = json.loads(request.body)
+            except ValueError:
+                return JsonResponse({"detail": "Request body must be JSON."}, status=400)
+            items = payload if isinstance(payload, list) else [payload]
+            result = await sync_to_async(validate_and_store)(items, user)
+    except (ParseError, ValidationError) as exc:
+        detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+        return JsonResponse(detail, status=exc.status_code, safe=False)
+
+    return JsonResponse(result, status=201)
+
+
+# Token-authenticated like the DRF views, which are CSRF-exempt too. Set
+# directly: csrf_exempt() only wraps async views from Django 5.0 on.
+ingest_readings.csrf_exempt = True
@@ -0,0 +1,123 @@
+# api/instrumentation.py
+"""
+Request instrumentation middleware and the Prometheus endpoint.
+
+With ``INSTRUMENTATION_ENABLED`` every request is timed by stage (see
+core.instrumentation) and answered with a Server-Timing header, e.g.
+
+    Server-Timing: db;dur=3.10;desc="6 queries", ml.inference;dur=4.82,
+                   serializer;dur=0.91, total;dur=9.40
+
+which browsers show in the network panel, and the per-endpoint histograms
+are served at
+
+    GET /metrics
+
+guarded by ``INSTRUMENTATION_METRICS_TOKEN`` (a bearer token) when set.
+With a read replica configured the scrape also reports its replay lag
+(``agri_replica_lag_seconds``, NaN when it cannot be measured).
+Disabled, the middleware removes itself from the chain and /metrics is 404.
+
+cProfile only sees the thread it was started in. Under ASGI the profiler
+of a sampled request is therefore started and stopped through
+sync_to_async, in the request's thread-sensitive executor thread: the one
+that runs its sync views and the sync_to_async work of async views.
+"""
+
+import hmac
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+from backend.db_routers import replica_configured, replica_lag_seconds
+from core.instrumentation import (
+    begin_request,
+    end_request,
+    get_profile_sampler,
+    install_sql_recorder,
+    instrumentation_enabled,
+    observe_request,
+    render_gauge,
+    render_prometheus,
+    server_timing,
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unmatched"
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not instrumentation_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections are per thread; sync_to_async threads open their own.
+        connection_created.connect(install_sql_recorder, dispatch_uid="instrumentation_sql_recorder")
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        install_sql_recorder(connection)
+        sampler = get_profile_sampler()
+        timings, token = begin_request()
+        profiler = sampler.start() if sampler.sample() else None
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+            if profiler is not None:
+                sampler.finish(profiler, request.method, request.path, time.perf_counter() - timings.started)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        sampler = get_profile_sampler()
+        timings, token = begin_request()
+        profiler = await sync_to_async(sampler.start)() if sampler.sample() else None
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+            if profiler is not None:
+                await sync_to_async(sampler.finish)(
+                    profiler, request.method, request.path, time.perf_counter() - timings.started,
+                )
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        elapsed = observe_request(timings, endpoint_name(request), request.method, response.status_code)
+        response["Server-Timing"] = server_timing(timings, elapsed)
+        return response
+
+
+def metrics(request):
+    """
+    Prometheus text exposition of this process's request histograms.
+    """
+    if not instrumentation_enabled():
+        raise Http404
+    expected = getattr(settings, "INSTRUMENTATION_METRICS_TOKEN", None)
+    if expected:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    extra = []
+    if replica_configured():
+        extra = render_gauge(
+            "agri_replica_lag_seconds", "Replay lag of the read replica.", replica_lag_seconds(),
+        )
+    return HttpResponse(render_prometheus(extra), content_type=PROMETHEUS_CONTENT_TYPE)
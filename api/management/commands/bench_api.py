@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import DEFAULT_SIZES, ENDPOINTS, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure query count, latency and peak memory of every API endpoint (and run_batch_inference) "
+        "against seeded datasets of increasing size. Fails when an endpoint's query count grows with "
+        "the dataset. Seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                            help="Comma-separated dataset sizes (farms; days of history grow with it).")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per endpoint.")
+        parser.add_argument("--only", action="append", metavar="NAME",
+                            help="Measure only this endpoint (repeatable).")
+        parser.add_argument("--output", default="benchmark-report.json", help="Where to write the JSON report.")
+        parser.add_argument("--baseline", help="Earlier report; more queries than in it is a failure.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options["sizes"].split(",")})
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        if not sizes or sizes[0] < 1 or options["repeat"] < 1:
+            raise CommandError("--sizes and --repeat must be positive.")
+
+        endpoints = ENDPOINTS
+        if options["only"]:
+            endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in options["only"]]
+            unknown = set(options["only"]) - {endpoint.name for endpoint in endpoints}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}.")
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as handle:
+                baseline = json.load(handle)
+
+        report = run_suite(sizes=sizes, repeat=options["repeat"], endpoints=endpoints, baseline=baseline)
+
+        with open(options["output"], "w") as handle:
+            json.dump(report, handle, indent=2)
+
+        for row in report["sizes"]:
+            self.stdout.write(
+                f"size {row['size']}: {row['farms']} farms, {row['plots']} plots, "
+                f"{row['readings']} readings, {row['anomalies']} anomalies"
+            )
+        header = "".join(f"{f'size {size}':>28}" for size in sizes)
+        self.stdout.write(f"{'endpoint':<42}{header}")
+        self.stdout.write(f"{'':<42}" + f"{'queries       ms  peak kB':>28}" * len(sizes))
+        for name, results in report["endpoints"].items():
+            cells = "".join(
+                f"{result['queries']:>10}{result['time_ms'] or 0:>9.1f}{result['peak_kb']:>9.0f}"
+                for result in results
+            )
+            self.stdout.write(f"{name:<42}{cells}")
+
+        self.stdout.write(f"Report written to {options['output']} ({report['database']}).")
+        if report["failures"]:
+            for failure in report["failures"]:
+                self.stderr.write(failure)
+            raise CommandError(f"{len(report['failures'])} benchmark failures.")
+        self.stdout.write(self.style.SUCCESS("No endpoint's query count grows with the dataset."))
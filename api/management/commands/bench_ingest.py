@@ -0,0 +1,168 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import AsyncClient, Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import FarmProfile, FieldPlot
+
+BENCH_USERNAME = "bench-ingest"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def make_payloads(plot_ids, requests, batch, seed=42):
+    rng = random.Random(seed)
+
+    def reading():
+        return {
+            "plot": rng.choice(plot_ids),
+            "soil_moisture": round(rng.uniform(20, 60), 2),
+            "air_temperature": round(rng.uniform(15, 35), 2),
+            "humidity": round(rng.uniform(30, 90), 2),
+        }
+
+    if batch == 1:
+        return [json.dumps(reading()) for _ in range(requests)]
+    return [json.dumps([reading() for _ in range(batch)]) for _ in range(requests)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare readings/s and p50/p95/p99 latency of the sync ingest endpoints "
+        "(WSGI, one thread per request) and the async /api/ingest/ view (ASGI), in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Requests per path.")
+        parser.add_argument("--batch", type=int, default=1,
+                            help="Readings per request; 1 compares single POSTs, more compares bulk.")
+        parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight.")
+        parser.add_argument("--plot", type=int,
+                            help="Write to this plot and keep the readings. By default throw-away "
+                                 "user/farm/plots are created and deleted afterwards.")
+        parser.add_argument("--plots", type=int, default=20,
+                            help="Throw-away plots to spread readings over (rollup rows are per plot).")
+        parser.add_argument("--only", choices=["sync", "async"], help="Run one path only.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["batch"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests, --batch and --concurrency must be positive.")
+
+        user, plot_ids, temporary = self._setup(options["plot"], options["plots"])
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        payloads = make_payloads(plot_ids, options["requests"], options["batch"])
+        sync_url = "/api/sensor-readings/" if options["batch"] == 1 else "/api/sensor-readings/bulk/"
+
+        self.stdout.write(
+            f"{options['requests']} requests x {options['batch']} readings, concurrency "
+            f"{options['concurrency']}, ML_INFERENCE_MODE={getattr(settings, 'ML_INFERENCE_MODE', 'queue')}, "
+            f"CONN_MAX_AGE={settings.DATABASES['default'].get('CONN_MAX_AGE', 0)}"
+        )
+
+        try:
+            results = {}
+            if options["only"] != "async":
+                results[f"sync  {sync_url}"] = self._run_sync(sync_url, payloads, headers, options["concurrency"])
+            if options["only"] != "sync":
+                results["async /api/ingest/"] = asyncio.run(
+                    self._run_async("/api/ingest/", payloads, headers, options["concurrency"])
+                )
+        finally:
+            if temporary:
+                # Cascades to the farm, plot, readings, events and rollups.
+                user.delete()
+
+        for name, (elapsed, latencies, failures) in results.items():
+            readings = (len(latencies) - failures) * options["batch"]
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<32} {readings / elapsed:>9.0f} readings/s  "
+                f"p50 {percentile(latencies, 0.50) * 1000:7.1f} ms  "
+                f"p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+                f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+                f"errors {failures}"
+            )
+
+    def _setup(self, plot_id, plot_count):
+        if plot_id is not None:
+            plot = FieldPlot.objects.select_related("farm__user").filter(pk=plot_id).first()
+            if plot is None:
+                raise CommandError(f"Plot {plot_id} does not exist.")
+            return plot.farm.user, [plot.pk], False
+
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create_user(BENCH_USERNAME)
+        farm = FarmProfile.objects.create(user=user, farm_name="Ingest benchmark", location="-")
+        plots = FieldPlot.objects.bulk_create(
+            FieldPlot(farm=farm, name=f"Ingest benchmark {index}", size_hectares=1)
+            for index in range(max(plot_count, 1))
+        )
+        return user, [plot.pk for plot in plots], True
+
+    def _run_sync(self, url, payloads, headers, concurrency):
+        local = threading.local()
+        latencies = []
+        failures = 0
+        lock = threading.Lock()
+
+        def post(payload):
+            nonlocal failures
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            response = client.post(url, data=payload, content_type="application/json", headers=headers)
+            # What the WSGI handler does at the end of every request.
+            close_old_connections()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 201:
+                    failures += 1
+
+        def close_thread_connections(_):
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(post, payloads))
+            elapsed = time.perf_counter() - started
+            list(executor.map(close_thread_connections, range(concurrency)))
+        return elapsed, latencies, failures
+
+    async def _run_async(self, url, payloads, headers, concurrency):
+        client = AsyncClient(raise_request_exception=False)
+        pending = iter(payloads)
+        latencies = []
+        failures = 0
+
+        async def worker():
+            nonlocal failures
+            for payload in pending:
+                started = time.perf_counter()
+                # Like the ASGI handler: each request gets its own thread for
+                # sync work, and its connection is closed when it finishes.
+                async with ThreadSensitiveContext():
+                    response = await client.post(url, data=payload, content_type="application/json", headers=headers)
+                    await sync_to_async(connections.close_all)()
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 201:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies, failures
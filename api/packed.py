@@ -0,0 +1,165 @@
+# api/packed.py
+"""
+Packed binary ingestion format for field gateways.
+
+A request body is a plain concatenation of fixed-size little-endian records,
+with no header:
+
+    offset  type     field
+    0       uint32   plot_id
+    4       float64  ts (Unix seconds, UTC; 0 = use the server's clock)
+    12      float32  soil_moisture
+    16      float32  air_temperature
+    20      float32  humidity
+
+24 bytes per reading (struct format ``<Idfff``), against ~90 bytes for the
+JSON object. Bodies are decoded with one ``np.frombuffer`` call and checked
+column-wise, so no per-field serializer runs per reading.
+
+Gateways that retry need idempotent uploads: with ``version=2`` in the
+content type each record carries a trailing uint64 sequence number (32 bytes,
+``<IdfffQ``; at most 2**63 - 1, the range of the sequence column) and the
+device id is sent once per request in the ``X-Device-Id`` header. A (device id, sequence) already stored is skipped.
+Sequenced records must carry their device timestamp (ts > 0).
+
+Accepted with ``Content-Type: application/vnd.agri.readings[; version=2]``
+by POST /api/ingest/ and POST /api/sensor-readings/bulk/.
+"""
+
+import numpy as np
+from django.utils import timezone
+from django.utils.http import parse_header_parameters
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import BaseParser
+
+from core.ingest import MAX_CLOCK_SKEW, MAX_SEQUENCE
+from core.models import SensorReading
+
+CONTENT_TYPE = "application/vnd.agri.readings"
+
+DEVICE_HEADER = "X-Device-Id"
+DEVICE_ID_MAX_LENGTH = SensorReading._meta.get_field("device_id").max_length
+
+RECORD_FORMAT = "<Idfff"
+SEQUENCED_RECORD_FORMAT = "<IdfffQ"
+
+RECORD_DTYPE = np.dtype([
+    ("plot_id", "<u4"),
+    ("ts", "<f8"),
+    ("soil_moisture", "<f4"),
+    ("air_temperature", "<f4"),
+    ("humidity", "<f4"),
+])
+
+SEQUENCED_RECORD_DTYPE = np.dtype(RECORD_DTYPE.descr + [("sequence", "<u8")])
+
+RECORD_DTYPES = {
+    "1": RECORD_DTYPE,
+    "2": SEQUENCED_RECORD_DTYPE,
+}
+
+METRICS = ("soil_moisture", "air_temperature", "humidity")
+
+
+def record_dtype(version=None):
+    """
+    Record layout for the ``version`` content type parameter (default 1).
+    """
+    dtype = RECORD_DTYPES.get(version or "1")
+    if dtype is None:
+        raise ParseError(f"Unsupported packed record version {version!r}.")
+    return dtype
+
+
+def decode_records(body, version=None):
+    """
+    View ``body`` as a structured array of records (no copy).
+    """
+    dtype = record_dtype(version)
+    if len(body) % dtype.itemsize:
+        raise ParseError(
+            f"Packed body length {len(body)} is not a multiple of the "
+            f"{dtype.itemsize}-byte record size."
+        )
+    return np.frombuffer(body, dtype=dtype)
+
+
+def encode_records(rows, version=None):
+    """
+    Pack (plot_id, ts, soil_moisture, air_temperature, humidity[, sequence])
+    tuples.
+    """
+    return np.array([tuple(row) for row in rows], dtype=record_dtype(version)).tobytes()
+
+
+def _bad_indexes(mask, limit=10):
+    return ", ".join(str(index) for index in np.flatnonzero(mask)[:limit])
+
+
+def columns_from_records(records, plots, max_length=None, device_id=None):
+    """
+    Validate decoded records column-wise and return the keyword columns
+    expected by api.ingest.store_readings. Plot ids are checked against the
+    ``plots`` queryset the sender may write to, with a single query.
+    """
+    count = len(records)
+    if not count:
+        raise ValidationError({"non_field_errors": ["Expected at least one record."]})
+    if max_length is not None and count > max_length:
+        raise ValidationError({"non_field_errors": [f"Ensure this field has no more than {max_length} elements."]})
+
+    for field in ("ts",) + METRICS:
+        invalid = ~np.isfinite(records[field])
+        if invalid.any():
+            raise ValidationError({field: f"Non-finite values in record(s) {_bad_indexes(invalid)}."})
+
+    ts = records["ts"]
+    invalid = (ts < 0) | (ts > (timezone.now() + MAX_CLOCK_SKEW).timestamp())
+    if invalid.any():
+        raise ValidationError({"ts": f"Negative or future timestamps in record(s) {_bad_indexes(invalid)}."})
+
+    sequenced = "sequence" in records.dtype.names
+    if sequenced and not device_id:
+        raise ValidationError({"device_id": f"Sequenced records need the {DEVICE_HEADER} header."})
+    if sequenced:
+        invalid = records["sequence"] > MAX_SEQUENCE
+        if invalid.any():
+            raise ValidationError({"sequence": f"Sequences above {MAX_SEQUENCE} in record(s) {_bad_indexes(invalid)}."})
+    if sequenced and (ts == 0).any():
+        # Retries must carry their original time (see validate_idempotency_key).
+        raise ValidationError({"ts": f"Sequenced records need a timestamp: record(s) {_bad_indexes(ts == 0)}."})
+    if device_id and len(device_id) > DEVICE_ID_MAX_LENGTH:
+        raise ValidationError({"device_id": f"Ensure this field has no more than {DEVICE_ID_MAX_LENGTH} characters."})
+
+    plot_ids = records["plot_id"].tolist()
+    unique_plot_ids = np.unique(records["plot_id"]).tolist()
+    known = set(plots.filter(pk__in=unique_plot_ids).values_list("pk", flat=True))
+    missing = [plot_id for plot_id in unique_plot_ids if plot_id not in known]
+    if missing:
+        raise ValidationError({"plot": f"Unknown plot id(s): {', '.join(str(pk) for pk in missing)}."})
+
+    # float32 keeps ~7 significant digits: 21.3 arrives as 21.299999237...
+    # Sensor values stay below 1000, so 4 decimals are all that is real.
+    columns = {
+        metric: np.round(records[metric].astype(np.float64), 4).tolist() for metric in METRICS
+    }
+    return {
+        "plot_ids": plot_ids,
+        **columns,
+        # ts == 0 stands for "no clock": the server stamps the reading.
+        "timestamps": [value if value > 0 else None for value in ts.tolist()],
+        "device_ids": [device_id] * count if sequenced else None,
+        "sequences": records["sequence"].tolist() if sequenced else None,
+    }
+
+
+class PackedReadingsParser(BaseParser):
+    """
+    DRF parser returning the decoded record array for CONTENT_TYPE bodies.
+    """
+
+    media_type = CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        _, params = parse_header_parameters(media_type or "")
+        return decode_records(stream.read() if stream is not None else b"", params.get("version"))
@@ -0,0 +1,127 @@
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (``view.keyset_field``, id), newest first.
+
+    The cursor encodes the last row of the previous page, so every page is an
+    index range scan (``WHERE (ts, id) < (cursor)``) and its cost depends on
+    the page size only, not on how deep into the history the client is.
+
+    A view listing a few partitions of a larger table (one farm's plots) sets
+    ``keyset_partitions = (field, values)``. Where the database can order and
+    limit each branch of a UNION (PostgreSQL), the page is then merged from
+    one range scan per value on a (field, keyset_field) index, instead of a
+    walk down the keyset_field index that skips every other partition's rows.
+    """
+
+    page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    # Above this many partitions the page is read with a single scan.
+    max_partitions = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw:
+            try:
+                page_size = int(raw)
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, value, pk):
+        payload = json.dumps([value.isoformat(), pk]).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, raw):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(raw.encode()))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def _page_queryset(self, queryset, request, view, values=None):
+        self.request = request
+        self.field = view.keyset_field
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f"-{self.field}", "-id")
+
+        raw_cursor = request.query_params.get(self.cursor_query_param)
+        if raw_cursor:
+            value, pk = self.decode_cursor(raw_cursor)
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__lt": value}) | Q(**{self.field: value, "id__lt": pk})
+            )
+
+        if values is not None:
+            queryset = queryset.values_list(*values)
+
+        partitions = getattr(view, "keyset_partitions", None)
+        if partitions is not None:
+            field, values = partitions
+            features = connections[queryset.db].features
+            if 1 < len(values) <= self.max_partitions and features.supports_slicing_ordering_in_compound:
+                branches = [queryset.filter(**{field: value})[:self.page_size + 1] for value in values]
+                queryset = branches[0].union(*branches[1:], all=True).order_by(f"-{self.field}", "-id")
+        return queryset[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        rows = list(self._page_queryset(queryset, request, view))
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.page:
+            self.last_key = (getattr(self.page[-1], self.field), self.page[-1].pk)
+        return self.page
+
+    def paginate_values(self, queryset, request, view, lookups):
+        """
+        Like paginate_queryset, but returns ``values_list(*lookups)`` tuples.
+        """
+        rows = list(self._page_queryset(queryset, request, view, values=(*lookups, view.keyset_field, "id")))
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if self.page:
+            self.last_key = self.page[-1][-2:]
+        return [row[:-2] for row in self.page]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(*self.last_key)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,69 @@
+# api/renderers.py
+"""
+JSON encoding for the read-heavy endpoints.
+
+FastJSONRenderer is a drop-in for DRF's JSONRenderer: the same JSON, but
+encoded by orjson when it is installed. Types orjson would format
+differently from DRF (datetimes, which DRF's encoder cuts to milliseconds,
+and everything it does not know) are passed back to DRF's encoder.
+
+encode_page() encodes the serializer-free list pages built by
+api.views.FastListMixin: rows of ``values_list`` tuples, either as the
+usual list of objects or, for ``?layout=columnar``, as one array per field:
+
+    {"next": ..., "results": {"id": [...], "timestamp": [...], ...}}
+
+Datetimes there are formatted the way DRF's DateTimeField does (ISO 8601,
+microseconds kept, "Z" for UTC).
+"""
+
+import json
+
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+_drf_encoder = JSONEncoder()
+_datetime_field = DateTimeField()
+
+if orjson is not None:
+    RENDER_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+    PAGE_OPTIONS = orjson.OPT_UTC_Z
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data, default=_drf_encoder.default, option=RENDER_OPTIONS)
+        except TypeError:
+            # Integers beyond 64 bits and other values orjson rejects outright.
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def _default(value):
+    if hasattr(value, "utcoffset"):
+        return _datetime_field.to_representation(value)
+    return _drf_encoder.default(value)
+
+
+def encode_page(names, rows, next_link, columnar=False):
+    """
+    JSON body of a keyset page of ``rows`` (tuples ordered like ``names``).
+    """
+    if columnar:
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        results = {name: list(column) for name, column in zip(names, columns)}
+    else:
+        results = [dict(zip(names, row)) for row in rows]
+    body = {"next": next_link, "results": results}
+
+    if orjson is not None:
+        return orjson.dumps(body, option=PAGE_OPTIONS)
+    return json.dumps(body, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
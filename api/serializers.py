@@ -1,4 +1,6 @@
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.fields import empty
 from core.models import (
     FarmProfile,
     FieldPlot,
@@ -6,14 +8,71 @@ from core.models import (
     AnomalyEvent,
     AgentRecommendation
 )
+from api.filters import writable_farms, writable_plots
+from core.ingest import MAX_CLOCK_SKEW, MAX_SEQUENCE
+from core.instrumentation import stage
+from core.services import METRIC_FIELDS, anomaly_metric, get_user_farm
+from ml.models import BatchInferenceRun
+
+
+class TimedSerializerMixin:
+    """
+    Counts validation and representation in the request's "serializer"
+    stage (see core.instrumentation).
+    """
+
+    def run_validation(self, data=empty):
+        with stage("serializer"):
+            return super().run_validation(data)
+
+    def to_representation(self, instance):
+        with stage("serializer"):
+            return super().to_representation(instance)
+
+
+class FarmScopedSerializerMixin:
+    """
+    Limits writes to the requesting user's farm: each relation in
+    ``scoped_relations`` (field name -> writable_farms or writable_plots)
+    only accepts that farm's rows, and ``admin_only_fields`` are read-only,
+    unless the user is an admin. Without a request in the context (internal
+    use) the fields are left as they are.
+    """
+
+    scoped_relations = {}
+    admin_only_fields = ()
+
+    def request_user(self):
+        request = self.context.get("request")
+        return getattr(request, "user", None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        user = self.request_user()
+        if user is None:
+            return fields
+        for name, writable in self.scoped_relations.items():
+            field = fields.get(name)
+            if field is not None and not field.read_only:
+                field.queryset = writable(user)
+        if get_user_farm(user)[1] != "admin":
+            for name in self.admin_only_fields:
+                if name in fields:
+                    fields[name].read_only = True
+        return fields
+
+
+class FarmProfileSerializer(TimedSerializerMixin, FarmScopedSerializerMixin, serializers.ModelSerializer):
+    admin_only_fields = ("user", "role")
 
-class FarmProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = FarmProfile
         fields = '__all__'
 
 
-class FieldPlotSerializer(serializers.ModelSerializer):
+class FieldPlotSerializer(TimedSerializerMixin, FarmScopedSerializerMixin, serializers.ModelSerializer):
+    scoped_relations = {"farm": writable_farms}
+
     class Meta:
         model = FieldPlot
         fields = '__all__'
@@ -22,13 +81,82 @@ class FieldPlotSerializer(serializers.ModelSerializer):
         }
 
 
-class SensorReadingSerializer(serializers.ModelSerializer):
+def validate_device_timestamp(value):
+    if value > timezone.now() + MAX_CLOCK_SKEW:
+        raise serializers.ValidationError("Timestamp is in the future.")
+    return value
+
+
+def validate_idempotency_key(attrs):
+    if (attrs.get("device_id") is None) != (attrs.get("sequence") is None):
+        raise serializers.ValidationError("device_id and sequence must be sent together.")
+    # A retry stamped by the server would get a new timestamp, which the
+    # partitioned (device_id, sequence, timestamp) key does not catch.
+    if attrs.get("device_id") is not None and attrs.get("timestamp") is None:
+        raise serializers.ValidationError({"timestamp": "Required with device_id and sequence."})
+    return attrs
+
+
+class SensorReadingSerializer(TimedSerializerMixin, FarmScopedSerializerMixin, serializers.ModelSerializer):
+    scoped_relations = {"plot": writable_plots}
+
     class Meta:
         model = SensorReading
         fields = '__all__'
 
+    def validate_timestamp(self, value):
+        return validate_device_timestamp(value)
+
+    def validate(self, attrs):
+        return validate_idempotency_key(super().validate(attrs))
+
+
+class BulkSensorReadingListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    Validates a whole batch at once: plot ids are checked with a single
+    query instead of one lookup per reading. Plots outside the farm of the
+    ``user`` in the context (api.filters.writable_plots) count as unknown.
+    """
 
-class AnomalyEventSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        plot_ids = {item["plot_id"] for item in attrs}
+        known = set(
+            writable_plots(self.context["user"]).filter(pk__in=plot_ids).values_list("pk", flat=True)
+        )
+        missing = sorted(plot_ids - known)
+        if missing:
+            raise serializers.ValidationError(
+                {"plot": f"Unknown plot id(s): {', '.join(str(pk) for pk in missing)}."}
+            )
+        return attrs
+
+
+class BulkSensorReadingSerializer(TimedSerializerMixin, serializers.Serializer):
+    plot = serializers.IntegerField()
+    soil_moisture = serializers.FloatField()
+    air_temperature = serializers.FloatField()
+    humidity = serializers.FloatField()
+    # Optional device measurement time and idempotency key.
+    timestamp = serializers.DateTimeField(required=False)
+    device_id = serializers.CharField(max_length=64, required=False)
+    sequence = serializers.IntegerField(min_value=0, max_value=MAX_SEQUENCE, required=False)
+
+    class Meta:
+        list_serializer_class = BulkSensorReadingListSerializer
+
+    def validate_timestamp(self, value):
+        return validate_device_timestamp(value)
+
+    def validate(self, attrs):
+        return validate_idempotency_key(attrs)
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        attrs["plot_id"] = attrs.pop("plot")
+        return attrs
+
+
+class AnomalyEventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     plot = serializers.PrimaryKeyRelatedField(read_only=True)
     metric = serializers.SerializerMethodField()
     value = serializers.SerializerMethodField()
@@ -49,28 +177,55 @@ class AnomalyEventSerializer(serializers.ModelSerializer):
             "value",
         ]
 
+    # List and detail querysets carry both as annotations
+    # (core.services.with_anomaly_metric); other callers fall back to the reading.
     def get_metric(self, obj):
-        a_type = (obj.anomaly_type or "").lower()
-        if "temperature" in a_type:
-            return "temperature"
-        if "humidity" in a_type:
-            return "humidity"
-        return "soil_moisture"
+        metric = getattr(obj, "metric", None)
+        return metric if metric is not None else anomaly_metric(obj.anomaly_type)
 
     def get_value(self, obj):
+        if hasattr(obj, "metric_value"):
+            return obj.metric_value
+
         reading = getattr(obj, "reading", None)
         if reading is None:
             return None
 
-        metric = self.get_metric(obj)
-        if metric == "temperature":
-            return reading.air_temperature
-        if metric == "humidity":
-            return reading.humidity
-        return reading.soil_moisture
+        return getattr(reading, METRIC_FIELDS[anomaly_metric(obj.anomaly_type)])
 
 
-class AgentRecommendationSerializer(serializers.ModelSerializer):
+class AgentRecommendationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = AgentRecommendation
         fields = '__all__'
+
+
+class BatchInferenceRunSerializer(TimedSerializerMixin, FarmScopedSerializerMixin, serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    scoped_relations = {"plot": writable_plots}
+
+    class Meta:
+        model = BatchInferenceRun
+        fields = [
+            "id",
+            "plot",
+            "status",
+            "chunk_size",
+            "progress",
+            "last_reading_id",
+            "max_reading_id",
+            "total_processed",
+            "anomalies_detected",
+            "events_created",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [field for field in fields if field not in ("plot", "chunk_size")]
+
+    def validate(self, attrs):
+        user = self.request_user()
+        if user is not None and attrs.get("plot") is None and get_user_farm(user)[1] != "admin":
+            raise serializers.ValidationError({"plot": "Only admins can run inference over every plot."})
+        return attrs
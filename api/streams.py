@@ -0,0 +1,114 @@
+# api/streams.py
+"""
+Server-sent events endpoint pushing live anomalies, plot status changes and
+(optionally) thinned readings to dashboards.
+
+    GET /api/live/?plot=1,2&farm=3&readings=1
+
+Streams are limited to the user's farm: ``plot``/``farm`` narrow it, and
+without them every plot of the farm (as of connecting) is streamed. Admins
+add ``scope=all`` to subscribe across farms, where no ``plot``/``farm``
+means every plot. Anomaly events carry the message and recommendation
+served by the admin-only /api/anomalies/, so only admins receive them;
+other members still get plot status changes. Browsers' EventSource cannot
+set headers, so the JWT access token may be passed as ``?token=``.
+
+The view is async: under ASGI (backend/asgi.py) an idle connection costs an
+asyncio task, not a worker.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException
+
+from api.authentication import authenticate_jwt
+from api.filters import is_cross_farm
+from core.live import encode, get_broker
+from core.models import FieldPlot
+from core.services import get_farm_role, get_user_farm
+
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+def parse_ids(value):
+    if not value:
+        return []
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def resolve_plot_ids(params, user):
+    """
+    Plot ids ``user`` subscribes to, or None for every plot.
+    """
+    plot_ids = set(parse_ids(params.get("plot")))
+    farm_ids = parse_ids(params.get("farm"))
+    cross_farm = is_cross_farm(params, user)
+
+    if farm_ids:
+        plot_ids.update(FieldPlot.objects.filter(farm_id__in=farm_ids).values_list("id", flat=True))
+    elif not plot_ids and cross_farm:
+        return None
+    if cross_farm:
+        return plot_ids
+
+    own = set(FieldPlot.objects.filter(farm_id=get_user_farm(user)[0]).values_list("id", flat=True))
+    return plot_ids & own if farm_ids or plot_ids else own
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {encode(data)}\n\n"
+
+
+async def event_stream(broker, subscription):
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        while True:
+            if subscription.overflowed:
+                # Messages were dropped; the client should refetch its state.
+                subscription.overflowed = False
+                yield format_event("resync", {})
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(message["event"], message)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def live_events(request):
+    """
+    GET /api/live/
+    """
+    if request.method != "GET":
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await sync_to_async(authenticate_jwt)(request, query_param="token")
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    broker = get_broker()
+    if broker is None:
+        return JsonResponse({"detail": "Live events are disabled."}, status=503)
+
+    try:
+        plot_ids = await sync_to_async(resolve_plot_ids)(request.GET, user)
+    except ValueError:
+        return JsonResponse({"detail": "'plot' and 'farm' must be comma-separated ids."}, status=400)
+    except APIException as exc:
+        return JsonResponse({"detail": exc.detail}, status=exc.status_code)
+
+    subscription = broker.subscribe(
+        plot_ids=plot_ids,
+        readings=request.GET.get("readings") in ("1", "true"),
+        anomalies=await sync_to_async(get_farm_role)(user) == "admin",
+    )
+    response = StreamingHttpResponse(event_stream(broker, subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,3 +1,1184 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import os
+import struct
+import tempfile
+import time
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+import sensor_simulator
+from api.benchmarks import ENDPOINTS, run_suite
+from api.ingest import MAX_BATCH
+from api.packed import (
+    CONTENT_TYPE as PACKED_CONTENT_TYPE,
+    RECORD_FORMAT,
+    SEQUENCED_RECORD_FORMAT,
+    decode_records,
+    encode_records,
+)
+from api.renderers import FastJSONRenderer
+from api.streams import resolve_plot_ids
+from backend.db_routers import REPLICA, request_pin, use_primary
+from core.instrumentation import HISTOGRAMS, ProfileSampler
+from core.live import LocalBroker
+from core.models import AgentRecommendation, AnomalyEvent, FarmProfile, FieldPlot, PlotStatus, SensorReading, SensorRollup
+from core.rollups import aggregate_series, pick_resolution
+from core.services import rebuild_plot_status
+from ml.batch_inference import run_to_completion
+from ml.models import BatchInferenceRun
+from ml.services import run_anomaly_inference
+
+
+def make_farm(username="farmer", role="farmer"):
+    user = User.objects.create_user(username=username, password="secret")
+    farm = FarmProfile.objects.create(user=user, farm_name=f"{username} farm", location="Test", role=role)
+    return user, farm
+
+
+def make_plots(farm, count, severity=None):
+    plots = FieldPlot.objects.bulk_create(
+        [FieldPlot(farm=farm, name=f"Plot {i}", size_hectares=1) for i in range(count)]
+    )
+    if severity:
+        readings = SensorReading.objects.bulk_create(
+            [SensorReading(plot=plot, soil_moisture=5, air_temperature=20, humidity=50) for plot in plots]
+        )
+        AnomalyEvent.objects.bulk_create(
+            [
+                AnomalyEvent(reading=reading, plot_id=reading.plot_id, anomaly_type="Soil moisture too low", severity=severity)
+                for reading in readings
+            ]
+        )
+        rebuild_plot_status()
+    return plots
+
+
+def bearer(user):
+    return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class PlotStatusQueryCountTests(TestCase):
+    """
+    Benchmark guard for GET /api/plots/status/: the number of queries must not
+    grow with the number of plots.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_status_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/plots/status/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_is_constant(self):
+        self.count_status_queries()  # fills the farm cache
+        make_plots(self.farm, 2, severity="medium")
+        small, _ = self.count_status_queries()
+
+        make_plots(self.farm, 200, severity="high")
+        large, payload = self.count_status_queries()
+
+        self.assertEqual(len(payload), 202)
+        self.assertEqual(small, large)
+
+    def test_status_reflects_latest_anomaly(self):
+        plot, quiet_plot = make_plots(self.farm, 2)
+        for values in ((5, 20, 50), (40, 50, 50)):
+            soil_moisture, air_temperature, humidity = values
+            reading = SensorReading.objects.create(
+                plot=plot, soil_moisture=soil_moisture, air_temperature=air_temperature, humidity=humidity
+            )
+            run_anomaly_inference(reading)
+
+        _, payload = self.count_status_queries()
+        statuses = {item["id"]: item["status"] for item in payload}
+
+        self.assertEqual(statuses[plot.id], "CRITICAL")
+        self.assertEqual(statuses[quiet_plot.id], "OK")
+
+    def test_rebuild_matches_incremental_status(self):
+        plot, = make_plots(self.farm, 1)
+        for soil_moisture in (5, 40, 90):
+            reading = SensorReading.objects.create(plot=plot, soil_moisture=soil_moisture, air_temperature=20, humidity=50)
+            run_anomaly_inference(reading)
+
+        incremental = PlotStatus.objects.get(plot=plot)
+        rebuild_plot_status()
+        rebuilt = PlotStatus.objects.get(plot=plot)
+
+        for field in ("severity", "last_anomaly_id", "last_reading_at", "anomaly_count", "medium_count"):
+            self.assertEqual(getattr(incremental, field), getattr(rebuilt, field), field)
+        self.assertEqual(rebuilt.anomaly_count, 2)
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class PlotStatusMaintenanceTests(TestCase):
+    """
+    PlotStatus is filled on upgrade and recounted when anomalies are
+    deleted or relabelled outside the incremental path.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm("admin", role="admin")
+        self.plot, self.other = make_plots(self.farm, 2, severity="high")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def status(self, plot):
+        return PlotStatus.objects.get(plot=plot)
+
+    def test_migration_fills_the_table(self):
+        expected = {row.plot_id: (row.severity, row.last_anomaly_id, row.anomaly_count, row.high_count)
+                    for row in PlotStatus.objects.all()}
+        PlotStatus.objects.all().delete()
+
+        migration = importlib.import_module("core.migrations.0005_plotstatus")
+        migration.fill_plot_status(apps, SimpleNamespace(connection=connection))
+
+        actual = {row.plot_id: (row.severity, row.last_anomaly_id, row.anomaly_count, row.high_count)
+                  for row in PlotStatus.objects.all()}
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual[self.plot.pk][0], "high")
+
+    def test_deleting_through_the_api_recounts(self):
+        event = AnomalyEvent.objects.get(plot=self.plot)
+        self.assertEqual(self.client.delete(f"/api/anomalies/{event.pk}/").status_code, 204)
+
+        status = self.status(self.plot)
+        self.assertEqual((status.severity, status.last_anomaly_id, status.anomaly_count, status.high_count),
+                         ("", None, 0, 0))
+        self.assertEqual(self.status(self.other).anomaly_count, 1)
+
+        reading = SensorReading.objects.get(plot=self.other)
+        self.assertEqual(self.client.delete(f"/api/sensor-readings/{reading.pk}/").status_code, 204)
+        self.assertEqual((self.status(self.other).anomaly_count, self.status(self.other).last_reading_at), (0, None))
+
+    def test_relabelling_through_the_api_recounts(self):
+        event = AnomalyEvent.objects.get(plot=self.plot)
+        response = self.client.patch(f"/api/anomalies/{event.pk}/", {"severity": "medium"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        status = self.status(self.plot)
+        self.assertEqual((status.severity, status.high_count, status.medium_count), ("medium", 0, 1))
+
+    def test_backfill_recounts_relabelled_plots(self):
+        AnomalyEvent.objects.filter(plot=self.plot).update(severity="", anomaly_type="")
+
+        call_command("backfill_anomalies", stdout=io.StringIO())
+
+        status = self.status(self.plot)
+        self.assertEqual((status.severity, status.high_count, status.medium_count), ("medium", 0, 1))
+        self.assertEqual(AnomalyEvent.objects.get(plot=self.plot).anomaly_type, "Soil moisture too low")
+
+
+class IdempotentIngestTests(TestCase):
+    """
+    Device timestamps and (device_id, sequence) keys on the bulk endpoint.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm()
+        self.plot, = make_plots(self.farm, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, items):
+        response = self.client.post("/api/sensor-readings/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def reading(self, sequence, timestamp, soil_moisture=40):
+        return {
+            "plot": self.plot.pk, "soil_moisture": soil_moisture, "air_temperature": 20, "humidity": 50,
+            "timestamp": timestamp, "device_id": "gw-1", "sequence": sequence,
+        }
+
+    def test_retries_are_skipped(self):
+        first = self.post([self.reading(1, "2026-01-01T10:00:00Z"), self.reading(2, "2026-01-01T10:01:00Z")])
+        retry = self.post([self.reading(2, "2026-01-01T10:01:00Z"), self.reading(3, "2026-01-01T10:02:00Z")])
+
+        self.assertEqual((first["created"], first["duplicates"]), (2, 0))
+        self.assertEqual((retry["created"], retry["duplicates"]), (1, 1))
+        self.assertEqual(SensorReading.objects.filter(device_id="gw-1").count(), 3)
+        self.assertEqual(
+            SensorRollup.objects.get(plot=self.plot, resolution="1d").count, 3
+        )
+
+    def test_keyed_readings_need_a_timestamp(self):
+        keyed = self.reading(1, None)
+        del keyed["timestamp"]
+        packed = encode_records([(self.plot.pk, 0, 30, 20, 50, 1)], version="2")
+
+        responses = [
+            self.client.post("/api/sensor-readings/bulk/", [keyed], format="json"),
+            self.client.post("/api/sensor-readings/", keyed, format="json"),
+            self.client.post("/api/sensor-readings/bulk/", packed, content_type=f"{PACKED_CONTENT_TYPE}; version=2",
+                             headers={"X-Device-Id": "gw-1"}),
+        ]
+
+        self.assertEqual([response.status_code for response in responses], [400] * 3)
+        self.assertIn("timestamp", responses[0].json()["0"])
+        self.assertIn("ts", responses[2].json())
+        self.assertFalse(SensorReading.objects.exists())
+
+    def test_sequences_fit_the_column(self):
+        for sequence in (99999999999999999999, 2**63):
+            response = self.client.post(
+                "/api/sensor-readings/bulk/", [self.reading(sequence, "2026-01-01T10:00:00Z")], format="json"
+            )
+            self.assertEqual(response.status_code, 400, sequence)
+        response = self.client.post(
+            "/api/sensor-readings/", self.reading(2**63, "2026-01-01T10:00:00Z"), format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        packed = encode_records([(self.plot.pk, 1.7e9, 30, 20, 50, 2**63)], version="2")
+        response = self.client.post("/api/sensor-readings/bulk/", packed,
+                                    content_type=f"{PACKED_CONTENT_TYPE}; version=2", headers={"X-Device-Id": "gw-1"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("sequence", response.json())
+
+        self.assertEqual(self.post([self.reading(2**63 - 1, "2026-01-01T10:00:00Z")])["created"], 1)
+
+    @override_settings(ML_INFERENCE_MODE="sync")
+    def test_late_anomaly_does_not_replace_newer_status(self):
+        self.post([self.reading(2, "2026-01-01T12:00:00Z", soil_moisture=5)])
+        self.post([self.reading(1, "2026-01-01T09:00:00Z", soil_moisture=90)])
+
+        status = PlotStatus.objects.get(plot=self.plot)
+        newest = SensorReading.objects.get(sequence=2)
+        self.assertEqual(status.last_anomaly.reading_id, newest.pk)
+        self.assertEqual(status.last_reading_at, newest.timestamp)
+        self.assertEqual(status.anomaly_count, 2)
+
+        rebuild_plot_status()
+        rebuilt = PlotStatus.objects.get(plot=self.plot)
+        self.assertEqual(rebuilt.last_anomaly_id, status.last_anomaly_id)
+        self.assertEqual(rebuilt.last_anomaly_at, status.last_anomaly_at)
+
+
+class PackedIngestTests(TestCase):
+    """
+    The packed binary reading format (api.packed) on both ingest endpoints.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm()
+        self.plot, = make_plots(self.farm, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, path, body, version=None, **headers):
+        content_type = PACKED_CONTENT_TYPE + (f"; version={version}" if version else "")
+        if path == "/api/ingest/":
+            return self.client.post(path, body, content_type=content_type, headers=headers, **bearer(self.user))
+        return self.client.post(path, body, content_type=content_type, headers=headers)
+
+    def test_decodes_both_layouts(self):
+        body = struct.pack(RECORD_FORMAT, 7, 1.7e9, 21.3, 30.5, 55.0) + struct.pack(RECORD_FORMAT, 8, 0, 1, 2, 3)
+        records = decode_records(body)
+        self.assertEqual(records["plot_id"].tolist(), [7, 8])
+        self.assertEqual(records["ts"].tolist(), [1.7e9, 0])
+        self.assertAlmostEqual(float(records["soil_moisture"][0]), 21.3, places=5)
+
+        body = struct.pack(SEQUENCED_RECORD_FORMAT, 7, 1.7e9, 21.3, 30.5, 55.0, 2**63 - 1)
+        records = decode_records(body, "2")
+        self.assertEqual(records["sequence"].tolist(), [2**63 - 1])
+        self.assertEqual(encode_records([(7, 1.7e9, 21.3, 30.5, 55.0, 2**63 - 1)], version="2"), body)
+
+    def test_stores_records_on_both_endpoints(self):
+        for index, path in enumerate(("/api/sensor-readings/bulk/", "/api/ingest/")):
+            ts = 1.7e9 + index
+            response = self.post(path, encode_records([(self.plot.pk, ts, 21.3, 30.5, 55.0), (self.plot.pk, 0, 1, 2, 3)]))
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(response.json()["created"], 2)
+
+            stored = SensorReading.objects.get(timestamp=datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc))
+            self.assertEqual((stored.soil_moisture, stored.air_temperature, stored.humidity), (21.3, 30.5, 55.0))
+        self.assertEqual(SensorReading.objects.count(), 4)
+
+    def test_device_header_makes_retries_idempotent(self):
+        body = encode_records([(self.plot.pk, 1.7e9, 20, 20, 50, 1), (self.plot.pk, 1.7e9 + 60, 20, 20, 50, 2)], version="2")
+        for path, created in (("/api/sensor-readings/bulk/", 2), ("/api/ingest/", 0)):
+            response = self.post(path, body, version="2", **{"X-Device-Id": "gw-7"})
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual((response.json()["created"], response.json()["duplicates"]), (created, 2 - created))
+        self.assertEqual(
+            list(SensorReading.objects.order_by("sequence").values_list("device_id", "sequence")), [("gw-7", 1), ("gw-7", 2)]
+        )
+
+        for path in ("/api/sensor-readings/bulk/", "/api/ingest/"):
+            response = self.post(path, body, version="2")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("device_id", response.json())
+
+    def test_rejects_malformed_bodies(self):
+        good = encode_records([(self.plot.pk, 1.7e9, 20, 20, 50)])
+        cases = [
+            (good[:-1], None, None),
+            (good, "3", None),
+            (b"", None, "non_field_errors"),
+            (encode_records([(self.plot.pk, 1.7e9, float("nan"), 20, 50)]), None, "soil_moisture"),
+            (encode_records([(self.plot.pk, float("inf"), 20, 20, 50)]), None, "ts"),
+            (encode_records([(self.plot.pk, 4e9, 20, 20, 50)]), None, "ts"),
+            (encode_records([(self.plot.pk + 1000, 1.7e9, 20, 20, 50)]), None, "plot"),
+        ]
+        for path in ("/api/sensor-readings/bulk/", "/api/ingest/"):
+            for body, version, field in cases:
+                response = self.post(path, body, version=version)
+                self.assertEqual(response.status_code, 400, (path, field, response.content))
+                if field:
+                    self.assertIn(field, response.json())
+        self.assertFalse(SensorReading.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class AggregateTests(TestCase):
+    """
+    Bucketed aggregates (core.rollups.aggregate_series) and the
+    /api/plots/{id}/aggregates/ endpoint.
+    """
+
+    T0 = datetime.datetime(2026, 1, 5, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.farm = make_farm()
+        self.plot, = make_plots(self.farm, 1)
+        for offset, soil_moisture in ((600, 10), (630, 20), (3000, 30), (4800, 60), (86400 + 600, 100)):
+            SensorReading.objects.create(
+                plot=self.plot, timestamp=self.at(offset), soil_moisture=soil_moisture, air_temperature=20, humidity=50,
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def at(self, seconds):
+        return self.T0 + datetime.timedelta(seconds=seconds)
+
+    def series(self, bucket_seconds, start, end):
+        resolution, series = aggregate_series(self.plot.pk, bucket_seconds, start, end)
+        return resolution, [
+            (point["bucket_start"], point["count"], point["soil_moisture"]["min"],
+             point["soil_moisture"]["max"], point["soil_moisture"]["mean"])
+            for point in series
+        ]
+
+    def test_picks_the_coarsest_dividing_resolution(self):
+        cases = {60: "1m", 900: "1m", 5400: "1m", 3600: "1h", 7200: "1h", 86400: "1d", 7 * 86400: "1d", 30: None}
+        for bucket_seconds, expected in cases.items():
+            self.assertEqual(pick_resolution(bucket_seconds), expected, bucket_seconds)
+        self.assertEqual(aggregate_series(self.plot.pk, 30, self.at(0), self.at(86400)), (None, []))
+
+    def test_merges_stored_buckets(self):
+        self.assertEqual(self.series(3600, self.at(0), self.at(2 * 86400)), ("1h", [
+            (self.at(0), 3, 10, 30, 20),
+            (self.at(3600), 1, 60, 60, 60),
+            (self.at(86400), 1, 100, 100, 100),
+        ]))
+        # Thirty minute buckets are merged from minute rollups.
+        self.assertEqual(self.series(1800, self.at(0), self.at(86400)), ("1m", [
+            (self.at(0), 2, 10, 20, 15),
+            (self.at(1800), 1, 30, 30, 30),
+            (self.at(3600), 1, 60, 60, 60),
+        ]))
+
+    def test_mean_is_weighted_by_count(self):
+        # Two hours: (10 + 20 + 30 + 60) / 4, not the mean of the hourly means (20 and 60).
+        resolution, series = self.series(7200, self.at(0), self.at(86400))
+        self.assertEqual((resolution, series), ("1h", [(self.at(0), 4, 10, 60, 30)]))
+        resolution, series = self.series(86400, self.at(0), self.at(2 * 86400))
+        self.assertEqual((resolution, series[0]), ("1d", (self.at(0), 4, 10, 60, 30)))
+
+    def test_range_bounds(self):
+        # 'from' is floored to the stored resolution, 'to' is exclusive.
+        _, series = self.series(1800, self.at(1800), self.at(86400))
+        self.assertEqual([point[0] for point in series], [self.at(1800), self.at(3600)])
+        _, series = self.series(3600, self.at(0), self.at(3600))
+        self.assertEqual([point[0] for point in series], [self.at(0)])
+        _, series = self.series(3600, self.at(1800), self.at(86400 + 1))
+        self.assertEqual([point[0] for point in series], [self.at(0), self.at(3600), self.at(86400)])
+
+    def get(self, **params):
+        return self.client.get(f"/api/plots/{self.plot.pk}/aggregates/", params)
+
+    def test_endpoint(self):
+        response = self.get(bucket="2h", **{"from": self.at(0).isoformat(), "to": self.at(86400).isoformat()})
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual((body["plot"], body["bucket"], body["resolution"]), (self.plot.pk, "2h", "1h"))
+        self.assertEqual([point["count"] for point in body["results"]], [4])
+        self.assertEqual(body["results"][0]["soil_moisture"], {"min": 10, "max": 60, "mean": 30})
+
+        response = self.get()
+        self.assertEqual((response.status_code, response.json()["resolution"]), (200, "1h"))
+
+        other_user, other_farm = make_farm("other")
+        other_plot, = make_plots(other_farm, 1)
+        self.assertEqual(self.client.get(f"/api/plots/{other_plot.pk}/aggregates/").status_code, 404)
+
+    def test_edits_and_deletes_are_rolled_up(self):
+        moved = SensorReading.objects.get(plot=self.plot, soil_moisture=60)
+        response = self.client.patch(
+            f"/api/sensor-readings/{moved.pk}/",
+            {"soil_moisture": 90, "timestamp": self.at(86400 + 4800).isoformat()}, format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        lowest = SensorReading.objects.get(plot=self.plot, soil_moisture=10)
+        self.assertEqual(self.client.delete(f"/api/sensor-readings/{lowest.pk}/").status_code, 204)
+
+        params = {"from": self.at(0).isoformat(), "to": self.at(2 * 86400).isoformat()}
+        for bucket in ("1h", "1d"):
+            results = self.get(bucket=bucket, **params).json()["results"]
+            self.assertEqual(
+                [(point["count"], point["soil_moisture"]) for point in results],
+                {
+                    "1h": [(2, {"min": 20, "max": 30, "mean": 25}), (1, {"min": 100, "max": 100, "mean": 100}),
+                           (1, {"min": 90, "max": 90, "mean": 90})],
+                    "1d": [(2, {"min": 20, "max": 30, "mean": 25}), (2, {"min": 90, "max": 100, "mean": 95})],
+                }[bucket],
+            )
+        self.assertEqual(SensorRollup.objects.filter(plot=self.plot, resolution="1m").count(), 4)
+
+    def test_endpoint_rejects_bad_parameters(self):
+        start = self.at(0).isoformat()
+        cases = [
+            ({"bucket": "30s"}, "bucket"),
+            ({"bucket": "0m"}, "bucket"),
+            ({"bucket": "hourly"}, "bucket"),
+            ({"from": "yesterday"}, "from"),
+            ({"from": start, "to": start}, "from"),
+            ({"from": self.at(86400).isoformat(), "to": start}, "from"),
+            # Four days of minute buckets is over the 5000 bucket limit.
+            ({"bucket": "1m", "from": start, "to": self.at(4 * 86400).isoformat()}, "bucket"),
+        ]
+        for params, field in cases:
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(field, response.json(), params)
+
+        response = self.get(bucket="1m", **{"from": start, "to": self.at(3 * 86400).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(point["count"] for point in response.json()["results"]), 5)
+
+
+class SensorSimulatorTests(SimpleTestCase):
+    """
+    The load generator in sensor_simulator.py, with requests stubbed out.
+    """
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(sensor_simulator, "verbose", False),
+            mock.patch.dict(sensor_simulator.plot_profiles, clear=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def take(self, count, virtual_plots=5, plot_ids=(1, 2)):
+        sensor_simulator.plot_profiles.clear()
+        readings = sensor_simulator.generate_readings(virtual_plots, list(plot_ids))
+        return [next(readings) for _ in range(count)]
+
+    def test_readings_are_reproducible(self):
+        first, second = self.take(20), self.take(20)
+        without_time = lambda readings: [reading[:1] + reading[2:] for reading in readings]
+        self.assertEqual(without_time(first), without_time(second))
+        self.assertEqual([reading[0] for reading in first[:5]], [1, 2, 1, 2, 1])
+        self.assertEqual([reading[5] for reading in first], list(range(1, 21)))
+
+        records = decode_records(sensor_simulator.pack_readings(first), "2")
+        self.assertEqual(records["sequence"].tolist(), list(range(1, 21)))
+        self.assertEqual(records["plot_id"].tolist(), [reading[0] for reading in first])
+
+    def run_load(self, *args):
+        batches = []
+
+        def send_batch(mode, batch, device_id):
+            batches.append(len(batch))
+            return SimpleNamespace(status_code=201, json=lambda: {"created": len(batch), "duplicates": 0})
+
+        options = sensor_simulator.parse_args(["--quiet", *args])
+        with mock.patch.object(sensor_simulator, "send_batch", send_batch), redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            stats = sensor_simulator.run_load(options, [1, 2])
+        return stats, batches, time.perf_counter() - started
+
+    def test_rate_control(self):
+        # Five batches at 200 readings/s are due 0.05 s apart.
+        stats, batches, elapsed = self.run_load("--mode", "bulk", "--batch", "10", "--readings", "45", "--rate", "200")
+        self.assertEqual(batches, [10, 10, 10, 10, 5])
+        self.assertEqual((stats.requests, stats.sent, stats.created, stats.failures), (5, 45, 45, 0))
+        self.assertGreaterEqual(elapsed, 0.2)
+
+        with mock.patch.object(sensor_simulator.time, "sleep") as sleep:
+            stats, batches, elapsed = self.run_load("--mode", "single", "--readings", "3", "--rate", "0")
+        self.assertEqual(batches, [1, 1, 1])
+        sleep.assert_not_called()
+
+    def test_retries(self):
+        responses = [requests.ConnectionError("refused"), SimpleNamespace(status_code=503),
+                     SimpleNamespace(status_code=201)]
+
+        def send_batch(mode, batch, device_id):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with mock.patch.object(sensor_simulator, "send_batch", send_batch):
+            response, latency, retries = sensor_simulator.send_with_retries("bulk", [], "gw", retries=1)
+            self.assertEqual((response.status_code, retries), (503, 1))
+            response, latency, retries = sensor_simulator.send_with_retries("bulk", [], "gw", retries=1)
+            self.assertEqual((response.status_code, retries), (201, 0))
+
+    def test_latency_report(self):
+        stats = sensor_simulator.LoadStats()
+        for index in range(10):
+            body = {"created": 4, "duplicates": 1}
+            stats.record("bulk", (index + 1) / 100, 5, SimpleNamespace(status_code=201, json=lambda: body), 0)
+        stats.record("bulk", 5.0, 5, SimpleNamespace(status_code=500), 2)
+        stats.record("bulk", 5.0, 5, None, 2)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            sensor_simulator.print_report(stats, 2.0, 100)
+        report = output.getvalue()
+        self.assertIn("requests   12 sent, 2 failed, 4 retries", report)
+        self.assertIn("readings   60 sent, 40 created, 10 duplicates", report)
+        self.assertIn("throughput 20 readings/s (target 100), 6.0 requests/s over 2.0 s", report)
+        self.assertIn("p50 50.0 ms  p95 100.0 ms  p99 100.0 ms  max 100.0 ms", report)
+        self.assertEqual(sensor_simulator.percentile([], 0.5), 0.0)
+
+
+class EndpointBenchmarkTests(TestCase):
+    """
+    The bench_api suite at small sizes: every endpoint answers and none
+    needs more queries on the larger dataset.
+    """
+
+    def test_query_counts_do_not_grow(self):
+        report = run_suite(sizes=(1, 2), repeat=1)
+
+        self.assertEqual(report["failures"], [])
+        self.assertEqual([row["size"] for row in report["sizes"]], [1, 2])
+        self.assertEqual(set(report["endpoints"]), {endpoint.name for endpoint in ENDPOINTS} | {"ml.run_batch_inference"})
+        self.assertFalse(SensorReading.objects.exists())
+
+    def test_baseline_regression_fails(self):
+        endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name == "plots-list"]
+        baseline = {"endpoints": {"plots-list": [{"size": 1, "queries": 0}]}}
+
+        report = run_suite(sizes=(1,), repeat=1, endpoints=endpoints, baseline=baseline)
+
+        self.assertEqual(len(report["failures"]), 1)
+        self.assertIn("baseline 0", report["failures"][0])
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, ML_INFERENCE_MODE="sync", RESPONSE_CACHE_SECONDS=0)
+class InstrumentationTests(TestCase):
+    """
+    Server-Timing headers and the /metrics histograms.
+    """
+
+    def setUp(self):
+        for histogram in HISTOGRAMS:
+            histogram.clear()
+        self.user, self.farm = make_farm()
+        self.plot, = make_plots(self.farm, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_breaks_down_stages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/sensor-readings/",
+                {"plot": self.plot.pk, "soil_moisture": 5, "air_temperature": 20, "humidity": 50},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timing)
+        for name in ("serializer", "rollups", "ml.inference", "ml.detect", "ml.rules", "ml.agent", "plot_status", "total"):
+            self.assertIn(f"{name};dur=", timing)
+
+    def test_metrics_endpoint(self):
+        SensorReading.objects.create(plot=self.plot, soil_moisture=40, air_temperature=20, humidity=50)
+        self.client.get("/api/sensor-readings/")
+        self.client.get("/api/sensor-readings/")
+
+        body = self.client.get("/metrics").content.decode()
+
+        self.assertIn(
+            'agri_request_duration_seconds_count{endpoint="sensorreading-list",method="GET",status="200"} 2', body
+        )
+        self.assertIn('agri_stage_duration_seconds_count{endpoint="sensorreading-list",stage="serializer"} 2', body)
+        self.assertIn('agri_request_queries_bucket{endpoint="sensorreading-list",method="GET",le="+Inf"} 2', body)
+
+    @override_settings(INSTRUMENTATION_METRICS_TOKEN="scrape")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape").status_code, 200)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        self.assertNotIn("Server-Timing", client.get("/api/sensor-readings/"))
+        self.assertEqual(client.get("/metrics").status_code, 404)
+
+    def test_profile_sampling_toggles_at_runtime(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rate_file = os.path.join(directory, "rate")
+            sampler = ProfileSampler(path=rate_file, directory=os.path.join(directory, "profiles"), reload_interval=0)
+            self.assertFalse(sampler.sample())
+
+            with open(rate_file, "w") as handle:
+                handle.write("1")
+            self.assertTrue(sampler.sample())
+            profiler = sampler.start()
+            sum(range(1000))
+            sampler.finish(profiler, "GET", "/api/plots/", 0.002)
+
+            self.assertEqual(len(os.listdir(sampler.directory)), 1)
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class SerializerQueryCountTests(TestCase):
+    """
+    Anomaly and recommendation lists read related data in a fixed number of
+    queries, and IsAdmin reads a cached role.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm("admin", role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_anomalies(self, count):
+        plots = make_plots(self.farm, count)
+        readings = SensorReading.objects.bulk_create(
+            [SensorReading(plot=plot, soil_moisture=5, air_temperature=38, humidity=50) for plot in plots]
+        )
+        events = AnomalyEvent.objects.bulk_create(
+            [
+                AnomalyEvent(reading=reading, plot_id=reading.plot_id, severity="high",
+                             anomaly_type="Temperature too high" if index % 2 else "Soil moisture too low")
+                for index, reading in enumerate(readings)
+            ]
+        )
+        AgentRecommendation.objects.bulk_create(
+            [AgentRecommendation(anomaly=event, recommended_action="Act", explanation_text="Why") for event in events]
+        )
+
+    def count_queries(self, path):
+        # Fresh user object, as with token authentication: nothing cached on it.
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries), response.json()
+
+    def test_list_query_counts_do_not_grow(self):
+        for path in ("/api/anomalies/", "/api/recommendations/"):
+            self.count_queries(path)  # fills the role cache
+
+        self.add_anomalies(2)
+        few = {path: self.count_queries(path)[0] for path in ("/api/anomalies/", "/api/recommendations/")}
+        self.add_anomalies(20)
+        many = {path: self.count_queries(path)[0] for path in ("/api/anomalies/", "/api/recommendations/")}
+
+        self.assertEqual(few, many)
+        # The anomaly list first reads the farm's plot ids (FarmScopedMixin).
+        self.assertEqual(many, {"/api/anomalies/": 2, "/api/recommendations/": 1})
+
+    def test_metric_and_value_come_from_annotations(self):
+        self.add_anomalies(2)
+
+        _, body = self.count_queries("/api/anomalies/")
+
+        values = {row["anomaly_type"]: (row["metric"], row["value"]) for row in body["results"]}
+        self.assertEqual(values, {
+            "Soil moisture too low": ("soil_moisture", 5),
+            "Temperature too high": ("temperature", 38),
+        })
+
+    def test_role_is_cached_until_the_profile_changes(self):
+        self.assertEqual(self.count_queries("/api/anomalies/")[0], 2)
+        self.assertEqual(self.count_queries("/api/anomalies/")[0], 1)
+
+        self.farm.role = "farmer"
+        self.farm.save()
+
+        self.assertEqual(self.client.get("/api/anomalies/").status_code, 403)
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class FastListTests(TestCase):
+    """
+    The values_list list path returns what the serializers return.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm("admin", role="admin")
+        self.plot, = make_plots(self.farm, 1)
+        start = datetime.datetime(2026, 1, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc)
+        readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=self.plot, timestamp=start + datetime.timedelta(minutes=index),
+                          soil_moisture=5 + index / 3, air_temperature=20, humidity=50,
+                          device_id="gw-1" if index % 2 else None, sequence=index if index % 2 else None)
+            for index in range(5)
+        ])
+        AnomalyEvent.objects.bulk_create([
+            AnomalyEvent(reading=reading, plot=self.plot, anomaly_type="Soil moisture too low", severity="high",
+                         message="Dry ✓")
+            for reading in readings
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_json(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_rows_match_serializer_output(self):
+        for path in ("/api/sensor-readings/?page_size=2", "/api/anomalies/?page_size=2"):
+            with self.settings(API_FAST_LISTS=False):
+                expected = self.get_json(path)
+            with self.settings(API_FAST_LISTS=True):
+                actual = self.get_json(path)
+            self.assertEqual(actual, expected)
+            self.assertEqual(list(actual["results"][0]), list(expected["results"][0]))
+
+    def test_columnar_layout_pages(self):
+        first = self.get_json(f"/api/sensor-readings/?plot={self.plot.pk}&layout=columnar&page_size=3")
+        second = self.get_json(first["next"])
+
+        self.assertEqual(first["results"]["timestamp"][0], "2026-01-01T10:04:00.123456Z")
+        self.assertEqual(len(first["results"]["id"]), 3)
+        self.assertEqual(second["results"]["sequence"], [1, None])
+        self.assertIsNone(second["next"])
+
+    def test_renderer_matches_drf(self):
+        data = {"at": datetime.datetime(2026, 1, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+                "values": [1, 2.5, None, "é"], 3: True}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+
+class ResponseCacheTests(TestCase):
+    """
+    Polled lists answer 304 (or a cached body) until a write bumps the
+    version of the plots they cover.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.farm = make_farm("admin", role="admin")
+        self.plot, self.other = make_plots(self.farm, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, path, **headers):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(path, headers=headers)
+        return response, len(queries)
+
+    def post_reading(self, plot):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/sensor-readings/",
+                {"plot": plot.pk, "soil_moisture": 30, "air_temperature": 20, "humidity": 50},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_repeat_poll_is_not_modified_without_queries(self):
+        for path in ("/api/plots/status/", "/api/anomalies/", f"/api/sensor-readings/?plot={self.plot.pk}"):
+            first, _ = self.count_queries(path)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first["Cache-Control"], "private, no-cache")
+
+            repeat, queries = self.count_queries(path, **{"If-None-Match": first["ETag"]})
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(queries, 0)
+
+            cached, queries = self.count_queries(path)
+            self.assertEqual(cached.content, first.content)
+            self.assertEqual(queries, 0)
+
+    def test_writes_invalidate_the_plots_they_touch(self):
+        plot_path = f"/api/sensor-readings/?plot={self.plot.pk}"
+        other_path = f"/api/sensor-readings/?plot={self.other.pk}"
+        etags = {path: self.client.get(path)["ETag"] for path in (plot_path, other_path, "/api/sensor-readings/")}
+
+        self.post_reading(self.plot)
+
+        for path, changed in ((plot_path, True), (other_path, False), ("/api/sensor-readings/", True)):
+            response = self.client.get(path, headers={"If-None-Match": etags[path]})
+            self.assertEqual(response.status_code, 200 if changed else 304, path)
+        self.assertEqual(len(self.client.get(plot_path).json()["results"]), 1)
+
+    def test_entries_are_per_user(self):
+        self.post_reading(self.plot)
+        first = self.client.get("/api/sensor-readings/")
+
+        other, _ = make_farm("other")
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.get("/api/sensor-readings/", headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=0)
+class FarmScopeTests(TestCase):
+    """
+    Users only see their own farm's data; admins opt into every farm.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.farmer, self.farm = make_farm()
+        self.admin, self.admin_farm = make_farm("admin", role="admin")
+        self.plot, = make_plots(self.farm, 1, severity="high")
+        self.admin_plot, = make_plots(self.admin_farm, 1, severity="high")
+        self.client = APIClient()
+
+    def get(self, user, path):
+        self.client.force_authenticate(user)
+        return self.client.get(path)
+
+    def ids(self, user, path):
+        response = self.get(user, path)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        return sorted(row["id"] for row in (body["results"] if isinstance(body, dict) else body))
+
+    def test_lists_are_scoped_to_the_users_farm(self):
+        self.assertEqual(self.ids(self.farmer, "/api/plots/"), [self.plot.pk])
+        self.assertEqual(self.ids(self.farmer, "/api/plots/status/"), [self.plot.pk])
+        self.assertEqual(self.ids(self.farmer, "/api/farms/"), [self.farm.pk])
+        readings = self.get(self.farmer, "/api/sensor-readings/").json()["results"]
+        self.assertEqual({row["plot"] for row in readings}, {self.plot.pk})
+
+        other_reading = SensorReading.objects.get(plot=self.admin_plot)
+        self.assertEqual(self.get(self.farmer, f"/api/sensor-readings/{other_reading.pk}/").status_code, 404)
+        self.assertEqual(self.get(self.farmer, f"/api/plots/{self.admin_plot.pk}/aggregates/").status_code, 404)
+
+    def test_admins_opt_into_every_farm(self):
+        anomalies = self.get(self.admin, "/api/anomalies/").json()["results"]
+        self.assertEqual({row["plot"] for row in anomalies}, {self.admin_plot.pk})
+
+        anomalies = self.get(self.admin, "/api/anomalies/?scope=all").json()["results"]
+        self.assertEqual({row["plot"] for row in anomalies}, {self.plot.pk, self.admin_plot.pk})
+        self.assertEqual(self.ids(self.admin, "/api/plots/status/?scope=all"), sorted([self.plot.pk, self.admin_plot.pk]))
+
+        self.assertEqual(self.get(self.farmer, "/api/plots/?scope=all").status_code, 403)
+        self.assertEqual(self.get(self.farmer, "/api/plots/?scope=mine").status_code, 400)
+
+    def test_bad_filters_are_rejected(self):
+        for seconds in (0, 60):
+            with self.settings(RESPONSE_CACHE_SECONDS=seconds):
+                for path in ("/api/anomalies/?plot=abc", "/api/anomalies/?plot=-1", "/api/anomalies/?severity=extreme",
+                             "/api/sensor-readings/?plot=1.5"):
+                    self.assertEqual(self.get(self.admin, path).status_code, 400, path)
+
+        self.assertEqual(self.ids(self.admin, "/api/anomalies/?scope=all&severity=medium"), [])
+        self.assertEqual(len(self.ids(self.admin, "/api/anomalies/?scope=all&severity=high")), 2)
+        self.assertEqual(len(self.ids(self.admin, f"/api/anomalies/?plot={self.admin_plot.pk}")), 1)
+
+    def test_live_subscriptions_are_scoped(self):
+        self.assertEqual(resolve_plot_ids({}, self.farmer), {self.plot.pk})
+        self.assertEqual(
+            resolve_plot_ids({"plot": f"{self.plot.pk},{self.admin_plot.pk}"}, self.farmer), {self.plot.pk}
+        )
+        self.assertEqual(resolve_plot_ids({"farm": str(self.admin_farm.pk)}, self.farmer), set())
+        self.assertIsNone(resolve_plot_ids({"scope": "all"}, self.admin))
+        with self.assertRaises(PermissionDenied):
+            resolve_plot_ids({"scope": "all"}, self.farmer)
+
+    async def test_live_anomalies_are_admin_only(self):
+        broker = LocalBroker()
+        with mock.patch("api.streams.get_broker", return_value=broker):
+            for user, plot, anomalies in ((self.farmer, self.plot, False), (self.admin, self.admin_plot, True)):
+                response = await self.async_client.get("/api/live/", {"token": str(AccessToken.for_user(user))})
+                self.assertEqual(response.status_code, 200)
+                subscription, = broker._subscribers
+                broker.unsubscribe(subscription)
+
+                self.assertEqual(subscription.anomalies, anomalies)
+                self.assertEqual(subscription.wants({"event": "anomaly", "plot": plot.pk}), anomalies)
+                self.assertTrue(subscription.wants({"event": "plot_status", "plot": plot.pk}))
+
+    def test_farm_pages_merge_plots_in_order(self):
+        plots = make_plots(self.farm, 3)
+        start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        SensorReading.objects.bulk_create([
+            SensorReading(plot=plots[index % 3], timestamp=start + datetime.timedelta(minutes=index // 2),
+                          soil_moisture=30, air_temperature=20, humidity=50)
+            for index in range(11)
+        ])
+        expected = list(
+            SensorReading.objects.filter(plot__farm=self.farm).order_by("-timestamp", "-id").values_list("id", flat=True)
+        )
+
+        for fast in (False, True):
+            with self.settings(API_FAST_LISTS=fast):
+                seen, path = [], "/api/sensor-readings/?page_size=4"
+                while path:
+                    body = self.get(self.farmer, path).json()
+                    seen += [row["id"] for row in body["results"]]
+                    path = body["next"]
+                self.assertEqual(seen, expected)
+
+
+class IngestViewTests(TestCase):
+    """
+    The async /api/ingest/ view: JWT auth, JSON bodies and error shapes.
+    """
+
+    def setUp(self):
+        self.user, self.farm = make_farm()
+        self.plot, = make_plots(self.farm, 1)
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def reading(self, **fields):
+        return {"plot": self.plot.pk, "soil_moisture": 30, "air_temperature": 20, "humidity": 50, **fields}
+
+    async def post(self, body, headers=None):
+        return await self.async_client.post(
+            "/api/ingest/", body, content_type="application/json", headers=self.headers if headers is None else headers,
+        )
+
+    async def test_stores_an_object_or_an_array(self):
+        response = await self.post(json.dumps(self.reading()))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.json()["created"], response.json()["duplicates"]), (1, 0))
+
+        response = await self.post(json.dumps([self.reading(), self.reading(soil_moisture=40)]))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(response.json()["ids"]), 2)
+        self.assertEqual(await SensorReading.objects.filter(plot=self.plot).acount(), 3)
+
+    async def test_requires_post_and_a_token(self):
+        response = await self.async_client.get("/api/ingest/", headers=self.headers)
+        self.assertEqual(response.status_code, 405)
+        for headers in ({}, {"Authorization": "Bearer not-a-token"}):
+            response = await self.post(json.dumps(self.reading()), headers=headers)
+            self.assertEqual(response.status_code, 401)
+        self.assertFalse(await SensorReading.objects.aexists())
+
+    async def test_rejects_bad_bodies(self):
+        response = await self.post("{not json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("detail", response.json())
+
+        response = await self.post(json.dumps([self.reading(), self.reading(plot=self.plot.pk + 1000)]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("plot", response.json())
+
+        response = await self.post(json.dumps([self.reading()] * (MAX_BATCH + 1)))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await SensorReading.objects.aexists())
+
+
+class WriteScopeTests(TestCase):
+    """
+    Writes are limited to the user's farm too: readings, plots and batch
+    runs naming another farm's plot are rejected as unknown.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.farmer, self.farm = make_farm()
+        self.admin, self.admin_farm = make_farm("admin", role="admin")
+        self.plot, = make_plots(self.farm, 1)
+        self.other_plot, = make_plots(self.admin_farm, 1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.farmer)
+
+    def reading(self, plot):
+        return {"plot": plot.pk, "soil_moisture": 30, "air_temperature": 20, "humidity": 50}
+
+    def test_readings_only_go_to_the_users_plots(self):
+        for plot, expected in ((self.other_plot, 400), (self.plot, 201)):
+            packed = encode_records([(plot.pk, 0, 30, 20, 50)])
+            responses = [
+                self.client.post("/api/sensor-readings/", self.reading(plot), format="json"),
+                self.client.post("/api/sensor-readings/bulk/", [self.reading(plot)], format="json"),
+                self.client.post("/api/sensor-readings/bulk/", packed, content_type=PACKED_CONTENT_TYPE),
+                self.client.post("/api/ingest/", json.dumps(self.reading(plot)),
+                                 content_type="application/json", **bearer(self.farmer)),
+                self.client.post("/api/ingest/", packed, content_type=PACKED_CONTENT_TYPE, **bearer(self.farmer)),
+            ]
+            self.assertEqual([response.status_code for response in responses], [expected] * 5, plot)
+        self.assertFalse(SensorReading.objects.filter(plot=self.other_plot).exists())
+
+        own = SensorReading.objects.filter(plot=self.plot).first()
+        response = self.client.patch(f"/api/sensor-readings/{own.pk}/", {"plot": self.other_plot.pk}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post("/api/sensor-readings/bulk/", [self.reading(self.plot)], format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_plots_and_profiles_stay_on_the_users_farm(self):
+        response = self.client.post(
+            "/api/plots/", {"farm": self.admin_farm.pk, "name": "Stolen", "size_hectares": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/plots/", {"name": "Own", "size_hectares": 1}, format="json")
+        self.assertEqual(response.json()["farm"], self.farm.pk)
+
+        response = self.client.patch(f"/api/plots/{self.plot.pk}/", {"farm": self.admin_farm.pk}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.patch(f"/api/farms/{self.farm.pk}/", {"role": "admin", "user": self.admin.pk}, format="json")
+        self.farm.refresh_from_db()
+        self.assertEqual((self.farm.role, self.farm.user_id), ("farmer", self.farmer.pk))
+
+    def test_batch_runs_are_scoped(self):
+        path = "/api/sensor-readings/batch-inference/"
+        self.assertEqual(self.client.post(path, {"plot": self.other_plot.pk}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(path, {"plot": None}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(path, {}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(path, {"plot": self.plot.pk}, format="json").status_code, 202)
+
+        other_run = BatchInferenceRun.objects.create(plot=self.other_plot)
+        every_plot = BatchInferenceRun.objects.create()
+        own_run = BatchInferenceRun.objects.create(plot=self.plot)
+        for run, expected in ((other_run, 404), (every_plot, 404), (own_run, 200)):
+            self.assertEqual(self.client.get(f"{path}{run.pk}/").status_code, expected)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(path, {}, format="json").status_code, 202)
+        self.assertEqual(self.client.get(f"{path}{other_run.pk}/").status_code, 200)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Reads go to the replica unless the request writes. The stand-in replica
+    is a separate SQLite file holding the same ids under other names, so
+    each response shows which database it was read from.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Only this class knows the replica alias; the test runner sets up
+        # databases (and runs checks) for the configured ones before that.
+        handle, cls.replica_path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        connections.settings[REPLICA] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {"ENGINE": "django.db.backends.sqlite3"},
+            REPLICA: {"ENGINE": "django.db.backends.sqlite3", "NAME": cls.replica_path},
+        })[REPLICA]
+        call_command("migrate", database=REPLICA, verbosity=0)
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.databases = {DEFAULT_DB_ALIAS}
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        cache.clear()
+        for alias in (DEFAULT_DB_ALIAS, REPLICA):
+            User(pk=1, username="admin").save(using=alias)
+            FarmProfile(pk=1, user_id=1, farm_name="Farm", location="-", role="admin").save(using=alias)
+            FieldPlot(pk=1, farm_id=1, name=alias, size_hectares=1).save(using=alias)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.using(DEFAULT_DB_ALIAS).get(pk=1))
+
+    def plot_name(self):
+        return FieldPlot.objects.get(pk=1).name
+
+    @override_settings(RESPONSE_CACHE_SECONDS=0)
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual([plot["name"] for plot in self.client.get("/api/plots/").json()], [REPLICA])
+        self.assertEqual(self.client.get("/api/plots/1/").json()["name"], REPLICA)
+        self.assertEqual(self.client.get("/api/plots/status/").json()[0]["name"], REPLICA)
+
+    def test_writing_requests_use_the_primary(self):
+        response = self.client.patch("/api/plots/1/", {"name": "renamed"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(FieldPlot.objects.using(DEFAULT_DB_ALIAS).get(pk=1).name, "renamed")
+        self.assertEqual(FieldPlot.objects.using(REPLICA).get(pk=1).name, REPLICA)
+
+        response = self.client.post(
+            "/api/sensor-readings/", {"plot": 1, "soil_moisture": 30, "air_temperature": 20, "humidity": 50},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(SensorReading.objects.using(DEFAULT_DB_ALIAS).count(), 1)
+        self.assertEqual(SensorReading.objects.using(REPLICA).count(), 0)
+
+    def test_pinning(self):
+        self.assertEqual(self.plot_name(), REPLICA)
+        with use_primary():
+            self.assertEqual(self.plot_name(), DEFAULT_DB_ALIAS)
+        with transaction.atomic():
+            self.assertEqual(self.plot_name(), DEFAULT_DB_ALIAS)
+
+        with request_pin("GET"):
+            self.assertEqual(self.plot_name(), REPLICA)
+            FieldPlot.objects.filter(pk=1).update(size_hectares=2)
+            self.assertEqual(self.plot_name(), DEFAULT_DB_ALIAS)
+        with request_pin("POST"):
+            self.assertEqual(self.plot_name(), DEFAULT_DB_ALIAS)
+
+    def test_cached_responses_are_built_on_the_primary(self):
+        self.assertEqual(self.client.get("/api/plots/status/").json()[0]["name"], DEFAULT_DB_ALIAS)
+
+    def test_batch_runs_scan_the_replica(self):
+        # Replicated rows arrive without signals.
+        SensorReading.objects.using(REPLICA).bulk_create(
+            [SensorReading(pk=1, plot_id=1, soil_moisture=30, air_temperature=20, humidity=50)]
+        )
+        run = BatchInferenceRun.objects.create(plot_id=1)
+
+        run = run_to_completion(run.pk)
+
+        self.assertEqual((run.status, run.total_processed), ("completed", 1))
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_metrics_report_replica_lag(self):
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE agri_replica_lag_seconds gauge\nagri_replica_lag_seconds NaN", body)
@@ -1,49 +1,161 @@
-from rest_framework import viewsets, filters, status
+import numpy as np
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.timezone import now, timedelta
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.exceptions import ValidationError
-from ml.anomaly_model import detect_anomaly
-from core.models import AnomalyEvent
-from rest_framework.decorators import action
+from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.response import Response
-from django.utils.timezone import now, timedelta
-from core.models import AnomalyEvent
+from rest_framework.settings import api_settings
 
-
-from core.models import SensorReading
-from api.serializers import SensorReadingSerializer
-from core.models import (
-    FarmProfile,
-    FieldPlot,
-    SensorReading,
-    AnomalyEvent,
-    AgentRecommendation
+from api.caching import CachedResponseMixin
+from api.filters import (
+    filter_time_window,
+    is_cross_farm,
+    parse_choice_param,
+    parse_id_param,
+    parse_time_param,
+    scope_to_farm,
+    writable_plots,
 )
+from api.ingest import store_packed, validate_and_store
+from api.packed import DEVICE_HEADER, PackedReadingsParser
+from api.pagination import KeysetPagination
+from api.renderers import encode_page
 from api.serializers import (
+    AgentRecommendationSerializer,
+    AnomalyEventSerializer,
+    BatchInferenceRunSerializer,
     FarmProfileSerializer,
     FieldPlotSerializer,
     SensorReadingSerializer,
-    AnomalyEventSerializer,
-    AgentRecommendationSerializer
 )
-from ml.services import run_anomaly_inference, run_batch_inference
+from core.models import AgentRecommendation, AnomalyEvent, FarmProfile, FieldPlot, SensorReading
+from core.rollups import aggregate_series, parse_bucket, refresh_rollups
+from core.services import get_farm_role, get_user_farm, plot_status_payload, rebuild_plot_status, with_anomaly_metric
+from ml.anomaly_model import SEVERITIES
+from ml.batch_inference import run_to_completion
+from ml.inference_queue import inference_is_queued, queue_stats
+from ml.models import BatchInferenceRun
+from ml.services import run_anomaly_inference
+
+
+class FarmScopedMixin:
+    """
+    Limits the viewset to the requesting user's farm, following
+    ``farm_lookup`` from the model to the farm id, so lists, detail routes
+    and writes through get_object() only see that tenant's rows. Admins get
+    every farm with ``?scope=all``; anyone else asking for it gets a 403.
+    """
+
+    farm_lookup = "farm_id"
+    # Lists of per-plot rows (readings, anomalies) filter on the farm's plot
+    # ids and page through each plot's index (KeysetPagination.keyset_partitions).
+    plot_partitioned = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params, user = self.request.query_params, self.request.user
+        partitioned = self.plot_partitioned and self.action == "list" and not params.get("plot")
+        if not partitioned or is_cross_farm(params, user):
+            return scope_to_farm(queryset, params, user, self.farm_lookup)
+
+        plot_ids = list(
+            FieldPlot.objects.filter(farm_id=get_user_farm(user)[0]).order_by("id").values_list("id", flat=True)
+        )
+        self.keyset_partitions = ("plot_id", plot_ids)
+        return queryset.filter(plot_id__in=plot_ids)
+
+
+class FastListMixin:
+    """
+    Serializer-free list pages: ``fast_list_fields`` ((output name, ORM
+    lookup), ...) are read with values_list and encoded straight to JSON,
+    skipping a serializer and a dict per row. Used for ``?layout=columnar``
+    (one array per field) and, with API_FAST_LISTS, for every list; the
+    rows layout is identical to the serializer's output.
+    """
+
+    fast_list_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        layout = request.query_params.get("layout", "rows")
+        if layout not in ("rows", "columnar"):
+            raise ValidationError({"layout": "Expected 'rows' or 'columnar'."})
+        if layout == "rows" and not getattr(settings, "API_FAST_LISTS", False):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        names = [name for name, _ in self.fast_list_fields]
+        rows = self.paginator.paginate_values(
+            queryset, request, self, [lookup for _, lookup in self.fast_list_fields]
+        )
+        body = encode_page(names, rows, self.paginator.get_next_link(), columnar=layout == "columnar")
+        return HttpResponse(body, content_type="application/json")
+
+
+class PlotStatusMixin:
+    """
+    Rebuilds the PlotStatus of the plots an update or delete through the
+    viewset touches. New rows are folded in incrementally by ml.services;
+    edits and deletes can change counts and the latest anomaly in ways
+    only a recount gets right.
+    """
+
+    def perform_update(self, serializer):
+        before = serializer.instance.plot_id
+        super().perform_update(serializer)
+        rebuild_plot_status([before, serializer.instance.plot_id])
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        rebuild_plot_status([instance.plot_id])
+
+
+class RollupMixin:
+    """
+    Refolds the rollups of the plot-days an update or delete of a reading
+    touches; new readings are added to them incrementally on save.
+    """
+
+    def perform_update(self, serializer):
+        before = (serializer.instance.plot_id, serializer.instance.timestamp)
+        super().perform_update(serializer)
+        refresh_rollups([before, (serializer.instance.plot_id, serializer.instance.timestamp)])
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        refresh_rollups([(instance.plot_id, instance.timestamp)])
+
+
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
         if request.user.is_authenticated:
-            if hasattr(request.user, 'farm') and request.user.farm.role == 'admin':
+            # Cached: this runs on every request to the anomaly endpoints.
+            if get_farm_role(request.user) == 'admin':
                 return True
         return False
 
-class FarmProfileViewSet(viewsets.ModelViewSet):
+class FarmProfileViewSet(FarmScopedMixin, viewsets.ModelViewSet):
     queryset = FarmProfile.objects.all()
     serializer_class = FarmProfileSerializer
+    farm_lookup = "pk"
 
+    def perform_create(self, serializer):
+        # Only admins choose the user (FarmProfileSerializer.admin_only_fields).
+        user = serializer.validated_data.get("user", self.request.user)
+        if FarmProfile.objects.filter(user=user).exists():
+            raise ValidationError({"user": "This user already has a farm profile."})
+        serializer.save(user=user)
 
-class FieldPlotViewSet(viewsets.ModelViewSet):
+
+class FieldPlotViewSet(CachedResponseMixin, FarmScopedMixin, viewsets.ModelViewSet):
     queryset = FieldPlot.objects.all()
     serializer_class = FieldPlotSerializer
     permission_classes = [IsAuthenticated]
+    max_aggregate_buckets = 5000
 
     def perform_create(self, serializer):
         farm = serializer.validated_data.get("farm")
@@ -59,52 +171,73 @@ class FieldPlotViewSet(viewsets.ModelViewSet):
         GET /api/plots/status/
         Retourne le statut de chaque parcelle
         """
-        plots = FieldPlot.objects.all()
-        result = []
+        def produce():
+            plots = self.get_queryset().select_related("current_status").order_by("id")
+            return Response([plot_status_payload(plot) for plot in plots])
 
-        for plot in plots:
-            anomalies = AnomalyEvent.objects.filter(
-                reading__plot=plot
-            ).order_by("-created_at")
+        return self.cached_response(request, produce)
 
-            status = "OK"
+    @action(detail=True, methods=["get"], url_path="aggregates")
+    def aggregates(self, request, pk=None):
+        """
+        GET /api/plots/{id}/aggregates/?bucket=1h&from=&to=
+        Min/max/mean/count per metric and bucket, served from the coarsest
+        rollup (minute/hour/day) that fits the requested bucket.
+        """
+        plot = self.get_object()
+        params = request.query_params
 
-            if anomalies.exists():
-                severity = anomalies.first().severity
-                if severity == "high":
-                    status = "CRITICAL"
-                elif severity == "medium":
-                    status = "WARNING"
+        bucket = params.get("bucket", "1h")
+        bucket_seconds = parse_bucket(bucket)
+        if bucket_seconds is None or bucket_seconds % 60:
+            raise ValidationError({"bucket": "Use a whole number of minutes, hours or days, e.g. 15m, 1h, 1d."})
 
-            result.append({
-                "id": plot.id,
-                "name": plot.name,
-                "size_hectares": plot.size_hectares,
-                "status": status,
-            })
+        end = parse_time_param(params, "to") or now()
+        start = parse_time_param(params, "from") or end - timedelta(days=1)
+        if start >= end:
+            raise ValidationError({"from": "'from' must be before 'to'."})
+        if (end - start).total_seconds() / bucket_seconds > self.max_aggregate_buckets:
+            raise ValidationError({"bucket": "Too many buckets for this range; use a larger bucket."})
 
-        return Response(result)
+        resolution, series = aggregate_series(plot.pk, bucket_seconds, start, end)
+        return Response({
+            "plot": plot.pk,
+            "bucket": bucket,
+            "resolution": resolution,
+            "from": start,
+            "to": end,
+            "results": series,
+        })
 
 
 ##week1day6
-class SensorReadingViewSet(viewsets.ModelViewSet):
+class SensorReadingViewSet(RollupMixin, PlotStatusMixin, CachedResponseMixin, FarmScopedMixin, FastListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]#permssion
     queryset = SensorReading.objects.all()
     serializer_class = SensorReadingSerializer
-    
-    
-    def perform_create(self, serializer):
-        reading = serializer.save()  # crée SensorReading en DB
-
-      
-    
+    pagination_class = KeysetPagination
+    keyset_field = "timestamp"
+    farm_lookup = "plot__farm_id"
+    plot_partitioned = True
+    fast_list_fields = (
+        ("id", "id"),
+        ("timestamp", "timestamp"),
+        ("received_at", "received_at"),
+        ("device_id", "device_id"),
+        ("sequence", "sequence"),
+        ("soil_moisture", "soil_moisture"),
+        ("air_temperature", "air_temperature"),
+        ("humidity", "humidity"),
+        ("plot", "plot_id"),
+    )
+    bulk_max_size = 5000
 
     def get_queryset(self):
-        queryset = SensorReading.objects.all()
-        plot_id = self.request.query_params.get("plot")
+        queryset = super().get_queryset()
+        plot_id = parse_id_param(self.request.query_params, "plot")
         if plot_id:
             queryset = queryset.filter(plot_id=plot_id)
-        return queryset
+        return filter_time_window(queryset, self.request.query_params, "timestamp")
 
     @action(detail=True, methods=["post"], url_path="run-inference")
     def run_inference(self, request, pk=None):
@@ -124,25 +257,101 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["post"], url_path="batch-inference")
     def batch_inference(self, request):
         """
-        Run inference across a collection of readings (optionally filtered by plot).
+        POST /api/sensor-readings/batch-inference/
+        Start a chunked, resumable inference run over stored readings
+        (optionally filtered by plot; only admins may leave it out). The
+        worker processes it in the background; poll batch-inference/{id}/
+        for progress.
         """
-        plot_id = request.data.get("plot")
-        queryset = self.get_queryset()
-        if plot_id:
-            queryset = queryset.filter(plot_id=plot_id)
+        serializer = BatchInferenceRunSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        run = serializer.save()
+
+        if not inference_is_queued():
+            run = run_to_completion(run.pk)
+            return Response(BatchInferenceRunSerializer(run).data, status=status.HTTP_200_OK)
 
-        stats = run_batch_inference(queryset)
-        return Response(stats, status=status.HTTP_200_OK)
+        return Response(BatchInferenceRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=["get"], url_path=r"batch-inference/(?P<run_id>\d+)")
+    def batch_inference_progress(self, request, run_id=None):
+        """
+        GET /api/sensor-readings/batch-inference/{id}/
+        Progress and counters of a batch inference run on one of the user's
+        plots (any run for admins).
+        """
+        runs = BatchInferenceRun.objects.all()
+        if get_farm_role(request.user) != "admin":
+            runs = runs.filter(plot__in=writable_plots(request.user))
+        run = get_object_or_404(runs, pk=run_id)
+        return Response(BatchInferenceRunSerializer(run).data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        parser_classes=[*api_settings.DEFAULT_PARSER_CLASSES, PackedReadingsParser],
+    )
+    def bulk(self, request):
+        """
+        POST /api/sensor-readings/bulk/
+        Ingest an array of readings, as JSON or packed binary records
+        (api.packed), with a fixed number of queries per batch.
+        """
+        if isinstance(request.data, np.ndarray):
+            result = store_packed(
+                request.data, request.user, max_length=self.bulk_max_size,
+                device_id=request.headers.get(DEVICE_HEADER),
+            )
+        else:
+            result = validate_and_store(request.data, request.user, max_length=self.bulk_max_size)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["get"], url_path="inference-queue", permission_classes=[IsAdmin])
+    def inference_queue(self, request):
+        """
+        GET /api/sensor-readings/inference-queue/
+        Depth and lag of the background anomaly inference queue.
+        """
+        return Response(queue_stats(), status=status.HTTP_200_OK)
 
 #trier par date   
-class AnomalyEventViewSet(viewsets.ModelViewSet):
+class AnomalyEventViewSet(PlotStatusMixin, CachedResponseMixin, FarmScopedMixin, FastListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
-    queryset = AnomalyEvent.objects.select_related("plot", "reading").order_by('-created_at')
+    queryset = with_anomaly_metric(AnomalyEvent.objects.order_by('-created_at'))
     serializer_class = AnomalyEventSerializer
+    pagination_class = KeysetPagination
+    keyset_field = "created_at"
+    farm_lookup = "plot__farm_id"
+    plot_partitioned = True
+    fast_list_fields = (
+        ("id", "id"),
+        ("plot", "plot_id"),
+        ("reading", "reading_id"),
+        ("anomaly_type", "anomaly_type"),
+        ("severity", "severity"),
+        ("message", "message"),
+        ("recommendation", "recommendation"),
+        ("created_at", "created_at"),
+        ("metric", "metric"),
+        ("value", "metric_value"),
+    )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        plot_id = parse_id_param(params, "plot")
+        if plot_id:
+            queryset = queryset.filter(plot_id=plot_id)
+        severity = parse_choice_param(params, "severity", SEVERITIES[1:])
+        if severity:
+            queryset = queryset.filter(severity=severity)
+        return filter_time_window(queryset, params, "created_at")
 
 #trier par dateee
-class AgentRecommendationViewSet(viewsets.ModelViewSet):
+class AgentRecommendationViewSet(FarmScopedMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdmin]
+    farm_lookup = "anomaly__plot__farm_id"
     queryset = AgentRecommendation.objects.all().order_by('-generated_at')
     serializer_class = AgentRecommendationSerializer
 
@@ -0,0 +1,174 @@
+# backend/db_routers.py
+"""
+Read-replica routing.
+
+With a "replica" database configured (``DB_REPLICA_HOST``), reads go to it
+and writes to the primary ("default"), except that reads stay on the
+primary:
+
+* inside a transaction on the primary, so a transaction reads its own
+  writes (ingest, ml.services inference, the inference worker's queue);
+* for the rest of a request once it has written anything, and for the
+  whole of a POST/PUT/PATCH/DELETE (PrimaryPinMiddleware), so validation
+  lookups and get_object() before an update see current rows;
+* inside ``with use_primary():``, e.g. while building a response that
+  api.caching stores under the current data version.
+
+Without a replica every query goes to "default", as before.
+
+Batch analysis that tolerates lag reads through analytics_db() explicitly,
+even from inside a transaction. replica_lag_seconds() feeds the
+``agri_replica_lag_seconds`` gauge on /metrics.
+"""
+
+import contextlib
+import contextvars
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA = "replica"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_pin = contextvars.ContextVar("db_primary_pin", default=None)
+
+
+class PrimaryPin:
+    """
+    Whether the current request (or use_primary() block) reads from the primary.
+    """
+
+    __slots__ = ("wrote", "depth")
+
+    def __init__(self, wrote=False):
+        self.wrote = wrote
+        self.depth = 0
+
+    @property
+    def pinned(self):
+        return self.wrote or self.depth > 0
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def analytics_db():
+    """
+    Alias for heavy reads that tolerate replica lag: the replica when there
+    is one, whatever transaction is open on the primary.
+    """
+    return REPLICA if replica_configured() else DEFAULT_DB_ALIAS
+
+
+@contextlib.contextmanager
+def request_pin(method="GET"):
+    """
+    Track writes for one request; unsafe methods start pinned to the primary.
+    """
+    token = _pin.set(PrimaryPin(wrote=method not in SAFE_METHODS))
+    try:
+        yield
+    finally:
+        _pin.reset(token)
+
+
+@contextlib.contextmanager
+def use_primary():
+    """
+    Route reads in the block to the primary.
+    """
+    pin = _pin.get()
+    token = None
+    if pin is None:
+        pin = PrimaryPin()
+        token = _pin.set(pin)
+    pin.depth += 1
+    try:
+        yield
+    finally:
+        pin.depth -= 1
+        if token is not None:
+            _pin.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replica_configured():
+            return None
+        pin = _pin.get()
+        if pin is not None and pin.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        pin = _pin.get()
+        if pin is not None:
+            pin.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same rows.
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class PrimaryPinMiddleware:
+    """
+    Gives each request its PrimaryPin; unsafe methods start pinned.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with request_pin(request.method):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with request_pin(request.method):
+            return await self.get_response(request)
+
+
+def replica_lag_seconds():
+    """
+    Replay lag of the replica in seconds: 0 when it has replayed all WAL it
+    received, None when there is no replica, it is not a PostgreSQL standby,
+    it cannot be reached or it has not replayed a transaction since it
+    started.
+    """
+    if not replica_configured():
+        return None
+    connection = connections[REPLICA]
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            value = cursor.fetchone()[0]
+    except DatabaseError as exc:
+        logger.error("Could not read replica lag: %s", exc)
+        return None
+    return float(value) if value is not None else None
@@ -37,12 +37,24 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+    ),
+    # DRF's JSON, encoded with orjson when installed (api.renderers).
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
+# Serve sensor-reading and anomaly list pages from values_list rows encoded
+# straight to JSON instead of through their serializers (api.views.FastListMixin).
+# ?layout=columnar is served that way regardless.
+API_FAST_LISTS = os.getenv('API_FAST_LISTS', '0') == '1'
+
 # ✅ MIDDLEWARE UNIQUE + BON ORDRE
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",   # 🔥 DOIT ÊTRE EN PREMIER
+    "api.instrumentation.InstrumentationMiddleware",  # no-op unless INSTRUMENTATION_ENABLED
+    "backend.db_routers.PrimaryPinMiddleware",  # no-op without a replica
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,9 +91,93 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'motdepasse'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # The web container runs under ASGI, where Django connections are not
+        # reused across requests: keep DB_CONN_MAX_AGE=0 there and pool with
+        # pgbouncer (transaction mode, DB_DISABLE_SERVER_SIDE_CURSORS=1), as
+        # the backend service in docker-compose.yml does.
+        # Raise it for WSGI deployments to keep connections between requests.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', '0') == '1',
     }
 }
 
+# Optional streaming replica for reads (backend.db_routers): API reads that
+# are not part of a write, and batch inference scans. Same credentials as
+# the primary unless overridden. Tests use the primary's test database.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['backend.db_routers.PrimaryReplicaRouter']
+
+# Anomaly inference: "queue" hands readings to the run_inference_worker
+# command, "sync" runs it inside the ingest request.
+ML_INFERENCE_MODE = os.getenv('ML_INFERENCE_MODE', 'queue')
+# Delay before a failed inference batch is retried; doubles with each attempt.
+ML_INFERENCE_RETRY_SECONDS = float(os.getenv('ML_INFERENCE_RETRY_SECONDS', '30'))
+
+# Rolling z-score / rate-of-change / drift / stuck-sensor detectors (ml.streaming).
+ML_STREAMING_DETECTORS = os.getenv('ML_STREAMING_DETECTORS', '1') == '1'
+
+# Optional JSON rule set overriding ml.agent_rules.DEFAULT_RULES; re-read when it changes.
+ML_AGENT_RULES_FILE = os.getenv('ML_AGENT_RULES_FILE') or None
+ML_AGENT_RULES_RELOAD_SECONDS = float(os.getenv('ML_AGENT_RULES_RELOAD_SECONDS', '5'))
+
+# Set once SensorReading has been converted with "reading_partitions convert";
+# the inference worker then keeps future monthly partitions created.
+SENSOR_READING_PARTITIONED = os.getenv('SENSOR_READING_PARTITIONED', '0') == '1'
+SENSOR_READING_PARTITION_MONTHS_AHEAD = int(os.getenv('SENSOR_READING_PARTITION_MONTHS_AHEAD', '3'))
+
+# Server-sent events pushed to dashboards (core.live, /api/live/): "postgres"
+# relays them from the inference worker with LISTEN/NOTIFY, "local" only
+# reaches subscribers of the same process, "off" disables publishing.
+LIVE_EVENTS_BACKEND = os.getenv('LIVE_EVENTS_BACKEND', 'postgres')
+# At most one reading event per plot per interval (seconds); 0 disables them.
+LIVE_READING_INTERVAL = float(os.getenv('LIVE_READING_INTERVAL', '10'))
+# LISTEN needs a session-level connection: when DB_HOST points at a
+# transaction-pooling pgbouncer, point these at PostgreSQL itself.
+LIVE_EVENTS_DB_HOST = os.getenv('LIVE_EVENTS_DB_HOST') or None
+LIVE_EVENTS_DB_PORT = os.getenv('LIVE_EVENTS_DB_PORT') or None
+
+# Cached dashboard responses and their per-plot version counters (api.caching,
+# core.versions), plus cached farm roles. Local memory is per process, so
+# bumps from other workers are missed for up to RESPONSE_CACHE_SECONDS; set
+# REDIS_URL to share the cache between web workers and run_inference_worker.
+# RESPONSE_CACHE_SECONDS=0 disables response caching.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LOCMEM_CACHE_MAX_ENTRIES', '10000'))},
+        }
+    }
+RESPONSE_CACHE_SECONDS = int(os.getenv('RESPONSE_CACHE_SECONDS', '60'))
+
+# Per-request instrumentation (core.instrumentation): SQL, serializer and
+# inference stage timings as Server-Timing headers and Prometheus histograms
+# at /metrics, which requires "Authorization: Bearer <token>" when a token is set.
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', '0') == '1'
+INSTRUMENTATION_METRICS_TOKEN = os.getenv('INSTRUMENTATION_METRICS_TOKEN') or None
+# File holding the share of requests to cProfile ("0.01"), re-read while
+# running; profiles are written to INSTRUMENTATION_PROFILE_DIR.
+INSTRUMENTATION_PROFILE_FILE = os.getenv('INSTRUMENTATION_PROFILE_FILE') or None
+INSTRUMENTATION_PROFILE_DIR = os.getenv('INSTRUMENTATION_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+INSTRUMENTATION_PROFILE_RELOAD_SECONDS = float(os.getenv('INSTRUMENTATION_PROFILE_RELOAD_SECONDS', '5'))
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -19,6 +19,10 @@ from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from api.ingest import ingest_readings
+from api.instrumentation import metrics
+from api.streams import live_events
+
 from api.views import (
     FarmProfileViewSet,
     FieldPlotViewSet,
@@ -40,6 +44,13 @@ urlpatterns = [
     #JWT Authentication endpoints
      path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    
+
+    # Async views, served by the ASGI entry point (backend/asgi.py)
+    path('api/ingest/', ingest_readings, name='ingest_readings'),
+    path('api/live/', live_events, name='live_events'),
+
+    # Prometheus scrape target (INSTRUMENTATION_ENABLED)
+    path('metrics', metrics, name='metrics'),
+
     path('api/', include(router.urls)),
 ]
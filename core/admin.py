@@ -1,10 +1,11 @@
 from django.contrib import admin
-from .models import SensorReading, AnomalyEvent, FarmProfile, FieldPlot, AgentRecommendation
+from .models import SensorReading, AnomalyEvent, FarmProfile, FieldPlot, AgentRecommendation, PlotStatus
 
 admin.site.register(SensorReading)
 admin.site.register(AnomalyEvent)
 admin.site.register(FarmProfile)
 admin.site.register(FieldPlot)
 admin.site.register(AgentRecommendation)
+admin.site.register(PlotStatus)
 
 # Register your models here.
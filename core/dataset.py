@@ -0,0 +1,208 @@
+# core/dataset.py
+"""
+Deterministic synthetic sensor history for benchmarking at scale.
+
+A NumPy port of the sensor model in sensor_simulator.py (per-plot presets
+and seeded offsets, diurnal temperature, humidity following temperature,
+soil moisture drying out between rain and irrigation, injected spikes,
+drops, drift and noise), vectorised across plots. Readings come out one
+day at a time, every plot sampled every ``interval`` seconds with a fixed
+per-plot phase.
+
+Every day and block of plots is drawn from its own generator seeded with
+``(seed, day, block)``, so a (seed, plot count, days, interval, anomaly
+rate) tuple always yields the same values whatever the start date, and
+memory stays bounded by one block-day. Only the soil moisture carries over
+from one day to the next.
+
+On PostgreSQL days are loaded with a binary ``COPY``; other backends go
+through core.ingest.insert_readings.
+"""
+
+import datetime
+import io
+
+import numpy as np
+from django.db import connection
+
+from core.ingest import insert_readings
+from core.models import SensorReading
+from core.versions import bump_plot_versions
+
+SECONDS_PER_DAY = 86400
+
+# Plots generated together; with ``day`` it seeds each block's generator.
+PLOT_BLOCK = 1000
+
+# Offsets of the three plot presets, as in sensor_simulator.PLOT_PRESETS.
+TEMP_OFFSETS = np.array([0.5, -2.5, 2.0])
+HUMIDITY_OFFSETS = np.array([0.0, -6.0, 6.0])
+SOIL_OFFSETS = np.array([0.0, -4.0, 4.0])
+
+# Microseconds between the Unix and PostgreSQL (2000-01-01) epochs.
+PG_EPOCH_OFFSET_US = 946684800 * 1_000_000
+
+COPY_COLUMNS = ("plot_id", "timestamp", "received_at", "soil_moisture", "air_temperature", "humidity")
+
+# PostgreSQL binary COPY tuple: field count, then (length, value) per field.
+COPY_ROW_DTYPE = np.dtype(
+    [("fields", ">i2")]
+    + [
+        item
+        for name, kind in zip(COPY_COLUMNS, (">i8", ">i8", ">i8", ">f8", ">f8", ">f8"))
+        for item in ((f"{name}_length", ">i4"), (name, kind))
+    ]
+)
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+COPY_TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+
+def plot_profiles(plot_count, seed):
+    """
+    Per-plot offsets and chances, like sensor_simulator.ensure_plot_profile.
+    """
+    rng = np.random.default_rng(seed)
+    preset = np.arange(plot_count) % 3
+    return {
+        "temp_offset": TEMP_OFFSETS[preset] + rng.uniform(-1.0, 1.0, plot_count),
+        "humidity_offset": HUMIDITY_OFFSETS[preset] + rng.uniform(-4.0, 4.0, plot_count),
+        "soil_moisture": np.clip(35 + SOIL_OFFSETS[preset] + rng.uniform(-4.0, 4.0, plot_count), 5, 80),
+        "rain_chance": np.clip(0.04 + rng.uniform(-0.015, 0.015, plot_count), 0.01, 0.08),
+        "irrigation_chance": np.clip(0.25 + rng.uniform(-0.08, 0.08, plot_count), 0.05, 0.5),
+        "phase": rng.integers(0, 2 ** 31, plot_count),
+    }
+
+
+def _inject_anomalies(rng, temp, hum, moist, anomaly_rate):
+    shape = temp.shape
+    injected = rng.random(shape) < anomaly_rate
+    kind = rng.integers(0, 4, shape)
+
+    spike, drop, drift, noise = (injected & (kind == index) for index in range(4))
+    temp = temp + np.where(spike, rng.uniform(15, 35, shape), 0.0)
+    moist = moist - np.where(drop, rng.uniform(10, 20, shape), 0.0)
+    temp = temp + np.where(drift, rng.uniform(0.5, 2, shape), 0.0)
+    hum = hum + np.where(drift, rng.uniform(1, 3, shape), 0.0)
+    temp = temp + np.where(noise, rng.uniform(-15, 15, shape), 0.0)
+    hum = hum + np.where(noise, rng.uniform(-20, 20, shape), 0.0)
+    moist = moist + np.where(noise, rng.uniform(-10, 10, shape), 0.0)
+    return temp, hum, moist
+
+
+def generate_days(plot_ids, start, days, interval=300, seed=0, anomaly_rate=0.10):
+    """
+    Yield dicts of columns, one per day and block of PLOT_BLOCK plots:
+    ``plot_id`` (int64), ``epoch`` (int64 Unix seconds), ``soil_moisture``,
+    ``air_temperature`` and ``humidity`` (float64).
+    """
+    if SECONDS_PER_DAY % interval:
+        raise ValueError("interval must divide a day evenly.")
+
+    plot_ids = np.asarray(plot_ids, dtype=np.int64)
+    steps = SECONDS_PER_DAY // interval
+    profile = plot_profiles(len(plot_ids), seed)
+    soil_state = profile["soil_moisture"].copy()
+    phase = profile["phase"] % interval
+    start_epoch = int(start.timestamp())
+    offsets = np.arange(steps)[:, None] * interval
+
+    for day in range(days):
+        for block_start in range(0, len(plot_ids), PLOT_BLOCK):
+            block = slice(block_start, block_start + PLOT_BLOCK)
+            rng = np.random.default_rng([seed, day, block_start // PLOT_BLOCK])
+            epochs = start_epoch + day * SECONDS_PER_DAY + offsets + phase[None, block]
+            shape = epochs.shape
+            hour = (epochs % SECONDS_PER_DAY) / 3600.0
+
+            temp = 12 + 10 * np.sin((hour - 6) * np.pi / 12) + profile["temp_offset"][block]
+            temp = np.clip(temp + rng.uniform(-0.6, 0.6, shape), -5, 45)
+            hum = np.clip(70 - (temp - 20) * 1.2 + rng.uniform(-5, 5, shape), 20, 95)
+            hum = np.clip(hum + profile["humidity_offset"][block] + rng.uniform(-2.5, 2.5, shape), 20, 95)
+
+            wind = rng.uniform(0, 25, shape)
+            evaporation = rng.uniform(0.05, 0.2, shape) + wind * 0.01
+            rain = np.where(rng.random(shape) < profile["rain_chance"][block], rng.uniform(5, 12, shape), 0.0)
+            irrigation_roll = rng.random(shape) < profile["irrigation_chance"][block]
+            irrigation = rng.uniform(3, 7, shape)
+
+            # Irrigation depends on the running moisture, so only this walks step by step.
+            state = soil_state[block]
+            moist = np.empty(shape)
+            for step in range(steps):
+                irrigate = (state < 20) & irrigation_roll[step]
+                state = state - evaporation[step] + np.where(irrigate, irrigation[step], 0.0) + rain[step]
+                state = np.clip(state, 5, 80)
+                moist[step] = state
+            soil_state[block] = state
+
+            temp, hum, moist = _inject_anomalies(rng, temp, hum, moist, anomaly_rate)
+
+            yield {
+                "plot_id": np.broadcast_to(plot_ids[block], shape).ravel(),
+                "epoch": epochs.ravel(),
+                "soil_moisture": np.round(moist, 2).ravel(),
+                "air_temperature": np.round(temp, 2).ravel(),
+                "humidity": np.round(hum, 2).ravel(),
+            }
+
+
+def copy_payload(columns):
+    """
+    PostgreSQL binary COPY body for COPY_COLUMNS, built without a Python
+    loop over rows. received_at is set to the measurement time.
+    """
+    rows = np.empty(len(columns["plot_id"]), dtype=COPY_ROW_DTYPE)
+    rows["fields"] = len(COPY_COLUMNS)
+    timestamps = columns["epoch"] * 1_000_000 - PG_EPOCH_OFFSET_US
+    values = {
+        "plot_id": columns["plot_id"],
+        "timestamp": timestamps,
+        "received_at": timestamps,
+        "soil_moisture": columns["soil_moisture"],
+        "air_temperature": columns["air_temperature"],
+        "humidity": columns["humidity"],
+    }
+    for name in COPY_COLUMNS:
+        rows[f"{name}_length"] = 8
+        rows[name] = values[name]
+    return COPY_HEADER + rows.tobytes() + COPY_TRAILER
+
+
+def load_readings(columns):
+    """
+    Store one block of generate_days() output. Returns the number of rows written.
+    """
+    if connection.vendor != "postgresql":
+        bump_plot_versions(np.unique(columns["plot_id"]).tolist())
+        ids, *_ = insert_readings(
+            columns["plot_id"].tolist(),
+            columns["soil_moisture"].tolist(),
+            columns["air_temperature"].tolist(),
+            columns["humidity"].tolist(),
+            timestamps=columns["epoch"].tolist(),
+        )
+        return len(ids)
+
+    qn = connection.ops.quote_name
+    sql = (
+        f"COPY {qn(SensorReading._meta.db_table)} ({', '.join(qn(column) for column in COPY_COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT binary)"
+    )
+    payload = copy_payload(columns)
+    bump_plot_versions(np.unique(columns["plot_id"]).tolist())
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):
+            raw.copy_expert(sql, io.BytesIO(payload))
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(payload)
+    return len(columns["plot_id"])
+
+
+def default_start(days):
+    """
+    Midnight UTC ``days`` days before today.
+    """
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days)
@@ -0,0 +1,133 @@
+# core/ingest.py
+"""
+Columnar insert of sensor readings for the ingest endpoints.
+
+Callers pass parallel columns (plot ids, the three metrics and optionally
+device timestamps and (device_id, sequence) idempotency keys) rather than
+model instances. On PostgreSQL the batch is one
+``INSERT ... SELECT FROM unnest(arrays) ON CONFLICT DO NOTHING RETURNING``:
+a fixed number of parameters whatever the batch size, no per-row work in
+Django's SQL compiler, and retried readings are dropped by the
+unique_reading_device_sequence index without a lookup first. Other backends
+fall back to bulk_create after filtering out known keys.
+
+Only rows actually inserted are returned, so callers fold exactly those into
+rollups, plot status and inference: a retry changes nothing, and a late
+reading only touches the buckets and status rows it belongs to.
+"""
+
+import datetime
+
+from django.db import connection
+from django.utils import timezone
+
+from core.instrumentation import stage
+from core.models import SensorReading
+
+METRICS = ("soil_moisture", "air_temperature", "humidity")
+
+# Device clocks may run slightly ahead of the server's.
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=5)
+
+# Sequences are stored in a signed bigint column.
+MAX_SEQUENCE = 2**63 - 1
+
+
+def _from_epoch(value, default):
+    if value is None:
+        return default
+    return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+
+
+@stage("ingest.insert")
+def insert_readings(plot_ids, soil_moisture, air_temperature, humidity,
+                    timestamps=None, device_ids=None, sequences=None):
+    """
+    Insert one reading per row of the columns and skip rows whose
+    (device_id, sequence) is already stored or repeated in the batch.
+
+    ``timestamps`` holds Unix seconds, None entries (or no column) meaning
+    "now"; ``device_ids``/``sequences`` may be omitted or hold None.
+
+    Returns the inserted rows as columns:
+    (ids, plot_ids, timestamps, soil_moisture, air_temperature, humidity).
+    """
+    plot_ids = list(plot_ids)
+    count = len(plot_ids)
+    if not count:
+        return [], [], [], [], [], []
+
+    now = timezone.now()
+    columns = [
+        plot_ids,
+        list(timestamps) if timestamps is not None else [None] * count,
+        list(soil_moisture),
+        list(air_temperature),
+        list(humidity),
+        list(device_ids) if device_ids is not None else [None] * count,
+        list(sequences) if sequences is not None else [None] * count,
+    ]
+
+    if connection.vendor != "postgresql":
+        return _bulk_create_readings(columns, now)
+
+    qn = connection.ops.quote_name
+    returned = ["id", "plot_id", "timestamp", *METRICS]
+    sql = (
+        f"INSERT INTO {qn(SensorReading._meta.db_table)} "
+        f"({qn('plot_id')}, {qn('timestamp')}, {qn('received_at')}, "
+        f"{', '.join(qn(metric) for metric in METRICS)}, {qn('device_id')}, {qn('sequence')}) "
+        f"SELECT plot_id, COALESCE(to_timestamp(ts), %s), %s, "
+        f"soil_moisture, air_temperature, humidity, device_id, sequence "
+        f"FROM unnest(%s::bigint[], %s::float8[], %s::float8[], %s::float8[], %s::float8[], "
+        f"%s::varchar[], %s::bigint[]) "
+        f"WITH ORDINALITY AS batch "
+        f"(plot_id, ts, soil_moisture, air_temperature, humidity, device_id, sequence, ordinal) "
+        f"ORDER BY ordinal "
+        f"ON CONFLICT DO NOTHING "
+        f"RETURNING {', '.join(qn(column) for column in returned)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [now, now, *columns])
+        rows = cursor.fetchall()
+    if not rows:
+        return [], [], [], [], [], []
+    return tuple(list(column) for column in zip(*rows))
+
+
+def _bulk_create_readings(columns, now):
+    device_ids, sequences = columns[5], columns[6]
+
+    keyed = {
+        (device_id, sequence) for device_id, sequence in zip(device_ids, sequences)
+        if device_id is not None and sequence is not None
+    }
+    seen = set()
+    if keyed:
+        seen = set(
+            SensorReading.objects
+            .filter(device_id__in={key[0] for key in keyed}, sequence__in={key[1] for key in keyed})
+            .values_list("device_id", "sequence")
+        )
+
+    readings = []
+    for plot_id, ts, soil_value, air_value, hum_value, device_id, sequence in zip(*columns):
+        if device_id is not None and sequence is not None:
+            if (device_id, sequence) in seen:
+                continue
+            seen.add((device_id, sequence))
+        readings.append(SensorReading(
+            plot_id=plot_id, timestamp=_from_epoch(ts, now),
+            soil_moisture=soil_value, air_temperature=air_value, humidity=hum_value,
+            device_id=device_id, sequence=sequence,
+        ))
+
+    readings = SensorReading.objects.bulk_create(readings)
+    return (
+        [reading.pk for reading in readings],
+        [reading.plot_id for reading in readings],
+        [reading.timestamp for reading in readings],
+        [reading.soil_moisture for reading in readings],
+        [reading.air_temperature for reading in readings],
+        [reading.humidity for reading in readings],
+    )
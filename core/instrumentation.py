@@ -0,0 +1,344 @@
+# core/instrumentation.py
+"""
+Opt-in per-request instrumentation (``INSTRUMENTATION_ENABLED``).
+
+While api.instrumentation.InstrumentationMiddleware is handling a request,
+a RequestTimings object sits in a context variable, so it follows the
+request through sync_to_async hops. Code on the hot path marks its stages:
+
+    with stage("ml.detect"):
+        ...
+
+or decorates a function with ``@stage("ml.inference")``. Outside an
+instrumented request a stage costs one context-variable lookup. A stage
+nested in a stage of the same name is not counted twice, so per-item
+serializer work adds up once per request. Stages of different names
+overlap: SQL time ("db") is also part of the stage that issued it.
+
+At the end of the request the middleware folds the timings into the
+process-wide histograms below (rendered for Prometheus by
+render_prometheus()) and into a Server-Timing header. Each worker process
+keeps its own registry; stages run outside a request (run_inference_worker,
+management commands) are not recorded.
+
+Sampled cProfile capture is toggled at runtime through
+``INSTRUMENTATION_PROFILE_FILE``: a file holding the share of requests to
+profile ("0.01"), re-read when it changes, like ML_AGENT_RULES_FILE. Each
+sampled request is dumped to ``INSTRUMENTATION_PROFILE_DIR`` as a .prof
+file for pstats/snakeviz. Delete the file or write 0 to stop.
+"""
+
+import contextvars
+import cProfile
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def instrumentation_enabled():
+    return getattr(settings, "INSTRUMENTATION_ENABLED", False)
+
+
+class RequestTimings:
+    """
+    Stage totals of one request: name -> [seconds, calls], plus SQL count/time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.active = set()
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def add(self, name, seconds):
+        totals = self.stages.setdefault(name, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+
+class stage:
+    """
+    Context manager (or decorator) adding the enclosed time to stage ``name``
+    of the current request.
+    """
+
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        timings = _current.get()
+        if timings is not None and self.name not in timings.active:
+            timings.active.add(self.name)
+            self.timings = timings
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        timings = self.timings
+        if timings is not None:
+            self.timings = None
+            timings.add(self.name, time.perf_counter() - self.started)
+            timings.active.discard(self.name)
+
+    def __call__(self, func):
+        name = self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def begin_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_sql(execute, sql, params, many, context):
+    """
+    Connection execute_wrapper counting statements of the current request.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.sql_seconds += time.perf_counter() - started
+
+
+def install_sql_recorder(connection, **kwargs):
+    """
+    Add record_sql to a connection once; also a connection_created receiver.
+    """
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram, one series per label tuple.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            base = ",".join(f'{key}="{_escape(value)}"' for key, value in zip(self.label_names, labels))
+            running = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {running}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "agri_request_duration_seconds", "Wall time of API requests.", ("endpoint", "method", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "agri_request_queries", "SQL statements per API request.", ("endpoint", "method"), QUERY_COUNT_BUCKETS,
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "agri_request_sql_seconds", "Time spent in SQL per API request.", ("endpoint", "method"),
+)
+STAGE_SECONDS = Histogram(
+    "agri_stage_duration_seconds", "Time per request spent in each instrumented stage.", ("endpoint", "stage"),
+)
+
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, STAGE_SECONDS)
+
+
+def observe_request(timings, endpoint, method, status):
+    """
+    Fold a finished request into the histograms; returns its total seconds.
+    """
+    elapsed = time.perf_counter() - timings.started
+    REQUEST_SECONDS.observe((endpoint, method, str(status)), elapsed)
+    REQUEST_QUERIES.observe((endpoint, method), timings.queries)
+    REQUEST_SQL_SECONDS.observe((endpoint, method), timings.sql_seconds)
+    for name, (seconds, _) in timings.stages.items():
+        STAGE_SECONDS.observe((endpoint, name), seconds)
+    return elapsed
+
+
+def server_timing(timings, elapsed):
+    """
+    Server-Timing header value: db, each stage and the total, in milliseconds.
+    """
+    entries = [f'db;dur={timings.sql_seconds * 1000:.2f};desc="{timings.queries} queries"']
+    for name, (seconds, calls) in sorted(timings.stages.items()):
+        entries.append(f'{name};dur={seconds * 1000:.2f}' + (f';desc="{calls} calls"' if calls > 1 else ""))
+    entries.append(f"total;dur={elapsed * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def render_gauge(name, help_text, value):
+    """
+    Lines of a single-sample gauge; None renders as NaN (unknown).
+    """
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {'NaN' if value is None else value}"]
+
+
+def render_prometheus(extra_lines=()):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+class ProfileSampler:
+    """
+    Decides which requests get a cProfile run, from a sample-rate file that
+    can be edited while the server runs.
+    """
+
+    def __init__(self, path=None, directory=None, reload_interval=5.0):
+        self.path = path
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self.rate = 0.0
+        self._lock = threading.Lock()
+        # cProfile profiles one thread at a time per interpreter (sys.monitoring on 3.12+).
+        self._running = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+
+            rate = 0.0
+            if mtime is not None:
+                try:
+                    with open(self.path, encoding="utf-8") as handle:
+                        rate = min(max(float(handle.read().strip() or 0), 0.0), 1.0)
+                except (OSError, ValueError) as exc:
+                    logger.error("Could not read profile sample rate from %s: %s", self.path, exc)
+                    return
+            if rate != self.rate:
+                logger.info("Request profiling sample rate set to %s", rate)
+            self.rate = rate
+
+    def sample(self):
+        """
+        Whether to profile this request.
+        """
+        if not self.path or not self.directory:
+            return False
+        self._maybe_reload()
+        return bool(self.rate) and random.random() < self.rate
+
+    def start(self):
+        """
+        A cProfile.Profile running in the calling thread, or None when
+        another request is being profiled.
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) holds the hook.
+            self._running.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, method, path, elapsed):
+        """
+        Stop ``profiler`` (from the thread that started it) and dump it.
+        """
+        profiler.disable()
+        self._running.release()
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{method}-{slug[:60]}-{elapsed * 1000:.0f}ms.prof"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, filename))
+        except OSError as exc:
+            logger.error("Could not write request profile to %s: %s", self.directory, exc)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_profile_sampler():
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = ProfileSampler(
+                    path=getattr(settings, "INSTRUMENTATION_PROFILE_FILE", None),
+                    directory=getattr(settings, "INSTRUMENTATION_PROFILE_DIR", None),
+                    reload_interval=getattr(settings, "INSTRUMENTATION_PROFILE_RELOAD_SECONDS", 5.0),
+                )
+    return _sampler
@@ -0,0 +1,274 @@
+# core/live.py
+"""
+Push channel for dashboards: new anomalies, plot status changes and thinned
+reading streams, fanned out to server-sent-event subscribers (/api/live/).
+
+Writers call publish() inside their transaction; messages leave only once
+it commits, and are dropped if it rolls back. Backends
+(``LIVE_EVENTS_BACKEND``):
+
+* "postgres" - messages are sent with NOTIFY, and each web process keeps one
+  LISTEN connection that re-dispatches them to its own subscribers, so
+  events raised by run_inference_worker reach every web worker.
+* "local"    - in-process fan-out only; enough under runserver or with
+  ML_INFERENCE_MODE=sync. Used automatically when the database is not
+  PostgreSQL.
+* "off"      - publishing is a no-op.
+
+Every message is a dict with at least "event" and "plot" keys.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "agri_live"
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+MAX_NOTIFY_BYTES = 7500
+
+# Messages buffered per subscriber before it is told to resync.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+LISTEN_RETRY_SECONDS = 5
+
+
+def encode(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+
+class Subscription:
+    """
+    One connected client. ``plot_ids`` of None means every plot; "anomaly"
+    events are only delivered with ``anomalies`` (admins, as on
+    /api/anomalies/). Messages are delivered on the client's event loop;
+    when its queue is full further messages are dropped and ``overflowed``
+    is set so the client can refetch.
+    """
+
+    def __init__(self, loop, plot_ids=None, readings=False, anomalies=True):
+        self.loop = loop
+        self.plot_ids = frozenset(plot_ids) if plot_ids is not None else None
+        self.readings = readings
+        self.anomalies = anomalies
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, message):
+        if message["event"] == "reading" and not self.readings:
+            return False
+        if message["event"] == "anomaly" and not self.anomalies:
+            return False
+        return self.plot_ids is None or message["plot"] in self.plot_ids
+
+    def deliver(self, messages):
+        for message in messages:
+            try:
+                self.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                return
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, plot_ids=None, readings=False, anomalies=True):
+        subscription = Subscription(
+            asyncio.get_running_loop(), plot_ids=plot_ids, readings=readings, anomalies=anomalies,
+        )
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def send(self, messages):
+        self.dispatch(messages)
+
+    def dispatch(self, messages):
+        """
+        Hand messages to the matching subscribers. Safe to call from any thread.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            wanted = [message for message in messages if subscription.wants(message)]
+            if not wanted:
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, wanted)
+            except RuntimeError:
+                # The client's event loop is gone.
+                self.unsubscribe(subscription)
+
+
+class PostgresBroker(LocalBroker):
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, plot_ids=None, readings=False, anomalies=True):
+        self._ensure_listener()
+        return super().subscribe(plot_ids=plot_ids, readings=readings, anomalies=anomalies)
+
+    def send(self, messages):
+        # Runs after commit, so each pg_notify is delivered straight away.
+        with connection.cursor() as cursor:
+            for payload in self._payloads(messages):
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def _payloads(self, messages):
+        """
+        Pack messages into JSON arrays that each fit in one NOTIFY.
+        """
+        batch, batch_size = [], 2
+        for message in messages:
+            encoded = encode(message)
+            size = len(encoded.encode()) + 1
+            if size + 2 > MAX_NOTIFY_BYTES:
+                logger.warning("Dropping live %s event for plot %s: too large for NOTIFY",
+                               message["event"], message["plot"])
+                continue
+            if batch and batch_size + size > MAX_NOTIFY_BYTES:
+                yield "[" + ",".join(batch) + "]"
+                batch, batch_size = [], 2
+            batch.append(encoded)
+            batch_size += size
+        if batch:
+            yield "[" + ",".join(batch) + "]"
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="live-events-listener", daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            raw = None
+            try:
+                wrapper = connections.create_connection(DEFAULT_DB_ALIAS)
+                params = wrapper.get_connection_params()
+                # Bypass a transaction-pooling proxy: LISTEN is session state.
+                if getattr(settings, "LIVE_EVENTS_DB_HOST", None):
+                    params["host"] = settings.LIVE_EVENTS_DB_HOST
+                if getattr(settings, "LIVE_EVENTS_DB_PORT", None):
+                    params["port"] = settings.LIVE_EVENTS_DB_PORT
+                raw = wrapper.get_new_connection(params)
+                raw.autocommit = True
+                with raw.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+
+                while True:
+                    if select.select([raw], [], [], 30) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        notify = raw.notifies.pop(0)
+                        self.dispatch(json.loads(notify.payload))
+            except Exception:
+                logger.exception("Live events listener failed; reconnecting in %ss", LISTEN_RETRY_SECONDS)
+                time.sleep(LISTEN_RETRY_SECONDS)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    The process-wide broker, or None when live events are off.
+    """
+    global _broker
+    backend = getattr(settings, "LIVE_EVENTS_BACKEND", "postgres")
+    if backend == "off":
+        return None
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if backend == "postgres" and connection.vendor == "postgresql":
+                    _broker = PostgresBroker()
+                else:
+                    _broker = LocalBroker()
+    return _broker
+
+
+def _send(broker, messages):
+    try:
+        broker.send(messages)
+    except Exception:
+        # Dashboards can always refetch; never fail the write over a push.
+        logger.exception("Could not publish %d live events", len(messages))
+
+
+def publish(messages):
+    """
+    Publish messages once the current transaction commits.
+    """
+    messages = list(messages)
+    broker = get_broker()
+    if not messages or broker is None:
+        return
+    transaction.on_commit(lambda: _send(broker, messages))
+
+
+_reading_sent_at = {}
+
+
+def publish_readings(readings):
+    """
+    Publish the latest of ``readings`` per plot, at most once per plot every
+    LIVE_READING_INTERVAL seconds (per process).
+    """
+    interval = getattr(settings, "LIVE_READING_INTERVAL", 10)
+    if not interval or get_broker() is None:
+        return
+
+    latest = {}
+    for reading in readings:
+        current = latest.get(reading.plot_id)
+        if current is None or reading.timestamp >= current.timestamp:
+            latest[reading.plot_id] = reading
+
+    now = time.monotonic()
+    messages = []
+    for plot_id, reading in latest.items():
+        if now - _reading_sent_at.get(plot_id, float("-inf")) < interval:
+            continue
+        _reading_sent_at[plot_id] = now
+        messages.append({
+            "event": "reading",
+            "plot": plot_id,
+            "id": reading.pk,
+            "timestamp": reading.timestamp,
+            "soil_moisture": reading.soil_moisture,
+            "air_temperature": reading.air_temperature,
+            "humidity": reading.humidity,
+        })
+
+    publish(messages)
@@ -0,0 +1,128 @@
+import datetime
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.dataset import PLOT_BLOCK, SECONDS_PER_DAY, default_start, generate_days, load_readings
+from core.models import FarmProfile, FieldPlot, SensorReading
+from core.rollups import rebuild_rollups
+from core.services import rebuild_plot_status
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic history (farms x plots x days of readings) "
+        "straight into the database, for benchmarking at volume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--farms", type=int, default=10)
+        parser.add_argument("--plots", type=int, default=10, help="Plots per farm.")
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--interval", type=int, default=300,
+                            help="Seconds between readings of a plot; must divide a day.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--anomaly-rate", type=float, default=0.10,
+                            help="Share of readings with an injected anomaly (simulator default 0.10).")
+        parser.add_argument("--start", type=datetime.date.fromisoformat,
+                            help="First day (UTC, YYYY-MM-DD). Default: --days days before today.")
+        parser.add_argument("--prefix", default="dataset",
+                            help="Username prefix of the generated farm owners.")
+        parser.add_argument("--defer-indexes", action="store_true",
+                            help="Drop SensorReading's secondary indexes during the load and rebuild them "
+                                 "afterwards (PostgreSQL); faster for large loads.")
+        parser.add_argument("--rollups", action="store_true", help="Rebuild rollups of the generated plots.")
+        parser.add_argument("--status", action="store_true", help="Rebuild PlotStatus afterwards.")
+
+    def handle(self, *args, **options):
+        farms, plots_per_farm, days = options["farms"], options["plots"], options["days"]
+        if farms < 1 or plots_per_farm < 1 or days < 1:
+            raise CommandError("--farms, --plots and --days must be positive.")
+        if options["interval"] < 1 or SECONDS_PER_DAY % options["interval"]:
+            raise CommandError("--interval must be a positive divisor of 86400.")
+        if options["defer_indexes"] and connection.vendor != "postgresql":
+            raise CommandError("--defer-indexes requires PostgreSQL.")
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(
+                f"Users named '{options['prefix']}-*' already exist; pick another --prefix or an empty database."
+            )
+
+        if options["start"]:
+            start = datetime.datetime.combine(options["start"], datetime.time(), tzinfo=datetime.timezone.utc)
+        else:
+            start = default_start(days)
+
+        plot_ids = self._create_plots(options["prefix"], farms, plots_per_farm)
+        total = len(plot_ids) * days * (SECONDS_PER_DAY // options["interval"])
+        self.stdout.write(
+            f"{farms} farms x {plots_per_farm} plots x {days} days every {options['interval']} s "
+            f"from {start:%Y-%m-%d}: {total} readings (seed {options['seed']})."
+        )
+
+        started = time.perf_counter()
+        written = 0
+        blocks_per_day = -(-len(plot_ids) // PLOT_BLOCK)
+        chunks = generate_days(
+            plot_ids, start, days,
+            interval=options["interval"], seed=options["seed"], anomaly_rate=options["anomaly_rate"],
+        )
+        deferred = self._drop_indexes() if options["defer_indexes"] else []
+        try:
+            for index, columns in enumerate(chunks, start=1):
+                with transaction.atomic():
+                    written += load_readings(columns)
+                if index % blocks_per_day == 0:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"  day {index // blocks_per_day}/{days}: {written} readings, {written / elapsed:.0f}/s"
+                    )
+        finally:
+            if deferred:
+                self.stdout.write(f"Rebuilding {', '.join(index.name for index in deferred)}...")
+                with connection.schema_editor() as editor:
+                    for index in deferred:
+                        editor.add_index(SensorReading, index)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} readings in {elapsed:.1f} s ({written / elapsed:.0f}/s)."
+        ))
+
+        if options["rollups"]:
+            rollup_started = time.perf_counter()
+            folded = rebuild_rollups(plot_ids=plot_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f"Rolled up {folded} readings in {time.perf_counter() - rollup_started:.1f} s."
+            ))
+        if options["status"]:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt status for {rebuild_plot_status()} plots."))
+
+    def _drop_indexes(self):
+        indexes = list(SensorReading._meta.indexes)
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(SensorReading, index)
+        return indexes
+
+    def _create_plots(self, prefix, farms, plots_per_farm):
+        password = make_password(None)
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f"{prefix}-{index:05d}", password=password) for index in range(farms)
+            )
+            profiles = FarmProfile.objects.bulk_create(
+                FarmProfile(user=user, farm_name=f"Dataset farm {index}", location="Synthetic")
+                for index, user in enumerate(users)
+            )
+            plots = FieldPlot.objects.bulk_create(
+                (
+                    FieldPlot(farm=farm, name=f"Plot {index}", size_hectares=1)
+                    for farm in profiles
+                    for index in range(plots_per_farm)
+                ),
+                batch_size=1000,
+            )
+        return [plot.pk for plot in plots]
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.partitioning import (
+    PartitioningError,
+    convert_to_partitioned,
+    detach_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage monthly PostgreSQL partitions of SensorReading: "
+        "status | convert | create | detach."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["status", "convert", "create", "detach"])
+        parser.add_argument("--months-ahead", type=int, default=3,
+                            help="Future monthly partitions to keep ready (convert/create).")
+        parser.add_argument("--older-than", type=int, default=12,
+                            help="Detach partitions that ended more than N months ago (detach).")
+        parser.add_argument("--drop", action="store_true",
+                            help="Drop detached partitions instead of keeping them for archiving.")
+        parser.add_argument("--keep-legacy", action="store_true",
+                            help="Keep the unpartitioned table as <table>_legacy after convert.")
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(options)
+        except PartitioningError as exc:
+            raise CommandError(str(exc)) from exc
+
+    def handle_status(self, options):
+        if not is_partitioned():
+            self.stdout.write("SensorReading is not partitioned.")
+            return
+        for name, month in list_partitions():
+            self.stdout.write(f"{name}  {month:%Y-%m}")
+
+    def handle_convert(self, options):
+        copied = convert_to_partitioned(
+            months_ahead=options["months_ahead"],
+            keep_legacy=options["keep_legacy"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Partitioned SensorReading, {copied} rows copied."))
+
+    def handle_create(self, options):
+        if not is_partitioned():
+            raise CommandError("SensorReading is not partitioned; run 'reading_partitions convert' first.")
+        names = ensure_partitions(months_ahead=options["months_ahead"])
+        self.stdout.write(self.style.SUCCESS(f"Partitions ready: {', '.join(names)}"))
+
+    def handle_detach(self, options):
+        detached = detach_partitions(options["older_than"], drop=options["drop"])
+        verb = "Dropped" if options["drop"] else "Detached"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(detached)} partitions."))
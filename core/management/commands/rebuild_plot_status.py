@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_plot_status
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialised PlotStatus table from readings and anomaly events."
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_plot_status()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt status for {rebuilt} plots."))
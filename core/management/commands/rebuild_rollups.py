@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute minute/hour/day SensorRollup rows from raw readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plot", type=int, action="append", dest="plots",
+                            help="Only rebuild this plot (repeatable).")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        folded = rebuild_rollups(plot_ids=options["plots"], chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {folded} readings."))
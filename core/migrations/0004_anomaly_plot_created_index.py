@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_anomaly_enrichment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomalyevent',
+            index=models.Index(fields=['plot', '-created_at'], name='anomaly_plot_created_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+
+
+def fill_plot_status(apps, schema_editor):
+    # Same computation as core.services.rebuild_plot_status, on the
+    # historical models, so plots keep their status across the upgrade.
+    FieldPlot = apps.get_model("core", "FieldPlot")
+    SensorReading = apps.get_model("core", "SensorReading")
+    AnomalyEvent = apps.get_model("core", "AnomalyEvent")
+    PlotStatus = apps.get_model("core", "PlotStatus")
+    db_alias = schema_editor.connection.alias
+
+    latest = AnomalyEvent.objects.using(db_alias).filter(plot=OuterRef("pk")).order_by("-reading__timestamp", "-id")
+    plots = FieldPlot.objects.using(db_alias).annotate(
+        last_anomaly_id=Subquery(latest.values("id")[:1]),
+        last_anomaly_at=Subquery(latest.values("reading__timestamp")[:1]),
+        last_severity=Subquery(latest.values("severity")[:1]),
+    ).values("id", "last_anomaly_id", "last_anomaly_at", "last_severity")
+    last_readings = dict(
+        SensorReading.objects.using(db_alias).order_by().values("plot_id")
+        .annotate(last=Max("timestamp")).values_list("plot_id", "last")
+    )
+    counts = {
+        row["plot_id"]: row
+        for row in AnomalyEvent.objects.using(db_alias).filter(plot__isnull=False).order_by().values("plot_id").annotate(
+            total=Count("id"),
+            high=Count("id", filter=Q(severity="high")),
+            medium=Count("id", filter=Q(severity="medium")),
+            low=Count("id", filter=Q(severity="low")),
+        )
+    }
+
+    PlotStatus.objects.using(db_alias).bulk_create(
+        [
+            PlotStatus(
+                plot_id=plot["id"],
+                severity=plot["last_severity"] or "",
+                last_anomaly_id=plot["last_anomaly_id"],
+                last_anomaly_at=plot["last_anomaly_at"],
+                last_reading_at=last_readings.get(plot["id"]),
+                anomaly_count=counts.get(plot["id"], {}).get("total", 0),
+                high_count=counts.get(plot["id"], {}).get("high", 0),
+                medium_count=counts.get(plot["id"], {}).get("medium", 0),
+                low_count=counts.get(plot["id"], {}).get("low", 0),
+            )
+            for plot in plots
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_anomaly_plot_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlotStatus',
+            fields=[
+                ('plot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_status', serialize=False, to='core.fieldplot')),
+                ('severity', models.CharField(blank=True, default='', max_length=20)),
+                ('last_anomaly_at', models.DateTimeField(blank=True, null=True)),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True)),
+                ('anomaly_count', models.PositiveIntegerField(default=0)),
+                ('high_count', models.PositiveIntegerField(default=0)),
+                ('medium_count', models.PositiveIntegerField(default=0)),
+                ('low_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_anomaly', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.anomalyevent')),
+            ],
+        ),
+        migrations.RunPython(fill_plot_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_sensorreading_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomalyevent',
+            index=models.Index(fields=['-created_at'], name='anomaly_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_anomaly_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', 'Minute'), ('1h', 'Hour'), ('1d', 'Day')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('soil_moisture_min', models.FloatField()),
+                ('soil_moisture_max', models.FloatField()),
+                ('soil_moisture_sum', models.FloatField()),
+                ('air_temperature_min', models.FloatField()),
+                ('air_temperature_max', models.FloatField()),
+                ('air_temperature_sum', models.FloatField()),
+                ('humidity_min', models.FloatField()),
+                ('humidity_max', models.FloatField()),
+                ('humidity_sum', models.FloatField()),
+                ('plot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.fieldplot')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('plot', 'resolution', 'bucket_start'), name='unique_rollup_bucket')],
+            },
+        ),
+    ]
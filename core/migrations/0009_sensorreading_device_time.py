@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+UNIQUE_KEY = models.UniqueConstraint(
+    condition=models.Q(('device_id__isnull', False)),
+    fields=('device_id', 'sequence'),
+    name='unique_reading_device_sequence',
+)
+
+
+def copy_received_at(apps, schema_editor):
+    # Until now ``timestamp`` was the receive time.
+    SensorReading = apps.get_model("core", "SensorReading")
+    SensorReading.objects.update(received_at=models.F("timestamp"))
+
+
+def _is_partitioned(schema_editor, table):
+    if schema_editor.connection.vendor != "postgresql":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def add_unique_key(apps, schema_editor):
+    # A table converted by "reading_partitions convert" only accepts unique
+    # indexes containing its partition key (see core.partitioning).
+    SensorReading = apps.get_model("core", "SensorReading")
+    table = SensorReading._meta.db_table
+    if _is_partitioned(schema_editor, table):
+        qn = schema_editor.quote_name
+        schema_editor.execute(
+            f"CREATE UNIQUE INDEX {qn(UNIQUE_KEY.name)} ON {qn(table)} "
+            f"(device_id, sequence, timestamp) WHERE device_id IS NOT NULL"
+        )
+    else:
+        schema_editor.add_constraint(SensorReading, UNIQUE_KEY)
+
+
+def remove_unique_key(apps, schema_editor):
+    SensorReading = apps.get_model("core", "SensorReading")
+    if _is_partitioned(schema_editor, SensorReading._meta.db_table):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(UNIQUE_KEY.name)}")
+    else:
+        schema_editor.remove_constraint(SensorReading, UNIQUE_KEY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sensorrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='received_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_received_at, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='device_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='sensorreading',
+            name='sequence',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(model_name='sensorreading', constraint=UNIQUE_KEY),
+            ],
+            database_operations=[
+                migrations.RunPython(add_unique_key, remove_unique_key),
+            ],
+        ),
+    ]
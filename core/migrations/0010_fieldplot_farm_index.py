@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sensorreading_device_time'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fieldplot',
+            index=models.Index(fields=['farm', 'id'], name='plot_farm_idx'),
+        ),
+        migrations.AlterField(
+            model_name='fieldplot',
+            name='farm',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='plots', to='core.farmprofile'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 # ------------- FARM PROFILE -------------
@@ -22,10 +23,16 @@ class FarmProfile(models.Model):
 
 # ------------- FIELD PLOT -------------
 class FieldPlot(models.Model):
-    farm = models.ForeignKey(FarmProfile, on_delete=models.CASCADE, related_name="plots")
+    # Indexed by plot_farm_idx, which also serves per-farm plot lists in id order.
+    farm = models.ForeignKey(FarmProfile, on_delete=models.CASCADE, related_name="plots", db_index=False)
     name = models.CharField(max_length=100)
     size_hectares = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["farm", "id"], name="plot_farm_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.farm.farm_name})"
 
@@ -33,7 +40,13 @@ class FieldPlot(models.Model):
 # ------------- SENSOR READING -------------
 class SensorReading(models.Model):
     plot = models.ForeignKey(FieldPlot, on_delete=models.CASCADE, related_name="readings")
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Measurement time as reported by the device; server time when it sends none.
+    timestamp = models.DateTimeField(default=timezone.now)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    # Idempotency key: a retried (device_id, sequence) is not stored twice.
+    device_id = models.CharField(max_length=64, null=True, blank=True)
+    sequence = models.PositiveBigIntegerField(null=True, blank=True)
 
     # Sensor values
     soil_moisture = models.FloatField()
@@ -42,6 +55,17 @@ class SensorReading(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=["plot", "-timestamp"], name="reading_plot_ts_idx"),
+            models.Index(fields=["-timestamp"], name="reading_ts_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device_id", "sequence"],
+                condition=models.Q(device_id__isnull=False),
+                name="unique_reading_device_sequence",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.plot.name} - {self.timestamp}"
@@ -59,6 +83,10 @@ class AnomalyEvent(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["plot", "-created_at"], name="anomaly_plot_created_idx"),
+            models.Index(fields=["-created_at"], name="anomaly_created_idx"),
+        ]
         constraints = [
             models.UniqueConstraint(fields=["reading"], name="unique_anomaly_per_reading"),
         ]
@@ -77,3 +105,65 @@ class AgentRecommendation(models.Model):
 
     def __str__(self):
         return f"Recommendation for {self.anomaly.id}"
+
+
+# ------------- PLOT STATUS -------------
+class PlotStatus(models.Model):
+    """
+    Materialised per-plot status, maintained incrementally by ml.services
+    and rebuilt from scratch by the rebuild_plot_status command.
+    """
+    plot = models.OneToOneField(FieldPlot, on_delete=models.CASCADE, primary_key=True, related_name="current_status")
+    severity = models.CharField(max_length=20, blank=True, default="")
+    last_anomaly = models.ForeignKey(AnomalyEvent, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # Measurement times (SensorReading.timestamp) of the latest anomaly and reading.
+    last_anomaly_at = models.DateTimeField(null=True, blank=True)
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+
+    # Counts of anomaly events for this plot, per severity.
+    anomaly_count = models.PositiveIntegerField(default=0)
+    high_count = models.PositiveIntegerField(default=0)
+    medium_count = models.PositiveIntegerField(default=0)
+    low_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Status of plot {self.plot_id}: {self.severity or 'ok'}"
+
+
+# ------------- SENSOR ROLLUP -------------
+class SensorRollup(models.Model):
+    """
+    Per-plot min/max/sum/count of each metric over a minute, hour or day
+    bucket. Maintained incrementally by core.rollups as readings arrive.
+    """
+    RESOLUTION_CHOICES = (
+        ('1m', 'Minute'),
+        ('1h', 'Hour'),
+        ('1d', 'Day'),
+    )
+
+    plot = models.ForeignKey(FieldPlot, on_delete=models.CASCADE, related_name="rollups")
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    soil_moisture_min = models.FloatField()
+    soil_moisture_max = models.FloatField()
+    soil_moisture_sum = models.FloatField()
+    air_temperature_min = models.FloatField()
+    air_temperature_max = models.FloatField()
+    air_temperature_sum = models.FloatField()
+    humidity_min = models.FloatField()
+    humidity_max = models.FloatField()
+    humidity_sum = models.FloatField()
+
+    class Meta:
+        ordering = ["bucket_start"]
+        constraints = [
+            models.UniqueConstraint(fields=["plot", "resolution", "bucket_start"], name="unique_rollup_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.plot_id} {self.resolution} {self.bucket_start}"
@@ -0,0 +1,218 @@
+# core/partitioning.py
+"""
+Opt-in PostgreSQL range partitioning of SensorReading by month.
+
+``convert_to_partitioned`` rebuilds core_sensorreading as a table
+partitioned on ``timestamp`` (one partition per month plus a DEFAULT
+partition), ``ensure_partitions`` creates upcoming months ahead of time and
+``detach_partitions`` detaches (optionally drops) old months. All of it is
+driven by the ``reading_partitions`` management command.
+
+PostgreSQL requires the primary key of a partitioned table to contain the
+partition key, so the key becomes ``(id, timestamp)`` and foreign keys that
+point at readings (AnomalyEvent.reading, InferenceJob.reading) are dropped
+at conversion time. Ids stay unique through their sequence.
+
+Unique indexes must contain the partition key too, so the
+unique_reading_device_sequence idempotency index becomes
+``(device_id, sequence, timestamp)``. Keyed readings must carry their
+device timestamp and gateways resend a buffered reading with it, so
+retries are still rejected; the same sequence number with a different
+timestamp is no longer caught. Migration 0009 builds the same index on a
+table converted before it.
+"""
+
+import datetime
+import re
+
+from django.db import connection, transaction
+
+from core.models import SensorReading
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _table():
+    return SensorReading._meta.db_table
+
+
+def _month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f"{_table()}_p{month:%Y%m}"
+
+
+def _check_backend():
+    if connection.vendor != "postgresql":
+        raise PartitioningError("SensorReading partitioning requires PostgreSQL.")
+
+
+def is_partitioned():
+    _check_backend()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [_table()],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Monthly partitions currently attached, as (name, month start) tuples.
+    """
+    _check_backend()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [_table()],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+    return partitions
+
+
+def _create_partition(cursor, month):
+    qn = connection.ops.quote_name
+    upper = _add_months(month, 1)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {qn(_partition_name(month))} "
+        f"PARTITION OF {qn(_table())} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+    )
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Create partitions for the current month and ``months_ahead`` following
+    months. Returns the names of the partitions that now exist for that range.
+    """
+    _check_backend()
+    current = _month_start(today or datetime.date.today())
+    months = [_add_months(current, offset) for offset in range(months_ahead + 1)]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in months:
+            _create_partition(cursor, month)
+
+    return [_partition_name(month) for month in months]
+
+
+def detach_partitions(older_than_months, drop=False, today=None):
+    """
+    Detach monthly partitions that end before ``older_than_months`` months ago.
+    Detached tables are kept for archiving unless ``drop`` is set.
+    """
+    _check_backend()
+    qn = connection.ops.quote_name
+    cutoff = _add_months(_month_start(today or datetime.date.today()), -older_than_months)
+
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, month in list_partitions():
+            if _add_months(month, 1) > cutoff:
+                continue
+            cursor.execute(f"ALTER TABLE {qn(_table())} DETACH PARTITION {qn(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            detached.append(name)
+
+    return detached
+
+
+def convert_to_partitioned(months_ahead=3, keep_legacy=False):
+    """
+    Rebuild core_sensorreading as a monthly range-partitioned table and copy
+    existing rows into it. Runs in a single transaction and takes an
+    exclusive lock on the readings table for its duration.
+    """
+    _check_backend()
+    if is_partitioned():
+        raise PartitioningError(f"{_table()} is already partitioned.")
+
+    qn = connection.ops.quote_name
+    table = _table()
+    legacy = f"{table}_legacy"
+    sequence = f"{table}_part_id_seq"
+    plot_table = SensorReading._meta.get_field("plot").related_model._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Foreign keys cannot reference a partitioned table by id alone.
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname
+            FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = to_regclass(%s)
+            """,
+            [table],
+        )
+        for relation, constraint in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {relation} DROP CONSTRAINT {qn(constraint)}")
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [legacy])
+        for (index,) in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {qn(index)} RENAME TO {qn((index + '_legacy')[:63])}")
+
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        cursor.execute(f"CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id")
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {qn(legacy)}), 0) + 1, false)",
+            [sequence],
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_plot_id_fk')} "
+            f"FOREIGN KEY (plot_id) REFERENCES {qn(plot_table)} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        cursor.execute(f"CREATE INDEX reading_plot_ts_idx ON {qn(table)} (plot_id, timestamp DESC)")
+        cursor.execute(f"CREATE INDEX reading_ts_idx ON {qn(table)} (timestamp DESC)")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX unique_reading_device_sequence ON {qn(table)} "
+            f"(device_id, sequence, timestamp) WHERE device_id IS NOT NULL"
+        )
+
+        cursor.execute(f"SELECT MIN(timestamp) FROM {qn(legacy)}")
+        oldest = cursor.fetchone()[0]
+        current = _month_start(datetime.date.today())
+        month = _month_start(oldest.date()) if oldest else current
+        while month <= _add_months(current, months_ahead):
+            _create_partition(cursor, month)
+            month = _add_months(month, 1)
+        # Catches rows outside the prepared range instead of failing the insert.
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(legacy)}")
+        cursor.execute(f"SELECT COUNT(*) FROM {qn(table)}")
+        copied = cursor.fetchone()[0]
+
+        if not keep_legacy:
+            cursor.execute(f"DROP TABLE {qn(legacy)}")
+
+    return copied
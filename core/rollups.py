@@ -0,0 +1,329 @@
+# core/rollups.py
+"""
+Downsampled minute/hour/day rollups of sensor readings.
+
+Each reading is folded into one SensorRollup row per resolution with an
+additive upsert (count/sum add up, min/max widen), so rollups stay correct
+whatever order readings arrive in and never need to re-read raw history.
+Edits and deletes of readings refold the plot-days they touch
+(refresh_rollups).
+"""
+
+import datetime
+import re
+
+import numpy as np
+from django.db import connection, transaction
+
+from core.instrumentation import stage
+from core.models import SensorReading, SensorRollup
+
+RESOLUTIONS = {
+    "1m": 60,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+METRICS = ("soil_moisture", "air_temperature", "humidity")
+
+BUCKET_PATTERN = re.compile(r"^(\d+)([mhd])$")
+BUCKET_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+# Rows per INSERT, keeps statements under SQLite's bound-parameter limit.
+UPSERT_BATCH = 50
+
+
+def parse_bucket(value):
+    """
+    Parse a bucket size such as "5m", "1h" or "7d" into seconds, or None.
+    """
+    match = BUCKET_PATTERN.match(value or "")
+    if not match or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+
+
+def bucket_floor(value, seconds):
+    epoch = int(value.timestamp())
+    return datetime.datetime.fromtimestamp(epoch - epoch % seconds, tz=datetime.timezone.utc)
+
+
+def pick_resolution(bucket_seconds):
+    """
+    Coarsest stored resolution that evenly divides the requested bucket.
+    """
+    candidates = [
+        (seconds, name)
+        for name, seconds in RESOLUTIONS.items()
+        if seconds <= bucket_seconds and bucket_seconds % seconds == 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates)[1]
+
+
+def _new_bucket(reading):
+    bucket = {"count": 0}
+    for metric in METRICS:
+        value = getattr(reading, metric)
+        bucket[f"{metric}_min"] = value
+        bucket[f"{metric}_max"] = value
+        bucket[f"{metric}_sum"] = 0.0
+    return bucket
+
+
+def _fold(bucket, reading):
+    bucket["count"] += 1
+    for metric in METRICS:
+        value = getattr(reading, metric)
+        bucket[f"{metric}_min"] = min(bucket[f"{metric}_min"], value)
+        bucket[f"{metric}_max"] = max(bucket[f"{metric}_max"], value)
+        bucket[f"{metric}_sum"] += value
+
+
+def _upsert_sql(row_count):
+    qn = connection.ops.quote_name
+    table = qn(SensorRollup._meta.db_table)
+    value_columns = ["count"] + [
+        f"{metric}_{stat}" for metric in METRICS for stat in ("min", "max", "sum")
+    ]
+    columns = ["plot_id", "resolution", "bucket_start"] + value_columns
+
+    least, greatest = ("LEAST", "GREATEST") if connection.vendor == "postgresql" else ("MIN", "MAX")
+    updates = []
+    for column in value_columns:
+        target = f"{table}.{qn(column)}"
+        excluded = f"EXCLUDED.{qn(column)}"
+        if column.endswith("_min"):
+            updates.append(f"{qn(column)} = {least}({target}, {excluded})")
+        elif column.endswith("_max"):
+            updates.append(f"{qn(column)} = {greatest}({target}, {excluded})")
+        else:
+            updates.append(f"{qn(column)} = {target} + {excluded}")
+
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES {', '.join([placeholders] * row_count)} "
+        f"ON CONFLICT ({qn('plot_id')}, {qn('resolution')}, {qn('bucket_start')}) "
+        f"DO UPDATE SET {', '.join(updates)}"
+    ), value_columns
+
+
+@stage("rollups")
+def update_rollups(readings):
+    """
+    Fold readings into their minute/hour/day rollups. Readings are grouped
+    in memory first, so a batch costs one statement per UPSERT_BATCH buckets.
+    """
+    buckets = {}
+    for reading in readings:
+        for resolution, seconds in RESOLUTIONS.items():
+            key = (reading.plot_id, resolution, bucket_floor(reading.timestamp, seconds))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _new_bucket(reading)
+            _fold(bucket, reading)
+
+    return _upsert_buckets(buckets)
+
+
+@stage("rollups")
+def update_rollups_columns(plot_ids, timestamps, soil_moisture, air_temperature, humidity):
+    """
+    update_rollups() for parallel columns, grouped with NumPy: rows are
+    sorted by (plot, bucket) once per resolution and reduced per group with
+    ufunc.reduceat, with no Python work per reading.
+    """
+    plot_ids = np.asarray(plot_ids, dtype=np.int64)
+    if not len(plot_ids):
+        return 0
+    epochs = np.fromiter((int(value.timestamp()) for value in timestamps), dtype=np.int64, count=len(plot_ids))
+    values = {
+        "soil_moisture": np.asarray(soil_moisture, dtype=np.float64),
+        "air_temperature": np.asarray(air_temperature, dtype=np.float64),
+        "humidity": np.asarray(humidity, dtype=np.float64),
+    }
+
+    buckets = {}
+    for resolution, seconds in RESOLUTIONS.items():
+        starts = epochs - epochs % seconds
+        order = np.lexsort((starts, plot_ids))
+        group_plots, group_starts = plot_ids[order], starts[order]
+        changed = (np.diff(group_plots) != 0) | (np.diff(group_starts) != 0)
+        heads = np.concatenate(([0], np.flatnonzero(changed) + 1))
+        counts = np.diff(np.append(heads, len(order)))
+
+        columns = {"count": counts.tolist()}
+        for metric in METRICS:
+            ordered = values[metric][order]
+            columns[f"{metric}_min"] = np.minimum.reduceat(ordered, heads).tolist()
+            columns[f"{metric}_max"] = np.maximum.reduceat(ordered, heads).tolist()
+            columns[f"{metric}_sum"] = np.add.reduceat(ordered, heads).tolist()
+
+        for index, (plot_id, start) in enumerate(zip(group_plots[heads].tolist(), group_starts[heads].tolist())):
+            key = (plot_id, resolution, datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc))
+            buckets[key] = {name: column[index] for name, column in columns.items()}
+
+    return _upsert_buckets(buckets)
+
+
+def _upsert_buckets(buckets):
+    if not buckets:
+        return 0
+
+    items = list(buckets.items())
+    adapt = connection.ops.adapt_datetimefield_value
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_BATCH):
+            chunk = items[start:start + UPSERT_BATCH]
+            sql, value_columns = _upsert_sql(len(chunk))
+            params = []
+            for (plot_id, resolution, bucket_start), bucket in chunk:
+                params.extend([plot_id, resolution, adapt(bucket_start)])
+                params.extend(bucket[column] for column in value_columns)
+            cursor.execute(sql, params)
+
+    return len(items)
+
+
+def rebuild_rollups(plot_ids=None, chunk_size=5000):
+    """
+    Recompute rollups from raw readings, optionally for some plots only.
+    Returns the number of readings folded.
+
+    On PostgreSQL each resolution is one ``INSERT ... SELECT ... GROUP BY``,
+    so large histories are rebuilt in the database; elsewhere readings are
+    folded in Python, ``chunk_size`` at a time.
+    """
+    rollups = SensorRollup.objects.all()
+    readings = SensorReading.objects.order_by("pk")
+    if plot_ids:
+        rollups = rollups.filter(plot_id__in=plot_ids)
+        readings = readings.filter(plot_id__in=plot_ids)
+
+    if connection.vendor == "postgresql":
+        with transaction.atomic():
+            rollups.delete()
+            return _rebuild_rollups_sql(plot_ids)
+
+    rollups.delete()
+
+    folded = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            readings.filter(pk__gt=last_pk)
+            .only("id", "plot_id", "timestamp", *METRICS)[:chunk_size]
+        )
+        if not chunk:
+            break
+        update_rollups(chunk)
+        folded += len(chunk)
+        last_pk = chunk[-1].pk
+
+    return folded
+
+
+def refresh_rollups(points):
+    """
+    Recompute the rollups around ``points`` ((plot_id, timestamp) pairs)
+    from raw readings, after readings there were edited or deleted: counts
+    and sums could be subtracted, but min/max cannot. Every resolution
+    divides a day, so each touched plot-day is deleted and refolded whole.
+    """
+    day = RESOLUTIONS[max(RESOLUTIONS, key=RESOLUTIONS.get)]
+    days = {(plot_id, bucket_floor(timestamp, day)) for plot_id, timestamp in points if plot_id is not None}
+    with transaction.atomic():
+        for plot_id, start in sorted(days):
+            end = start + datetime.timedelta(seconds=day)
+            SensorRollup.objects.filter(plot_id=plot_id, bucket_start__gte=start, bucket_start__lt=end).delete()
+            update_rollups(
+                SensorReading.objects
+                .filter(plot_id=plot_id, timestamp__gte=start, timestamp__lt=end)
+                .only("id", "plot_id", "timestamp", *METRICS)
+            )
+    return len(days)
+
+
+def _rebuild_rollups_sql(plot_ids):
+    qn = connection.ops.quote_name
+    stats = [
+        f"{function}({qn(metric)})"
+        for metric in METRICS
+        for function in ("MIN", "MAX", "SUM")
+    ]
+    columns = ["plot_id", "resolution", "bucket_start", "count"] + [
+        f"{metric}_{stat}" for metric in METRICS for stat in ("min", "max", "sum")
+    ]
+    where, params = ("WHERE plot_id = ANY(%s)", [list(plot_ids)]) if plot_ids else ("", [])
+
+    # Readings are counted off the coarsest resolution, which has the fewest rows.
+    coarsest = max(RESOLUTIONS, key=RESOLUTIONS.get)
+    folded = 0
+    with connection.cursor() as cursor:
+        for resolution, seconds in RESOLUTIONS.items():
+            # Same bucket edges as bucket_floor(): whole seconds, UTC-aligned.
+            cursor.execute(
+                f"INSERT INTO {qn(SensorRollup._meta.db_table)} ({', '.join(qn(c) for c in columns)}) "
+                f"SELECT plot_id, %s, "
+                f"to_timestamp(floor(extract(epoch FROM {qn('timestamp')}) / %s) * %s) AS bucket, "
+                f"COUNT(*), {', '.join(stats)} "
+                f"FROM {qn(SensorReading._meta.db_table)} {where} "
+                f"GROUP BY plot_id, bucket"
+                + (f" RETURNING {qn('count')}" if resolution == coarsest else ""),
+                [resolution, seconds, seconds, *params],
+            )
+            if resolution == coarsest:
+                folded = sum(row[0] for row in cursor.fetchall())
+
+    return folded
+
+
+def aggregate_series(plot_id, bucket_seconds, start, end):
+    """
+    Min/max/mean/count per metric for ``plot_id`` in ``bucket_seconds``
+    buckets over [start, end), read from the coarsest rollup that fits.
+    Returns (resolution used, list of bucket dicts).
+    """
+    resolution = pick_resolution(bucket_seconds)
+    if resolution is None:
+        return None, []
+
+    rows = (
+        SensorRollup.objects
+        .filter(
+            plot_id=plot_id,
+            resolution=resolution,
+            bucket_start__gte=bucket_floor(start, RESOLUTIONS[resolution]),
+            bucket_start__lt=end,
+        )
+        .order_by("bucket_start")
+        .values()
+    )
+
+    merged = {}
+    for row in rows:
+        key = bucket_floor(row["bucket_start"], bucket_seconds)
+        bucket = merged.get(key)
+        if bucket is None:
+            merged[key] = dict(row)
+            continue
+        bucket["count"] += row["count"]
+        for metric in METRICS:
+            bucket[f"{metric}_min"] = min(bucket[f"{metric}_min"], row[f"{metric}_min"])
+            bucket[f"{metric}_max"] = max(bucket[f"{metric}_max"], row[f"{metric}_max"])
+            bucket[f"{metric}_sum"] += row[f"{metric}_sum"]
+
+    series = []
+    for bucket_start, bucket in merged.items():
+        point = {"bucket_start": bucket_start, "count": bucket["count"]}
+        for metric in METRICS:
+            point[metric] = {
+                "min": bucket[f"{metric}_min"],
+                "max": bucket[f"{metric}_max"],
+                "mean": bucket[f"{metric}_sum"] / bucket["count"] if bucket["count"] else None,
+            }
+        series.append(point)
+
+    return resolution, series
@@ -1,19 +1,319 @@
-from core.models import FieldPlot, AnomalyEvent
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Max, OuterRef, Q, Subquery, Value, When
+
+from core.instrumentation import stage
+from core.live import publish, publish_readings
+from core.models import FarmProfile, FieldPlot, AnomalyEvent, PlotStatus, SensorReading
+from core.versions import bump_all_versions, bump_plot_versions
+
+SEVERITY_STATUS = {
+    "high": "CRITICAL",
+    "medium": "WARNING",
+}
+
+
+SEVERITY_COUNT_FIELDS = {
+    "high": "high_count",
+    "medium": "medium_count",
+    "low": "low_count",
+}
+
+# Reading field behind each metric reported for an anomaly.
+METRIC_FIELDS = {
+    "temperature": "air_temperature",
+    "humidity": "humidity",
+    "soil_moisture": "soil_moisture",
+}
+
+PLOT_STATUS_FIELDS = [
+    "severity",
+    "last_anomaly",
+    "last_anomaly_at",
+    "last_reading_at",
+    "anomaly_count",
+    "high_count",
+    "medium_count",
+    "low_count",
+    "updated_at",
+]
+
+
+def severity_to_status(severity):
+    return SEVERITY_STATUS.get(severity, "OK")
+
+
+def anomaly_metric(anomaly_type):
+    a_type = (anomaly_type or "").lower()
+    if "temperature" in a_type:
+        return "temperature"
+    if "humidity" in a_type:
+        return "humidity"
+    return "soil_moisture"
+
+
+def with_anomaly_metric(queryset):
+    """
+    Annotate AnomalyEvents with ``metric`` (anomaly_metric() in SQL) and
+    ``metric_value`` (that metric on the event's reading), so serialising
+    a list reads two columns instead of loading every reading.
+    """
+    matches = [("temperature", "temperature"), ("humidity", "humidity")]
+    return queryset.annotate(
+        metric=Case(
+            *(When(anomaly_type__icontains=text, then=Value(metric)) for text, metric in matches),
+            default=Value("soil_moisture"),
+            output_field=CharField(),
+        ),
+        metric_value=Case(
+            *(When(anomaly_type__icontains=text, then=F(f"reading__{METRIC_FIELDS[metric]}")) for text, metric in matches),
+            default=F(f"reading__{METRIC_FIELDS['soil_moisture']}"),
+        ),
+    )
+
+
+# Farm id and role are read by every permission check and farm-scoped
+# queryset; core.signals drops the cached pair whenever the FarmProfile is
+# saved or deleted.
+FARM_CACHE_SECONDS = 300
+
+
+def farm_cache_key(user_id):
+    return f"farm:{user_id}"
+
+
+def get_user_farm(user):
+    """
+    ``(farm id, role)`` of ``user``'s FarmProfile, or ``(None, "")`` without one, cached.
+    """
+    key = farm_cache_key(user.pk)
+    farm = cache.get(key)
+    if farm is None:
+        farm = FarmProfile.objects.filter(user_id=user.pk).values_list("id", "role").first() or (None, "")
+        cache.set(key, tuple(farm), FARM_CACHE_SECONDS)
+    return tuple(farm)
+
+
+def get_farm_role(user):
+    return get_user_farm(user)[1]
+
+
+def plot_status_payload(plot):
+    """
+    Status row for /plots/status/, read from the materialised PlotStatus.
+    """
+    try:
+        current = plot.current_status
+    except PlotStatus.DoesNotExist:
+        current = None
+
+    return {
+        "id": plot.id,
+        "name": plot.name,
+        "size_hectares": plot.size_hectares,
+        "status": severity_to_status(current.severity if current else None),
+        "last_anomaly_at": current.last_anomaly_at if current else None,
+        "last_reading_at": current.last_reading_at if current else None,
+    }
+
+
+def anomaly_message(event, reading):
+    """
+    Live "anomaly" event, shaped like AnomalyEventSerializer output.
+    """
+    metric = anomaly_metric(event.anomaly_type)
+    return {
+        "event": "anomaly",
+        "plot": event.plot_id,
+        "id": event.pk,
+        "reading": event.reading_id,
+        "anomaly_type": event.anomaly_type,
+        "severity": event.severity,
+        "message": event.message,
+        "recommendation": event.recommendation,
+        "created_at": event.created_at,
+        "metric": metric,
+        "value": getattr(reading, METRIC_FIELDS[metric]),
+    }
+
+
+def publish_anomalies(events_and_readings):
+    """
+    Publish new (event, reading) pairs to live dashboards on commit.
+    """
+    publish(anomaly_message(event, reading) for event, reading in events_and_readings if event.plot_id)
+
 
 def get_plot_status(plot):
     last_event = (
         AnomalyEvent.objects
-        .filter(reading__plot=plot)
-        .order_by("-created_at")
+        .filter(plot=plot)
+        .order_by("-reading__timestamp", "-id")
         .first()
     )
 
     if not last_event:
         return "OK", None
 
-    if last_event.severity == "high":
-        return "CRITICAL", last_event
-    elif last_event.severity == "medium":
-        return "WARNING", last_event
+    return severity_to_status(last_event.severity), last_event
+
+
+def _adjust_severity_count(status, severity, delta):
+    field = SEVERITY_COUNT_FIELDS.get(severity)
+    if field:
+        setattr(status, field, max(getattr(status, field) + delta, 0))
+
+
+@stage("plot_status")
+def apply_plot_status_changes(readings=(), created_events=(), changed_events=()):
+    """
+    Fold new readings and created/changed anomaly events into PlotStatus.
+
+    ``changed_events`` is an iterable of ``(event, previous_severity)``.
+    Uses a fixed number of queries per call, however many plots are touched.
+
+    "Latest" means latest by measurement time (the reading's timestamp), so
+    a late reading only becomes the plot's last anomaly or last reading if
+    nothing newer has been measured since; otherwise it only adds to the
+    counts.
+    Status changes (OK/WARNING/CRITICAL) and thinned readings are published
+    to live dashboards.
+    """
+    readings = list(readings)
+    measured_at = {reading.pk: reading.timestamp for reading in readings}
+    created_events = [event for event in created_events if event.plot_id]
+    changed_events = [(event, previous) for event, previous in changed_events if event.plot_id]
+
+    plot_ids = (
+        {reading.plot_id for reading in readings}
+        | {event.plot_id for event in created_events}
+        | {event.plot_id for event, _ in changed_events}
+    )
+    if not plot_ids:
+        return
+
+    bump_plot_versions(plot_ids)
+    with transaction.atomic():
+        PlotStatus.objects.bulk_create(
+            [PlotStatus(plot_id=plot_id) for plot_id in plot_ids],
+            ignore_conflicts=True,
+        )
+        statuses = {
+            status.plot_id: status
+            for status in PlotStatus.objects.select_for_update().filter(plot_id__in=plot_ids)
+        }
+        previous = {plot_id: severity_to_status(status.severity) for plot_id, status in statuses.items()}
+
+        for reading in readings:
+            status = statuses[reading.plot_id]
+            if status.last_reading_at is None or reading.timestamp > status.last_reading_at:
+                status.last_reading_at = reading.timestamp
+
+        for event in created_events:
+            status = statuses[event.plot_id]
+            status.anomaly_count += 1
+            _adjust_severity_count(status, event.severity, 1)
+            event_at = measured_at.get(event.reading_id, event.created_at)
+            # Same order as rebuild_plot_status: measurement time, then id.
+            latest = (status.last_anomaly_at, status.last_anomaly_id or 0)
+            if status.last_anomaly_at is None or (event_at, event.pk) > latest:
+                status.last_anomaly_id = event.pk
+                status.last_anomaly_at = event_at
+                status.severity = event.severity
+
+        for event, previous_severity in changed_events:
+            status = statuses[event.plot_id]
+            if previous_severity != event.severity:
+                _adjust_severity_count(status, previous_severity, -1)
+                _adjust_severity_count(status, event.severity, 1)
+            if status.last_anomaly_id == event.pk:
+                status.severity = event.severity
+
+        PlotStatus.objects.bulk_update(statuses.values(), PLOT_STATUS_FIELDS)
+
+        publish(
+            {
+                "event": "plot_status",
+                "plot": plot_id,
+                "status": severity_to_status(status.severity),
+                "previous_status": previous[plot_id],
+                "last_anomaly_at": status.last_anomaly_at,
+                "last_reading_at": status.last_reading_at,
+            }
+            for plot_id, status in statuses.items()
+            if severity_to_status(status.severity) != previous[plot_id]
+        )
+        publish_readings(readings)
+
+
+def rebuild_plot_status(plot_ids=None):
+    """
+    Recompute PlotStatus rows from SensorReading and AnomalyEvent, for every
+    plot or only for ``plot_ids``. Returns the number of rows written.
+    """
+    plots = FieldPlot.objects.all()
+    readings = SensorReading.objects.all()
+    events = AnomalyEvent.objects.filter(plot__isnull=False)
+    statuses = PlotStatus.objects.all()
+    if plot_ids is None:
+        bump_all_versions()
+    else:
+        plot_ids = {int(plot_id) for plot_id in plot_ids if plot_id is not None}
+        if not plot_ids:
+            return 0
+        bump_plot_versions(plot_ids)
+        plots = plots.filter(pk__in=plot_ids)
+        readings = readings.filter(plot_id__in=plot_ids)
+        events = events.filter(plot_id__in=plot_ids)
+        statuses = statuses.filter(plot_id__in=plot_ids)
+
+    latest = AnomalyEvent.objects.filter(plot=OuterRef("pk")).order_by("-reading__timestamp", "-id")
+
+    plots = (
+        plots
+        .annotate(
+            last_anomaly_id=Subquery(latest.values("id")[:1]),
+            last_anomaly_at=Subquery(latest.values("reading__timestamp")[:1]),
+            last_severity=Subquery(latest.values("severity")[:1]),
+        )
+        .values("id", "last_anomaly_id", "last_anomaly_at", "last_severity")
+    )
+
+    last_readings = dict(
+        readings.order_by().values("plot_id").annotate(last=Max("timestamp")).values_list("plot_id", "last")
+    )
+    counts = {
+        row["plot_id"]: row
+        for row in (
+            events
+            .order_by()
+            .values("plot_id")
+            .annotate(
+                total=Count("id"),
+                high=Count("id", filter=Q(severity="high")),
+                medium=Count("id", filter=Q(severity="medium")),
+                low=Count("id", filter=Q(severity="low")),
+            )
+        )
+    }
+
+    rows = []
+    for plot in plots:
+        plot_counts = counts.get(plot["id"], {})
+        rows.append(PlotStatus(
+            plot_id=plot["id"],
+            severity=plot["last_severity"] or "",
+            last_anomaly_id=plot["last_anomaly_id"],
+            last_anomaly_at=plot["last_anomaly_at"],
+            last_reading_at=last_readings.get(plot["id"]),
+            anomaly_count=plot_counts.get("total", 0),
+            high_count=plot_counts.get("high", 0),
+            medium_count=plot_counts.get("medium", 0),
+            low_count=plot_counts.get("low", 0),
+        ))
+
+    with transaction.atomic():
+        statuses.delete()
+        PlotStatus.objects.bulk_create(rows, batch_size=1000)
 
-    return "OK", last_event
+    return len(rows)
@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from core.models import SensorReading
+from core.models import AnomalyEvent, FarmProfile, FieldPlot, SensorReading
+from core.rollups import update_rollups
+from core.services import farm_cache_key
+from core.versions import bump_plot_versions
+from ml.inference_queue import enqueue_inference, inference_is_queued
 from ml.services import run_anomaly_inference
 
 
@@ -10,4 +15,33 @@ def run_anomaly_detection(sender, instance, created, **kwargs):
     if not created:
         return
 
+    update_rollups([instance])
+    bump_plot_versions([instance.plot_id])
+
+    # Inference runs in the worker unless ML_INFERENCE_MODE=sync.
+    if inference_is_queued():
+        enqueue_inference([instance])
+        return
+
     run_anomaly_inference(instance)
+
+
+@receiver(post_save, sender=FarmProfile)
+@receiver(post_delete, sender=FarmProfile)
+def forget_user_farm(sender, instance, **kwargs):
+    cache.delete(farm_cache_key(instance.user_id))
+
+
+# Cached dashboard responses (api.caching) are keyed by these versions.
+# No post_delete receivers on readings or events: they would disable
+# Django's fast (single DELETE) cascade when a plot is removed; the API
+# bumps on their deletion itself (api.caching.CachedResponseMixin).
+@receiver(post_save, sender=AnomalyEvent)
+def bump_anomaly_plot_version(sender, instance, **kwargs):
+    bump_plot_versions([instance.plot_id])
+
+
+@receiver(post_save, sender=FieldPlot)
+@receiver(post_delete, sender=FieldPlot)
+def bump_plot_version(sender, instance, **kwargs):
+    bump_plot_versions([instance.pk])
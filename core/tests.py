@@ -1,3 +1,265 @@
-from django.test import TestCase
+import datetime
+import io
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+
+from core import dataset
+from core.dataset import SECONDS_PER_DAY, generate_days, load_readings
+from core.models import AnomalyEvent, FarmProfile, FieldPlot, PlotStatus, SensorReading, SensorRollup
+from core.partitioning import (
+    PARTITION_SUFFIX,
+    PartitioningError,
+    _add_months,
+    _month_start,
+    _partition_name,
+    convert_to_partitioned,
+    detach_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+)
+
+START = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+COLUMNS = ("plot_id", "epoch", "soil_moisture", "air_temperature", "humidity")
+
+
+def generate(plot_ids=(11, 12, 13, 14, 15), start=START, days=2, **options):
+    return list(generate_days(list(plot_ids), start, days, interval=options.pop("interval", 3600), **options))
+
+
+class GenerateDaysTests(SimpleTestCase):
+    """
+    core.dataset.generate_days is deterministic per seed.
+    """
+
+    def assertSameChunks(self, first, second, columns=COLUMNS):
+        self.assertEqual(len(first), len(second))
+        for left, right in zip(first, second):
+            for column in columns:
+                np.testing.assert_array_equal(left[column], right[column], err_msg=column)
+
+    def test_same_seed_same_output(self):
+        self.assertSameChunks(generate(seed=7), generate(seed=7))
+        self.assertFalse(np.array_equal(generate(seed=7)[0]["soil_moisture"], generate(seed=8)[0]["soil_moisture"]))
+
+        # Another start day shifts the timestamps only.
+        later = generate(seed=7, start=START + datetime.timedelta(days=40))
+        self.assertSameChunks(generate(seed=7), later, columns=COLUMNS[2:])
+        np.testing.assert_array_equal(later[0]["epoch"] - generate(seed=7)[0]["epoch"], 40 * SECONDS_PER_DAY)
+
+    def test_days_and_blocks(self):
+        with mock.patch.object(dataset, "PLOT_BLOCK", 2):
+            chunks = generate(seed=3)
+        self.assertEqual([len(set(chunk["plot_id"].tolist())) for chunk in chunks], [2, 2, 1] * 2)
+
+        start = int(START.timestamp())
+        for day, chunk in enumerate(chunks[::3]):
+            self.assertEqual(len(chunk["epoch"]), 2 * 24)
+            self.assertTrue(((chunk["epoch"] >= start + day * SECONDS_PER_DAY)
+                             & (chunk["epoch"] < start + (day + 1) * SECONDS_PER_DAY)).all())
+            plot_epochs = chunk["epoch"][chunk["plot_id"] == chunk["plot_id"][0]]
+            self.assertEqual(set(np.diff(plot_epochs).tolist()), {3600})
+
+    def test_values_stay_in_range_without_anomalies(self):
+        for chunk in generate(seed=1, anomaly_rate=0):
+            self.assertTrue(((chunk["soil_moisture"] >= 5) & (chunk["soil_moisture"] <= 80)).all())
+            self.assertTrue(((chunk["air_temperature"] >= -5) & (chunk["air_temperature"] <= 45)).all())
+            self.assertTrue(((chunk["humidity"] >= 20) & (chunk["humidity"] <= 95)).all())
+        self.assertFalse(np.array_equal(
+            generate(seed=1, anomaly_rate=0)[0]["air_temperature"], generate(seed=1, anomaly_rate=1)[0]["air_temperature"],
+        ))
+
+    def test_interval_must_divide_a_day(self):
+        with self.assertRaises(ValueError):
+            generate(interval=7)
+
+
+class LoadReadingsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="farmer farm", location="Test")
+        self.plots = FieldPlot.objects.bulk_create(
+            [FieldPlot(farm=farm, name=f"Plot {i}", size_hectares=1) for i in range(4)]
+        )
+
+    def stored(self, plot_ids):
+        return sorted(
+            (reading.plot_id - plot_ids[0], int(reading.timestamp.timestamp()), reading.soil_moisture,
+             reading.air_temperature, reading.humidity)
+            for reading in SensorReading.objects.filter(plot_id__in=plot_ids)
+        )
+
+    def test_backends_store_the_same_rows(self):
+        ids = [plot.pk for plot in self.plots]
+        # The default path (COPY on PostgreSQL) and the insert_readings path.
+        for plot_ids, patch in (
+            (ids[:2], nullcontext()),
+            (ids[2:], mock.patch.object(dataset, "connection", SimpleNamespace(vendor="sqlite"))),
+        ):
+            with patch:
+                written = sum(load_readings(chunk) for chunk in generate(plot_ids, days=1))
+            self.assertEqual(written, 2 * 24)
+
+        first, second = self.stored(ids[:2]), self.stored(ids[2:])
+        self.assertEqual(len(first), 2 * 24)
+        self.assertEqual(first, second)
+        self.assertTrue(all(reading.received_at for reading in SensorReading.objects.all()))
+
+    def test_generate_dataset_command(self):
+        output = io.StringIO()
+        options = {"farms": 2, "plots": 3, "days": 1, "interval": 3600, "start": START.date(), "stdout": output}
+        call_command("generate_dataset", rollups=True, status=True, **options)
+
+        self.assertEqual(SensorReading.objects.filter(plot__farm__user__username__startswith="dataset-").count(),
+                         2 * 3 * 24)
+        self.assertEqual(
+            SensorRollup.objects.filter(resolution="1d", plot__farm__user__username__startswith="dataset-").count(), 6
+        )
+        self.assertEqual(PlotStatus.objects.filter(plot__farm__user__username__startswith="dataset-").count(), 6)
+        self.assertIn("Wrote 144 readings", output.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", **options)
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", **{**options, "prefix": "other", "interval": 7})
+
+
+class PartitionHelperTests(SimpleTestCase):
+    def test_month_arithmetic(self):
+        self.assertEqual(_month_start(datetime.date(2026, 2, 28)), datetime.date(2026, 2, 1))
+        self.assertEqual(_add_months(datetime.date(2026, 11, 1), 2), datetime.date(2027, 1, 1))
+        self.assertEqual(_add_months(datetime.date(2026, 1, 1), -1), datetime.date(2025, 12, 1))
+        self.assertEqual(_add_months(datetime.date(2026, 3, 1), -27), datetime.date(2023, 12, 1))
+
+    def test_partition_names(self):
+        name = _partition_name(datetime.date(2026, 3, 1))
+        self.assertEqual(name, "core_sensorreading_p202603")
+        self.assertEqual(PARTITION_SUFFIX.search(name).groups(), ("2026", "03"))
+        self.assertIsNone(PARTITION_SUFFIX.search("core_sensorreading_default"))
+
+
+@skipIf(connection.vendor == "postgresql", "PostgreSQL supports partitioning.")
+class PartitioningBackendTests(TestCase):
+    def test_requires_postgresql(self):
+        with self.assertRaises(PartitioningError):
+            convert_to_partitioned()
+        with self.assertRaises(CommandError):
+            call_command("reading_partitions", "status")
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning requires PostgreSQL.")
+class PartitioningTests(TestCase):
+    """
+    core.partitioning on the test database. PostgreSQL DDL is
+    transactional, so each test's conversion is rolled back with it.
+    """
+
+    OLDEST = datetime.datetime(2025, 1, 15, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="farmer farm", location="Test")
+        self.plot = FieldPlot.objects.create(farm=farm, name="Plot", size_hectares=1)
+        self.readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=self.plot, timestamp=timestamp, soil_moisture=5, air_temperature=20, humidity=50)
+            for timestamp in (self.OLDEST, datetime.datetime.now(datetime.timezone.utc))
+        ])
+        AnomalyEvent.objects.create(reading=self.readings[0], plot=self.plot,
+                                    anomaly_type="Soil moisture too low", severity="medium")
+        # Run the deferred FK checks now: ALTER TABLE refuses pending trigger events.
+        self.query("SET CONSTRAINTS ALL IMMEDIATE", fetch=False)
+
+    def query(self, sql, params=(), fetch=True):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if fetch else None
+
+    def months(self):
+        return [month for _, month in list_partitions()]
+
+    def test_convert(self):
+        self.assertFalse(is_partitioned())
+        output = io.StringIO()
+        call_command("reading_partitions", "convert", months_ahead=2, stdout=output)
+        self.assertIn("2 rows copied", output.getvalue())
+
+        self.assertTrue(is_partitioned())
+        current = _month_start(datetime.date.today())
+        months = self.months()
+        self.assertEqual((months[0], months[-1]), (datetime.date(2025, 1, 1), _add_months(current, 2)))
+        self.assertEqual(len(months), len(set(months)))
+        self.assertEqual(self.query("SELECT to_regclass('core_sensorreading_default') IS NOT NULL"), [(True,)])
+        self.assertEqual(self.query("SELECT to_regclass('core_sensorreading_legacy')"), [(None,)])
+
+        primary_key = self.query(
+            """
+            SELECT a.attname FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = 'core_sensorreading'::regclass AND i.indisprimary
+            """
+        )
+        self.assertEqual({name for name, in primary_key}, {"id", "timestamp"})
+        # No foreign key may point at the partitioned table.
+        self.assertEqual(
+            self.query("SELECT COUNT(*) FROM pg_constraint WHERE contype = 'f' "
+                       "AND confrelid = 'core_sensorreading'::regclass"),
+            [(0,)],
+        )
+        self.assertEqual(AnomalyEvent.objects.get().reading_id, self.readings[0].pk)
+
+        # Ids continue from the copied rows; out-of-range rows land in DEFAULT.
+        far = SensorReading.objects.create(
+            plot=self.plot, timestamp=datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc),
+            soil_moisture=30, air_temperature=20, humidity=50,
+        )
+        self.assertGreater(far.pk, max(reading.pk for reading in self.readings))
+        self.assertEqual(
+            self.query("SELECT tableoid::regclass::text FROM core_sensorreading WHERE id = %s", [far.pk]),
+            [("core_sensorreading_default",)],
+        )
+
+        keyed = {"plot": self.plot, "timestamp": self.OLDEST, "device_id": "gw-1", "sequence": 1,
+                 "soil_moisture": 30, "air_temperature": 20, "humidity": 50}
+        SensorReading.objects.bulk_create([SensorReading(**keyed)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SensorReading.objects.bulk_create([SensorReading(**keyed)])
+
+        with self.assertRaises(PartitioningError):
+            convert_to_partitioned()
+
+    def test_keep_legacy(self):
+        self.assertEqual(convert_to_partitioned(months_ahead=0, keep_legacy=True), 2)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM core_sensorreading_legacy"), [(2,)])
+
+    def test_ensure_next_months(self):
+        with self.assertRaises(CommandError):
+            call_command("reading_partitions", "create", stdout=io.StringIO())
+        convert_to_partitioned(months_ahead=0)
+
+        names = ensure_partitions(months_ahead=2, today=datetime.date(2030, 11, 20))
+        self.assertEqual(names, ["core_sensorreading_p203011", "core_sensorreading_p203012",
+                                 "core_sensorreading_p203101"])
+        self.assertEqual(ensure_partitions(months_ahead=2, today=datetime.date(2030, 11, 20)), names)
+        self.assertEqual(self.months()[-3:], [datetime.date(2030, 11, 1), datetime.date(2030, 12, 1),
+                                              datetime.date(2031, 1, 1)])
+
+    def test_detach(self):
+        convert_to_partitioned(months_ahead=0)
+
+        # Today is 2026-02: partitions that ended by 2025-02 go.
+        detached = detach_partitions(12, today=datetime.date(2026, 2, 10))
+        self.assertEqual(detached, ["core_sensorreading_p202501"])
+        self.assertEqual(SensorReading.objects.count(), 1)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM core_sensorreading_p202501"), [(1,)])
+
+        self.assertEqual(detach_partitions(12, drop=True, today=datetime.date(2026, 3, 10)),
+                         ["core_sensorreading_p202502"])
+        self.assertEqual(self.query("SELECT to_regclass('core_sensorreading_p202502')"), [(None,)])
+        self.assertEqual(self.months()[0], datetime.date(2025, 3, 1))
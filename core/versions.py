@@ -0,0 +1,69 @@
+# core/versions.py
+"""
+Per-plot data version counters for conditional GETs (api.caching).
+
+Every write that changes what a dashboard endpoint would return for a plot
+(reading inserts, anomaly events, plot status changes, plot create/delete)
+bumps that plot's counter and the global one once its transaction
+commits, so a cached response is never keyed by a version that readers
+could still see the old data under. Rebuilds that touch every plot bump
+the epoch, which is part of every version.
+
+Counters live in the default cache and never expire. A counter that is
+missing (first use, eviction, cache restart) starts from the current time
+in nanoseconds rather than 0, so it cannot fall back to a value an older
+ETag was built from.
+
+With the local-memory cache the counters are per process: bumps made by
+another web worker or by run_inference_worker are not seen. Point
+REDIS_URL at a shared Redis for exact invalidation; otherwise responses are
+at most RESPONSE_CACHE_SECONDS stale.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+ALL = "all"
+EPOCH = "epoch"
+
+
+def _key(name):
+    return f"data-version:{name}"
+
+
+def _bump(names):
+    for name in names:
+        try:
+            cache.incr(_key(name))
+        except ValueError:
+            cache.set(_key(name), time.time_ns(), None)
+
+
+def bump_plot_versions(plot_ids):
+    """
+    Bump the given plots (and the global counter) when the transaction commits.
+    """
+    names = {int(plot_id) for plot_id in plot_ids if plot_id is not None}
+    if names:
+        transaction.on_commit(lambda: _bump([ALL, *sorted(names)]))
+
+
+def bump_all_versions():
+    transaction.on_commit(lambda: _bump([EPOCH, ALL]))
+
+
+def data_version(plot_id=None):
+    """
+    Version token of one plot's data, or of every plot's when ``plot_id`` is None.
+    """
+    keys = [_key(EPOCH), _key(ALL if plot_id is None else int(plot_id))]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        for key in keys:
+            if key not in values:
+                # add() keeps a value another process set in the meantime.
+                cache.add(key, time.time_ns(), None)
+        values = cache.get_many(keys)
+    return ".".join(str(values.get(key, 0)) for key in keys)
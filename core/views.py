@@ -3,8 +3,9 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import FieldPlot, AnomalyEvent
-from core.serializers import FieldPlotSerializer
+from core.models import FieldPlot
+from core.services import plot_status_payload
+from api.serializers import FieldPlotSerializer
 
 
 class FieldPlotViewSet(viewsets.ModelViewSet):
@@ -18,28 +19,7 @@ class FieldPlotViewSet(viewsets.ModelViewSet):
         Retourne le statut de chaque parcelle (OK / WARNING / CRITICAL)
         basé sur les anomalies récentes.
         """
-        plots = FieldPlot.objects.all()
-        data = []
-
-        for plot in plots:
-            anomalies = AnomalyEvent.objects.filter(
-                reading__plot=plot
-            ).order_by("-created_at")
-
-            status = "OK"
-
-            if anomalies.exists():
-                severity = anomalies.first().severity
-                if severity == "high":
-                    status = "CRITICAL"
-                elif severity == "medium":
-                    status = "WARNING"
-
-            data.append({
-                "id": plot.id,
-                "name": plot.name,
-                "size": plot.size,
-                "status": status,
-            })
+        plots = FieldPlot.objects.select_related("current_status").order_by("id")
+        data = [plot_status_payload(plot) for plot in plots]
 
         return Response(data)
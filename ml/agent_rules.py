@@ -1,61 +1,306 @@
 # ml/agent_rules.py
+"""
+Declarative recommendation rules for the AI agent.
 
-def generate_recommendation(anomaly_event):
-    """
-    Returns (recommended_action, explanation_text)
-    based on anomaly type + severity + reading values.
-    """
+Rules are plain dicts (anomaly type(s), optional severity, optional value
+predicates on the reading, action/explanation templates). They are compiled
+once into a dispatch table keyed by (type, severity), so evaluating an event
+is a dict lookup plus the predicates of a handful of candidate rules.
+
+The rule set can be overridden with a JSON file (``ML_AGENT_RULES_FILE``);
+the file is re-read when its mtime changes, so rules can be edited without
+restarting the gunicorn workers.
+"""
+
+import json
+import logging
+import operator
+import os
+import threading
+import time
 
-    reading = anomaly_event.reading
-    a_type = anomaly_event.anomaly_type.lower()
-    severity = anomaly_event.severity.lower()
+from django.conf import settings
 
-    # --- Rule set ---
-    if "soil moisture too low" in a_type:
-        action = "Start irrigation for this plot and verify the irrigation system."
-        explanation = (
-            f"Soil moisture is very low ({reading.soil_moisture}%). "
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES = [
+    {
+        "type": "Soil moisture too low",
+        "action": "Start irrigation for this plot and verify the irrigation system.",
+        "explanation": (
+            "Soil moisture is very low ({soil_moisture}%). "
             "This may cause water stress and reduce crop yield. "
             "Irrigation is recommended and the sensor/irrigation lines should be checked."
-        )
-        return action, explanation
-
-    if "soil moisture too high" in a_type:
-        action = "Stop irrigation and check drainage conditions."
-        explanation = (
-            f"Soil moisture is unusually high ({reading.soil_moisture}%). "
+        ),
+    },
+    {
+        "type": "Soil moisture too high",
+        "action": "Stop irrigation and check drainage conditions.",
+        "explanation": (
+            "Soil moisture is unusually high ({soil_moisture}%). "
             "This can increase risk of root diseases. "
             "Stop irrigation and inspect drainage / water accumulation."
-        )
-        return action, explanation
-
-    if "temperature anomaly" in a_type:
-        if reading.air_temperature > 40:
-            action = "Increase irrigation frequency and consider shading during peak heat."
-            explanation = (
-                f"Air temperature is extremely high ({reading.air_temperature}°C). "
-                "Heat stress can affect plant growth. "
-                "Increase irrigation, monitor plants, and consider shading if possible."
-            )
-        else:
-            action = "Protect crops from cold (cover plants) and monitor temperature."
-            explanation = (
-                f"Air temperature is unusually low ({reading.air_temperature}°C). "
-                "Cold stress may damage crops. "
-                "Use protective covers and monitor the plot closely."
-            )
-        return action, explanation
-
-    if "humidity anomaly" in a_type:
-        action = "Inspect sensor calibration and monitor for fungal disease risk."
-        explanation = (
-            f"Humidity is abnormal ({reading.humidity}%). "
+        ),
+    },
+    {
+        "type": "Temperature anomaly",
+        "when": {"air_temperature": {"gt": 40}},
+        "action": "Increase irrigation frequency and consider shading during peak heat.",
+        "explanation": (
+            "Air temperature is extremely high ({air_temperature}°C). "
+            "Heat stress can affect plant growth. "
+            "Increase irrigation, monitor plants, and consider shading if possible."
+        ),
+    },
+    {
+        "type": "Temperature anomaly",
+        "action": "Protect crops from cold (cover plants) and monitor temperature.",
+        "explanation": (
+            "Air temperature is unusually low ({air_temperature}°C). "
+            "Cold stress may damage crops. "
+            "Use protective covers and monitor the plot closely."
+        ),
+    },
+    {
+        "type": "Humidity anomaly",
+        "action": "Inspect sensor calibration and monitor for fungal disease risk.",
+        "explanation": (
+            "Humidity is abnormal ({humidity}%). "
             "This may indicate sensor issues or conditions favoring fungal diseases. "
             "Check sensor and monitor crop health."
-        )
-        return action, explanation
+        ),
+    },
+    {
+        "types": ["Air temperature sensor stuck", "Humidity sensor stuck", "Soil moisture sensor stuck"],
+        "action": "Inspect the sensor: it keeps reporting the same value.",
+        "explanation": (
+            "{anomaly_type}: the last readings are identical "
+            "(soil {soil_moisture}%, air {air_temperature}°C, humidity {humidity}%). "
+            "The sensor or its gateway may be frozen."
+        ),
+    },
+    {
+        "types": ["Air temperature drift", "Humidity drift", "Soil moisture drift"],
+        "action": "Schedule a sensor calibration check and compare with a reference instrument.",
+        "explanation": (
+            "{anomaly_type}: recent values are slowly moving away from this plot's usual range. "
+            "This is typical of sensor drift rather than a real change in field conditions."
+        ),
+    },
+]
+
+DEFAULT_RECOMMENDATION = {
+    "action": "Monitor the plot and verify sensor readings.",
+    "explanation": "An anomaly was detected. No specific rule matched; please review the readings.",
+}
+
+OPERATORS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+}
+
+TEMPLATE_FIELDS = {
+    "anomaly_type": "Anomaly",
+    "severity": "low",
+    "soil_moisture": 0.0,
+    "air_temperature": 0.0,
+    "humidity": 0.0,
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+class CompiledRule:
+    __slots__ = ("predicates", "action", "explanation")
+
+    def __init__(self, predicates, action, explanation):
+        self.predicates = predicates
+        self.action = action
+        self.explanation = explanation
+
+    def matches(self, values):
+        for field, compare, expected in self.predicates:
+            value = values.get(field)
+            if value is None or not compare(value, expected):
+                return False
+        return True
+
+    def render(self, values):
+        return self.action.format(**values), self.explanation.format(**values)
+
+
+# Predicates compare numbers with numbers and text with text.
+NUMERIC_FIELDS = ("soil_moisture", "air_temperature", "humidity")
+
+
+def _check_expected(field, name, expected):
+    if field in NUMERIC_FIELDS:
+        valid = isinstance(expected, (int, float)) and not isinstance(expected, bool)
+    else:
+        valid = isinstance(expected, str)
+    if not valid:
+        kind = "a number" if field in NUMERIC_FIELDS else "a string"
+        raise RuleError(f"Predicate {field}.{name} must compare with {kind}, not {expected!r}.")
+
+
+def _compile_rule(rule):
+    if not isinstance(rule, dict):
+        raise RuleError(f"Rule {rule!r} must be an object.")
+    for template in (rule.get("action"), rule.get("explanation")):
+        if not isinstance(template, str):
+            raise RuleError(f"Rule {rule!r} needs 'action' and 'explanation' templates.")
+        try:
+            template.format(**TEMPLATE_FIELDS)
+        except (AttributeError, KeyError, IndexError, ValueError) as exc:
+            raise RuleError(f"Bad template {template!r}: {exc}") from exc
+
+    when = rule.get("when") or {}
+    if not isinstance(when, dict):
+        raise RuleError(f"'when' of rule {rule!r} must be an object.")
+    predicates = []
+    for field, conditions in when.items():
+        if field not in TEMPLATE_FIELDS:
+            raise RuleError(f"Unknown field {field!r} in rule predicates.")
+        if not isinstance(conditions, dict):
+            raise RuleError(f"Predicates on {field!r} must be an object of operators.")
+        for name, expected in conditions.items():
+            if name not in OPERATORS:
+                raise RuleError(f"Unknown operator {name!r} in rule predicates.")
+            _check_expected(field, name, expected)
+            predicates.append((field, OPERATORS[name], expected))
+
+    return CompiledRule(predicates, rule["action"], rule["explanation"])
+
+
+def compile_rules(rules, default=DEFAULT_RECOMMENDATION):
+    """
+    Build the dispatch table {(type, severity or None): [rules in order]}.
+    Raises RuleError for anything malformed, so a bad rule set is rejected
+    as a whole.
+    """
+    if not isinstance(rules, list):
+        raise RuleError("Rules must be a list.")
+    table = {}
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise RuleError(f"Rule {rule!r} must be an object.")
+        types = rule.get("types") or [rule.get("type")]
+        if not isinstance(types, list) or not all(isinstance(a_type, str) and a_type for a_type in types):
+            raise RuleError(f"Rule {rule!r} needs a 'type' or 'types'.")
+        severity = rule.get("severity")
+        if severity is not None and not isinstance(severity, str):
+            raise RuleError(f"Severity of rule {rule!r} must be a string.")
+        compiled = _compile_rule(rule)
+        for a_type in types:
+            key = (a_type.lower(), severity.lower() if severity else None)
+            table.setdefault(key, []).append(compiled)
+
+    return table, _compile_rule(default)
+
+
+def load_rules(payload):
+    """
+    Compile a rule file: a list of rules, or {"rules": [...], "default": {...}}.
+    """
+    if isinstance(payload, list):
+        payload = {"rules": payload}
+    if not isinstance(payload, dict) or "rules" not in payload:
+        raise RuleError("Expected a list of rules or an object with 'rules'.")
+    return compile_rules(payload["rules"], payload.get("default", DEFAULT_RECOMMENDATION))
+
+
+class RuleEngine:
+    def __init__(self, path=None, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.table, self.default = compile_rules(DEFAULT_RULES)
+
+    def _maybe_reload(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+
+            if mtime is None:
+                self.table, self.default = compile_rules(DEFAULT_RULES)
+                return
+            try:
+                with open(self.path, encoding="utf-8") as handle:
+                    table, default = load_rules(json.load(handle))
+            except (OSError, ValueError) as exc:
+                # Keep serving the previous rule set until the file is fixed.
+                logger.error("Could not load agent rules from %s: %s", self.path, exc)
+                return
+            self.table, self.default = table, default
+            logger.info("Loaded agent rules from %s", self.path)
+
+    def evaluate(self, anomaly_type, severity, reading):
+        """
+        Returns (recommended_action, explanation_text) for an anomaly.
+        """
+        self._maybe_reload()
+
+        values = {
+            "anomaly_type": anomaly_type or "",
+            "severity": severity or "",
+            "soil_moisture": getattr(reading, "soil_moisture", None),
+            "air_temperature": getattr(reading, "air_temperature", None),
+            "humidity": getattr(reading, "humidity", None),
+        }
+
+        a_type = (anomaly_type or "").lower()
+        table = self.table
+        for key in ((a_type, (severity or "").lower()), (a_type, None)):
+            for rule in table.get(key, ()):
+                if rule.matches(values):
+                    return rule.render(values)
+
+        return self.default.render(values)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_rule_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine(
+                    path=getattr(settings, "ML_AGENT_RULES_FILE", None),
+                    reload_interval=getattr(settings, "ML_AGENT_RULES_RELOAD_SECONDS", 5.0),
+                )
+    return _engine
+
+
+def generate_recommendation(anomaly_event):
+    """
+    Returns (recommended_action, explanation_text)
+    based on anomaly type + severity + reading values.
+    """
 
-    # default
-    action = "Monitor the plot and verify sensor readings."
-    explanation = "An anomaly was detected. No specific rule matched; please review the readings."
-    return action, explanation
+    return get_rule_engine().evaluate(
+        anomaly_event.anomaly_type,
+        anomaly_event.severity,
+        anomaly_event.reading,
+    )
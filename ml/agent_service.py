@@ -3,11 +3,15 @@
 from core.models import AgentRecommendation
 from ml.agent_rules import generate_recommendation
 
-def run_agent(anomaly_event):
+def run_agent(anomaly_event, recommendation=None):
     """
     Create/update AgentRecommendation for a given AnomalyEvent.
+    Pass ``recommendation`` (action, explanation) when it was already
+    evaluated for this event to avoid running the rules twice.
     """
-    action, explanation = generate_recommendation(anomaly_event)
+    if recommendation is None:
+        recommendation = generate_recommendation(anomaly_event)
+    action, explanation = recommendation
 
     rec, created = AgentRecommendation.objects.update_or_create(
         anomaly=anomaly_event,
@@ -1,5 +1,21 @@
 # ml/anomaly_model.py
 
+import numpy as np
+
+# Code tables for detect_anomaly_batch; index 0 means "no anomaly".
+ANOMALY_TYPES = (
+    None,
+    "Temperature anomaly",
+    "Soil moisture too low",
+    "Soil moisture too high",
+    "Humidity anomaly",
+)
+SEVERITIES = (None, "low", "medium", "high")
+
+# Severity code for each anomaly type code.
+TYPE_SEVERITY_CODES = np.array([0, 3, 2, 2, 1], dtype=np.int8)
+
+
 def detect_anomaly(reading):
     """
     Threshold-based anomaly detection.
@@ -19,3 +35,52 @@ def detect_anomaly(reading):
         return True, "Humidity anomaly", "low"
 
     return False, None, None
+
+
+def detect_anomaly_batch(soil_moisture, air_temperature, humidity):
+    """
+    Vectorised detect_anomaly over columnar inputs.
+
+    Returns (type_codes, severity_codes) as int8 arrays indexing into
+    ANOMALY_TYPES and SEVERITIES; 0 means no anomaly. Rules are applied with
+    the same precedence as the scalar version.
+    """
+
+    soil = np.asarray(soil_moisture, dtype=np.float64)
+    air = np.asarray(air_temperature, dtype=np.float64)
+    hum = np.asarray(humidity, dtype=np.float64)
+
+    type_codes = np.select(
+        [
+            (air < 0) | (air > 45),
+            soil < 10,
+            soil > 80,
+            (hum < 20) | (hum > 95),
+        ],
+        [1, 2, 3, 4],
+        default=0,
+    ).astype(np.int8)
+
+    return type_codes, TYPE_SEVERITY_CODES[type_codes]
+
+
+def detect_readings_batch(readings):
+    """
+    Run detect_anomaly_batch over a list of SensorReading-like objects.
+    Returns a list of (reading, anomaly_type, severity) for anomalous ones.
+    """
+
+    count = len(readings)
+    if not count:
+        return []
+
+    type_codes, severity_codes = detect_anomaly_batch(
+        np.fromiter((r.soil_moisture for r in readings), dtype=np.float64, count=count),
+        np.fromiter((r.air_temperature for r in readings), dtype=np.float64, count=count),
+        np.fromiter((r.humidity for r in readings), dtype=np.float64, count=count),
+    )
+
+    return [
+        (readings[index], ANOMALY_TYPES[type_codes[index]], SEVERITIES[severity_codes[index]])
+        for index in np.flatnonzero(type_codes)
+    ]
@@ -0,0 +1,148 @@
+# ml/inference_queue.py
+"""
+DB-backed queue that moves anomaly inference out of the ingest request.
+
+Readings are enqueued as InferenceJob rows in the same transaction that
+creates them; a worker (``manage.py run_inference_worker``) drains them in
+batches through run_bulk_anomaly_inference.
+
+A failed batch is retried after ML_INFERENCE_RETRY_SECONDS, doubling with
+each attempt; after MAX_ATTEMPTS its jobs stay as dead letters.
+"""
+
+import datetime
+import logging
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from core.instrumentation import stage
+from core.models import SensorReading
+from ml.models import InferenceJob
+from ml.services import run_bulk_anomaly_inference
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """
+    Backoff before the next try of a job that has failed ``attempts`` times.
+    """
+    base = getattr(settings, "ML_INFERENCE_RETRY_SECONDS", 30.0)
+    return datetime.timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def inference_is_queued() -> bool:
+    return getattr(settings, "ML_INFERENCE_MODE", "queue") == "queue"
+
+
+@stage("ml.enqueue")
+def enqueue_inference(readings: Iterable[SensorReading]) -> int:
+    """
+    Enqueue inference jobs for the given readings in one insert.
+    Re-enqueueing a reading that already has a pending job is a no-op.
+    """
+    return enqueue_inference_ids([reading.pk for reading in readings])
+
+
+@stage("ml.enqueue")
+def enqueue_inference_ids(reading_ids: List[int]) -> int:
+    """
+    enqueue_inference() by reading id. On PostgreSQL the ids go in as one
+    array parameter instead of a bulk_create row per job.
+    """
+    if not reading_ids:
+        return 0
+
+    if connection.vendor != "postgresql":
+        InferenceJob.objects.bulk_create(
+            [InferenceJob(reading_id=reading_id) for reading_id in reading_ids],
+            ignore_conflicts=True,
+        )
+        return len(reading_ids)
+
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(InferenceJob._meta.db_table)} "
+            f"({qn('reading_id')}, {qn('enqueued_at')}, {qn('attempts')}, {qn('last_error')}) "
+            f"SELECT reading_id, %s, 0, '' FROM unnest(%s::bigint[]) AS batch (reading_id) "
+            f"ON CONFLICT ({qn('reading_id')}) DO NOTHING",
+            [timezone.now(), list(reading_ids)],
+        )
+    return len(reading_ids)
+
+
+def schedule_inference(readings: Iterable[SensorReading]) -> Dict[str, int]:
+    """
+    Run inference inline or hand it to the queue, depending on ML_INFERENCE_MODE.
+    """
+    readings = list(readings)
+    if inference_is_queued():
+        return {"queued": enqueue_inference(readings)}
+    return run_bulk_anomaly_inference(readings)
+
+
+def drain_inference_queue(batch_size: int = 500) -> Dict[str, int]:
+    """
+    Process up to ``batch_size`` pending jobs. Rows are locked with SKIP LOCKED
+    so several workers can drain the same queue without double work.
+    """
+    stats = {"jobs": 0, "failed": 0, "total_processed": 0, "anomalies_detected": 0, "events_created": 0}
+
+    with transaction.atomic():
+        jobs = list(
+            InferenceJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()), attempts__lt=MAX_ATTEMPTS)
+            .order_by("id")[:batch_size]
+        )
+        if not jobs:
+            return stats
+
+        job_ids = [job.pk for job in jobs]
+        stats["jobs"] = len(jobs)
+        try:
+            with transaction.atomic():
+                readings = SensorReading.objects.filter(pk__in=[job.reading_id for job in jobs])
+                stats.update(run_bulk_anomaly_inference(readings))
+        except Exception as exc:
+            # Keep the jobs for a retry; after MAX_ATTEMPTS they stay as dead letters.
+            logger.exception("Inference batch of %d jobs failed", len(jobs))
+            now = timezone.now()
+            for job in jobs:
+                job.attempts += 1
+                job.last_error = str(exc)[:2000]
+                job.not_before = now + retry_delay(job.attempts)
+            InferenceJob.objects.bulk_update(jobs, ["attempts", "last_error", "not_before"])
+            stats["failed"] = len(jobs)
+            return stats
+        InferenceJob.objects.filter(pk__in=job_ids).delete()
+
+    return stats
+
+
+def queue_stats() -> Dict[str, object]:
+    """
+    Queue depth, jobs waiting to be retried, failed (dead-lettered) jobs and
+    lag of the oldest pending job.
+    """
+    aggregates = InferenceJob.objects.aggregate(
+        depth=Count("id"),
+        retrying=Count("id", filter=Q(attempts__gt=0, attempts__lt=MAX_ATTEMPTS)),
+        failed=Count("id", filter=Q(attempts__gte=MAX_ATTEMPTS)),
+        oldest=Min("enqueued_at", filter=Q(attempts__lt=MAX_ATTEMPTS)),
+    )
+    oldest = aggregates["oldest"]
+    lag = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    return {
+        "depth": aggregates["depth"],
+        "retrying": aggregates["retrying"],
+        "failed": aggregates["failed"],
+        "lag_seconds": round(lag, 3),
+    }
@@ -1,30 +1,109 @@
-from django.core.management.base import BaseCommand
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
-from core.models import AnomalyEvent
-from ml.agent_rules import generate_recommendation
-from ml.agent_service import run_agent
+from core.models import AgentRecommendation, AnomalyEvent
+from core.services import rebuild_plot_status
+from ml.agent_rules import get_rule_engine
 from ml.anomaly_model import detect_anomaly
 
+EVENT_COLUMNS = ["anomaly_type", "severity", "plot_id", "message", "recommendation"]
+
+# Rows per UPDATE statement, keeps parameters under SQLite's limit.
+UPDATE_BATCH = 500
+
+
+def parse_since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--since expects an ISO date or datetime, got {value!r}.")
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.timezone.utc)
+    return moment
+
+
+def update_events(events):
+    """
+    Write EVENT_COLUMNS for many events with UPDATE ... FROM (VALUES ...).
+    bulk_update builds one CASE branch per row and field, which makes both
+    the Python side and the database side grow quadratically with the chunk.
+    """
+    qn = connection.ops.quote_name
+    table = qn(AnomalyEvent._meta.db_table)
+    assignments = ", ".join(
+        f"{qn(column)} = v.column{index}" for index, column in enumerate(EVENT_COLUMNS, start=2)
+    )
+    row = "(" + ", ".join(["%s"] * (len(EVENT_COLUMNS) + 1)) + ")"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(events), UPDATE_BATCH):
+            chunk = events[start:start + UPDATE_BATCH]
+            params = []
+            for event in chunk:
+                params.append(event.pk)
+                params.extend(getattr(event, column) for column in EVENT_COLUMNS)
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} "
+                f"FROM (VALUES {', '.join([row] * len(chunk))}) AS v "
+                f"WHERE {table}.{qn('id')} = v.column1",
+                params,
+            )
+
 
 class Command(BaseCommand):
     help = "Re-run AI agent for anomalies missing message/recommendation and backfill plot references."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Events per chunk; each chunk is written in one transaction.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Compute the changes and report counts without writing.")
+        parser.add_argument("--since", help="Only events created at or after this ISO date/datetime.")
+
     def handle(self, *args, **options):
-        queryset = AnomalyEvent.objects.select_related("reading", "plot").filter(
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+
+        queryset = AnomalyEvent.objects.select_related("reading").filter(
             Q(message__isnull=True)
             | Q(message__exact="")
             | Q(recommendation__isnull=True)
             | Q(recommendation__exact="")
             | Q(plot__isnull=True)
-        )
+        ).order_by("pk")
+        if options["since"]:
+            queryset = queryset.filter(created_at__gte=parse_since(options["since"]))
 
+        engine = get_rule_engine()
         updated = 0
+        chunks = 0
+        last_pk = 0
+        started = time.monotonic()
+
+        while True:
+            # Walk by primary key: fixed rows drop out of the filter, so offsets would skip rows.
+            events = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not events:
+                break
+            last_pk = events[-1].pk
+            chunk_started = time.monotonic()
 
-        for event in queryset:
-            reading = event.reading
+            recommendations = []
+            # UPDATE ... FROM bypasses signals: plots whose events change
+            # type, severity or plot get their PlotStatus recounted.
+            relabelled_plots = set()
+            for event in events:
+                reading = event.reading
+                before = (event.anomaly_type, event.severity, event.plot_id)
 
-            if reading:
                 # Refresh anomaly type/severity if missing.
                 if not event.anomaly_type or not event.severity:
                     is_anomaly, anomaly_type, severity = detect_anomaly(reading)
@@ -34,21 +113,49 @@ class Command(BaseCommand):
                         if severity:
                             event.severity = severity
 
-                if event.plot_id != getattr(reading, "plot_id", None):
-                    event.plot = reading.plot
+                if event.plot_id != reading.plot_id:
+                    event.plot_id = reading.plot_id
+
+                if (event.anomaly_type, event.severity, event.plot_id) != before:
+                    relabelled_plots.update((before[2], event.plot_id))
+
+                recommended_action, explanation = engine.evaluate(event.anomaly_type, event.severity, reading)
+
+                if not event.message:
+                    event.message = explanation or "No message generated."
 
-                recommended_action, explanation = generate_recommendation(event)
-            else:
-                recommended_action, explanation = None, None
+                if not event.recommendation:
+                    event.recommendation = recommended_action or "No recommendation generated."
 
-            if not event.message:
-                event.message = explanation or "No message generated."
+                recommendations.append(AgentRecommendation(
+                    anomaly_id=event.pk,
+                    recommended_action=recommended_action,
+                    explanation_text=explanation,
+                ))
 
-            if not event.recommendation:
-                event.recommendation = recommended_action or "No recommendation generated."
+            if not dry_run:
+                with transaction.atomic():
+                    update_events(events)
+                    AgentRecommendation.objects.bulk_create(
+                        recommendations,
+                        update_conflicts=True,
+                        unique_fields=["anomaly"],
+                        update_fields=["recommended_action", "explanation_text"],
+                    )
+                    rebuild_plot_status(relabelled_plots)
 
-            event.save()
-            run_agent(event)
-            updated += 1
+            updated += len(events)
+            chunks += 1
+            chunk_elapsed = time.monotonic() - chunk_started
+            if options["verbosity"] >= 2:
+                self.stdout.write(
+                    f"chunk {chunks}: {len(events)} events in {chunk_elapsed:.2f}s "
+                    f"({len(events) / chunk_elapsed if chunk_elapsed else 0:.0f}/s), up to id {last_pk}"
+                )
 
-        self.stdout.write(self.style.SUCCESS(f"Updated {updated} anomalies."))
+        elapsed = time.monotonic() - started
+        rate = updated / elapsed if elapsed else 0
+        prefix = "[dry run] Would update" if dry_run else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {updated} anomalies in {chunks} chunks, {elapsed:.2f}s ({rate:.0f} events/s)."
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import FieldPlot
+from ml.batch_inference import run_to_completion
+from ml.models import BatchInferenceRun
+
+
+class Command(BaseCommand):
+    help = "Stream anomaly inference over stored readings in checkpointed chunks (resumable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plot", type=int, help="Only process readings of this plot.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--resume", type=int, metavar="RUN_ID",
+                            help="Resume an existing run from its checkpoint.")
+        parser.add_argument("--enqueue", action="store_true",
+                            help="Only create the run and leave it to run_inference_worker.")
+
+    def handle(self, *args, **options):
+        if options["resume"]:
+            try:
+                run = BatchInferenceRun.objects.get(pk=options["resume"])
+            except BatchInferenceRun.DoesNotExist:
+                raise CommandError(f"Run {options['resume']} does not exist.")
+        else:
+            if options["plot"] and not FieldPlot.objects.filter(pk=options["plot"]).exists():
+                raise CommandError(f"Plot {options['plot']} does not exist.")
+            run = BatchInferenceRun.objects.create(
+                plot_id=options["plot"],
+                chunk_size=options["chunk_size"],
+            )
+
+        if options["enqueue"]:
+            self.stdout.write(self.style.SUCCESS(f"Queued batch inference run {run.pk}."))
+            return
+
+        def report(current):
+            self.stdout.write(
+                f"run {current.pk}: {current.progress:.1%} "
+                f"processed={current.total_processed} anomalies={current.anomalies_detected} "
+                f"checkpoint={current.last_reading_id}"
+            )
+
+        run = run_to_completion(run.pk, on_progress=report)
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk} {run.status}: {run.total_processed} readings, "
+            f"{run.anomalies_detected} anomalies, {run.events_created} new events."
+        ))
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import FieldPlot
+from core.partitioning import ensure_partitions
+from ml.batch_inference import advance_batch_runs
+from ml.inference_queue import drain_inference_queue, queue_stats
+from ml.streaming import get_detector, streaming_enabled
+
+PARTITION_CHECK_SECONDS = 6 * 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the anomaly inference queue in batches and advance queued batch "
+        "inference runs when idle (runs until interrupted unless --once)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--stats-interval", type=float, default=30.0,
+                            help="Seconds between queue depth/lag reports.")
+        parser.add_argument("--once", action="store_true",
+                            help="Drain the queue once and exit.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_report = 0.0
+        last_partition_check = None
+
+        if streaming_enabled():
+            get_detector().warm(list(FieldPlot.objects.values_list("pk", flat=True)))
+
+        while True:
+            if settings.SENSOR_READING_PARTITIONED and (
+                last_partition_check is None
+                or time.monotonic() - last_partition_check >= PARTITION_CHECK_SECONDS
+            ):
+                ensure_partitions(months_ahead=settings.SENSOR_READING_PARTITION_MONTHS_AHEAD)
+                last_partition_check = time.monotonic()
+
+            stats = drain_inference_queue(batch_size=batch_size)
+
+            if stats["failed"]:
+                self.stderr.write(self.style.ERROR(f"Batch of {stats['failed']} jobs failed; will retry after a backoff."))
+
+            now = time.monotonic()
+            if now - last_report >= options["stats_interval"]:
+                depth = queue_stats()
+                self.stdout.write(
+                    f"queue depth={depth['depth']} retrying={depth['retrying']} failed={depth['failed']} "
+                    f"lag={depth['lag_seconds']}s"
+                )
+                last_report = now
+
+            if stats["jobs"] == 0:
+                # Live readings first; batch runs only get the idle time.
+                if advance_batch_runs() is not None:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        self.stdout.write(self.style.SUCCESS("Inference queue drained."))
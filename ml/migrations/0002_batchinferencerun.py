@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_sensorrollup'),
+        ('ml', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchInferenceRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('chunk_size', models.PositiveIntegerField(default=2000)),
+                ('first_reading_id', models.BigIntegerField(blank=True, null=True)),
+                ('max_reading_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_reading_id', models.BigIntegerField(default=0)),
+                ('total_processed', models.BigIntegerField(default=0)),
+                ('anomalies_detected', models.BigIntegerField(default=0)),
+                ('events_created', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('plot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='batch_inference_runs', to='core.fieldplot')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
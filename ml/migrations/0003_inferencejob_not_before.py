@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml', '0002_batchinferencerun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inferencejob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,16 +1,76 @@
 from django.db import models
 
-# Create your models here.
-# ml/anomaly_model.py
 
-def detect_anomaly(reading):
-    if reading.air_temperature < 0 or reading.air_temperature > 45:
-        return True, "Temperature anomaly", "high"
+class InferenceJob(models.Model):
+    """
+    Pending anomaly inference for a sensor reading. Rows are drained in
+    batches by the run_inference_worker command and deleted once processed.
+    """
 
-    if reading.soil_moisture < 10:
-        return True, "Soil moisture too low", "medium"
+    reading = models.OneToOneField(
+        "core.SensorReading", on_delete=models.CASCADE, related_name="inference_job"
+    )
+    enqueued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    # Set after a failed attempt: the job is not retried before this time.
+    not_before = models.DateTimeField(null=True, blank=True)
 
-    if reading.humidity < 20 or reading.humidity > 95:
-        return True, "Humidity anomaly", "low"
+    class Meta:
+        ordering = ["id"]
 
-    return False, None, None
+    def __str__(self):
+        return f"Inference job for reading {self.reading_id}"
+
+
+class BatchInferenceRun(models.Model):
+    """
+    Resumable batch (re)inference over SensorReading, walked in primary-key
+    chunks. ``last_reading_id`` is the checkpoint, committed with each chunk.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    )
+
+    plot = models.ForeignKey(
+        "core.FieldPlot", on_delete=models.CASCADE, null=True, blank=True, related_name="batch_inference_runs"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    chunk_size = models.PositiveIntegerField(default=2000)
+
+    first_reading_id = models.BigIntegerField(null=True, blank=True)
+    max_reading_id = models.BigIntegerField(null=True, blank=True)
+    last_reading_id = models.BigIntegerField(default=0)
+
+    total_processed = models.BigIntegerField(default=0)
+    anomalies_detected = models.BigIntegerField(default=0)
+    events_created = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def progress(self):
+        """
+        Fraction of the primary-key range covered so far (0..1).
+        """
+        if self.status == "completed":
+            return 1.0
+        if self.first_reading_id is None or self.max_reading_id is None:
+            return 0.0
+        span = self.max_reading_id - self.first_reading_id + 1
+        done = max(self.last_reading_id - self.first_reading_id + 1, 0)
+        return round(min(done / span, 1.0), 4) if span > 0 else 1.0
+
+    def __str__(self):
+        return f"Batch inference run {self.pk} ({self.status})"
@@ -4,30 +4,41 @@ Service helpers to run anomaly inference and persist results.
 
 from typing import Dict, Iterable, Optional
 
-from core.models import AnomalyEvent, SensorReading
-from ml.agent_rules import generate_recommendation
-from ml.anomaly_model import detect_anomaly
+from django.db import transaction
+from django.db.models import QuerySet
+
+from core.instrumentation import stage
+from core.models import AgentRecommendation, AnomalyEvent, SensorReading
+from core.services import apply_plot_status_changes, publish_anomalies
+from ml.agent_rules import get_rule_engine
+from ml.anomaly_model import detect_anomaly, detect_readings_batch
 from ml.agent_service import run_agent
+from ml.streaming import StreamingDetector, get_detector, streaming_enabled
 
 
+@stage("ml.inference")
 def run_anomaly_inference(reading):
     """
     Runs ML anomaly detection and triggers the AI agent if anomaly detected.
     """
 
-    is_anomaly, anomaly_type, severity = detect_anomaly(reading)
+    with stage("ml.detect"):
+        is_anomaly, anomaly_type, severity = detect_anomaly(reading)
+
+    # Threshold rules take precedence; streaming detectors still see every reading.
+    with stage("ml.streaming"):
+        streaming_finding = get_detector().observe(reading) if streaming_enabled() else None
+    if not is_anomaly and streaming_finding:
+        is_anomaly = True
+        anomaly_type, severity = streaming_finding
 
     if not is_anomaly:
+        apply_plot_status_changes(readings=[reading])
         return False, None, False
 
-    # Pre-compute recommendation so new anomalies are persisted with message/recommendation/plot.
-    temp_event = AnomalyEvent(
-        reading=reading,
-        plot=getattr(reading, "plot", None),
-        anomaly_type=anomaly_type,
-        severity=severity,
-    )
-    recommended_action, explanation_text = generate_recommendation(temp_event)
+    # Rules are evaluated once; the result fills the event and the AgentRecommendation.
+    with stage("ml.rules"):
+        recommended_action, explanation_text = get_rule_engine().evaluate(anomaly_type, severity, reading)
     default_message = explanation_text or "No message generated."
     default_recommendation = recommended_action or "No recommendation generated."
 
@@ -52,6 +63,7 @@ def run_anomaly_inference(reading):
         created = False
 
     updated_fields = []
+    previous_severity = event.severity
 
     if event.anomaly_type != anomaly_type:
         event.anomaly_type = anomaly_type
@@ -78,26 +90,208 @@ def run_anomaly_inference(reading):
     if updated_fields:
         event.save(update_fields=updated_fields)
 
-    run_agent(event)
+    apply_plot_status_changes(
+        readings=[reading],
+        created_events=[event] if created else (),
+        changed_events=[(event, previous_severity)] if not created and updated_fields else (),
+    )
+    if created:
+        publish_anomalies([(event, reading)])
+
+    with stage("ml.agent"):
+        run_agent(event, recommendation=(recommended_action, explanation_text))
 
     return True, event, created
 
 
-def run_batch_inference(readings: Optional[Iterable[SensorReading]] = None) -> Dict[str, int]:
+READING_FIELDS = ("id", "plot_id", "timestamp", "soil_moisture", "air_temperature", "humidity")
+
+
+def iter_reading_chunks(queryset, chunk_size=2000, after_id=0, max_id=None):
+    """
+    Walk ``queryset`` in primary-key order, ``chunk_size`` rows at a time,
+    fetching only the columns inference needs (no plot loads, no full rows).
+    Yields lists of lightweight SensorReading instances.
+    """
+    queryset = queryset.order_by("pk")
+    if max_id is not None:
+        queryset = queryset.filter(pk__lte=max_id)
+
+    last_id = after_id
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).values_list(*READING_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        yield [SensorReading(**dict(zip(READING_FIELDS, row))) for row in rows]
+        last_id = rows[-1][0]
+
+
+def run_batch_inference(readings: Optional[Iterable[SensorReading]] = None, chunk_size: int = 2000) -> Dict[str, int]:
     """
     Run inference across many readings. Useful for backfilling.
     Returns stats on how many anomalies were found/created.
+
+    Querysets are streamed in primary-key chunks through
+    run_bulk_anomaly_inference, so memory and query count scale with the
+    chunk size rather than the number of readings. Streaming detectors run
+    on a detector of their own, not the live one.
     """
 
-    queryset = readings or SensorReading.objects.all()
+    queryset = SensorReading.objects.all() if readings is None else readings
+    detector = StreamingDetector()
     stats = {"total_processed": 0, "anomalies_detected": 0, "events_created": 0}
 
-    for reading in queryset:
-        stats["total_processed"] += 1
-        is_anomaly, _, created = run_anomaly_inference(reading)
-        if is_anomaly:
-            stats["anomalies_detected"] += 1
-        if created:
-            stats["events_created"] += 1
+    if isinstance(queryset, QuerySet):
+        chunks = iter_reading_chunks(queryset, chunk_size=chunk_size)
+    else:
+        queryset = list(queryset)
+        chunks = (queryset[i:i + chunk_size] for i in range(0, len(queryset), chunk_size))
+
+    for chunk in chunks:
+        chunk_stats = run_bulk_anomaly_inference(chunk, detector=detector)
+        for key in stats:
+            stats[key] += chunk_stats[key]
+
+    return stats
+
+
+@stage("ml.inference")
+def run_bulk_anomaly_inference(
+    readings: Iterable[SensorReading], detector: Optional[StreamingDetector] = None
+) -> Dict[str, int]:
+    """
+    Set-based counterpart of run_anomaly_inference for a batch of readings.
+
+    Detection and recommendation generation happen in memory; events and
+    agent recommendations are written with bulk statements, so the number of
+    queries stays fixed whatever the batch size. Safe to re-run on readings
+    that already have an event (the unique_anomaly_per_reading constraint
+    keeps it idempotent).
+
+    ``detector`` defaults to the process-wide streaming detector, which
+    should only follow newly ingested readings; re-runs over stored history
+    pass their own so live scoring does not depend on which ones ran.
+    """
+
+    readings = list(readings)
+    stats = {"total_processed": len(readings), "anomalies_detected": 0, "events_created": 0}
+
+    with stage("ml.detect"):
+        detected = {
+            reading.pk: (reading, anomaly_type, severity)
+            for reading, anomaly_type, severity in detect_readings_batch(readings)
+        }
+
+    if streaming_enabled():
+        with stage("ml.streaming"):
+            readings_by_id = {reading.pk: reading for reading in readings}
+            for reading_id, (anomaly_type, severity) in (detector or get_detector()).observe_batch(readings).items():
+                detected.setdefault(reading_id, (readings_by_id[reading_id], anomaly_type, severity))
+
+    if not detected:
+        apply_plot_status_changes(readings=readings)
+        return stats
+
+    stats["anomalies_detected"] = len(detected)
+
+    engine = get_rule_engine()
+    with stage("ml.rules"):
+        recommendations = {
+            reading_id: engine.evaluate(anomaly_type, severity, reading)
+            for reading_id, (reading, anomaly_type, severity) in detected.items()
+        }
+
+    with transaction.atomic():
+        existing = {
+            event.reading_id: event
+            for event in AnomalyEvent.objects.filter(reading_id__in=detected.keys())
+        }
+
+        new_events = []
+        changed_events = []
+        changed_fields = set()
+
+        for reading_id, (reading, anomaly_type, severity) in detected.items():
+            recommended_action, explanation_text = recommendations[reading_id]
+            default_message = explanation_text or "No message generated."
+            default_recommendation = recommended_action or "No recommendation generated."
+
+            event = existing.get(reading_id)
+            if event is None:
+                new_events.append(AnomalyEvent(
+                    reading_id=reading_id,
+                    plot_id=reading.plot_id,
+                    anomaly_type=anomaly_type,
+                    severity=severity,
+                    message=default_message,
+                    recommendation=default_recommendation,
+                ))
+                continue
+
+            updated_fields = []
+            previous_severity = event.severity
+            if event.anomaly_type != anomaly_type:
+                event.anomaly_type = anomaly_type
+                updated_fields.append("anomaly_type")
+            if event.severity != severity:
+                event.severity = severity
+                updated_fields.append("severity")
+            if event.plot_id != reading.plot_id:
+                event.plot_id = reading.plot_id
+                updated_fields.append("plot")
+            if not event.message:
+                event.message = default_message
+                updated_fields.append("message")
+            if not event.recommendation:
+                event.recommendation = default_recommendation
+                updated_fields.append("recommendation")
+
+            if updated_fields:
+                changed_events.append((event, previous_severity))
+                changed_fields.update(updated_fields)
+
+        if new_events:
+            # ignore_conflicts guards against a concurrent writer; ids are re-read below.
+            AnomalyEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+
+        if changed_events:
+            AnomalyEvent.objects.bulk_update(
+                [event for event, _ in changed_events], sorted(changed_fields)
+            )
+
+        events = list(
+            AnomalyEvent.objects
+            .filter(reading_id__in=detected.keys())
+            .only("id", "reading_id", "plot_id", "anomaly_type", "severity", "message", "recommendation", "created_at")
+        )
+        existing_ids = {event.pk for event in existing.values()}
+        created_events = [event for event in events if event.pk not in existing_ids]
+        stats["events_created"] = len(created_events)
+
+        apply_plot_status_changes(
+            readings=readings,
+            created_events=created_events,
+            changed_events=changed_events,
+        )
+        publish_anomalies(
+            (event, detected[event.reading_id][0]) for event in sorted(created_events, key=lambda e: e.pk)
+        )
+
+        with stage("ml.agent"):
+            agent_recommendations = []
+            for event in events:
+                recommended_action, explanation_text = recommendations[event.reading_id]
+                agent_recommendations.append(AgentRecommendation(
+                    anomaly_id=event.pk,
+                    recommended_action=recommended_action,
+                    explanation_text=explanation_text,
+                ))
+
+            AgentRecommendation.objects.bulk_create(
+                agent_recommendations,
+                update_conflicts=True,
+                unique_fields=["anomaly"],
+                update_fields=["recommended_action", "explanation_text"],
+            )
 
     return stats
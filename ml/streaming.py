@@ -0,0 +1,233 @@
+# ml/streaming.py
+"""
+Stateful per-plot streaming detectors that run next to the threshold rules.
+
+For every plot and metric the engine keeps O(1) state: a fast EWMA mean and
+variance, a slow EWMA mean, the last value and timestamp, and a counter of
+identical consecutive values. From that it flags:
+
+* spikes      - value far from the EWMA mean (z-score),
+* jumps       - rate of change per minute above a per-metric limit,
+* drift       - fast and slow EWMA means diverging,
+* stuck       - the sensor repeating the exact same value.
+
+State lives in the process that runs inference (normally the single
+run_inference_worker). It is warmed from recent readings the first time a
+plot is seen, and never re-queries history per reading afterwards.
+"""
+
+import math
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+from core.models import SensorReading
+
+METRICS = {
+    # metric: (label used in the anomaly type, max change per minute)
+    "air_temperature": ("Air temperature", 5.0),
+    "humidity": ("Humidity", 15.0),
+    "soil_moisture": ("Soil moisture", 10.0),
+}
+
+# Plots warmed per query; each is one UNION ALL branch.
+WARM_CHUNK_SIZE = 100
+
+
+class MetricState:
+    __slots__ = ("count", "mean", "var", "slow_mean", "last", "repeats")
+
+    def __init__(self, value):
+        self.count = 1
+        self.mean = value
+        self.var = 0.0
+        self.slow_mean = value
+        self.last = value
+        self.repeats = 0
+
+
+class PlotState:
+    __slots__ = ("metrics", "last_timestamp", "last_id")
+
+    def __init__(self):
+        self.metrics = {}
+        self.last_timestamp = None
+        self.last_id = 0
+
+
+class StreamingDetector:
+    def __init__(
+        self,
+        alpha=0.1,
+        slow_alpha=0.01,
+        z_threshold=4.0,
+        drift_threshold=3.0,
+        stuck_after=12,
+        warmup=20,
+        history=60,
+    ):
+        self.alpha = alpha
+        self.slow_alpha = slow_alpha
+        self.z_threshold = z_threshold
+        self.drift_threshold = drift_threshold
+        self.stuck_after = stuck_after
+        self.warmup = warmup
+        self.history = history
+        self.states = {}
+        self._lock = threading.Lock()
+
+    # ---------- state ----------
+
+    def warm(self, plot_ids, before=None):
+        """
+        Seed state for plots not seen yet from their last ``history``
+        readings, WARM_CHUNK_SIZE plots per query. ``before`` maps plot id to
+        the first reading id about to be observed, so it is not replayed twice.
+        """
+        before = before or {}
+        with self._lock:
+            missing = [plot_id for plot_id in plot_ids if plot_id not in self.states]
+            if not missing:
+                return
+            for plot_id in missing:
+                self.states[plot_id] = PlotState()
+
+        for start in range(0, len(missing), WARM_CHUNK_SIZE):
+            rows = self._recent_rows(missing[start:start + WARM_CHUNK_SIZE], before)
+            with self._lock:
+                for row in rows:
+                    reading_id, plot_id, timestamp = row[:3]
+                    self._update(self.states[plot_id], reading_id, timestamp, dict(zip(METRICS, row[3:])))
+
+    def _recent_rows(self, plot_ids, before):
+        """
+        The last ``history`` readings of each plot in (plot, timestamp, id)
+        order: one LIMIT scan per plot on reading_plot_ts_idx, merged into a
+        single UNION ALL where the database can limit each branch.
+        """
+        branches = []
+        for plot_id in plot_ids:
+            queryset = SensorReading.objects.filter(plot_id=plot_id)
+            if plot_id in before:
+                queryset = queryset.filter(pk__lt=before[plot_id])
+            branches.append(
+                queryset.order_by("-timestamp", "-id").values_list("id", "plot_id", "timestamp", *METRICS)[:self.history]
+            )
+
+        if len(branches) > 1 and connections[branches[0].db].features.supports_slicing_ordering_in_compound:
+            rows = list(branches[0].union(*branches[1:], all=True))
+        else:
+            rows = [row for branch in branches for row in branch]
+        return sorted(rows, key=lambda row: (row[1], row[2], row[0]))
+
+    def reset(self):
+        with self._lock:
+            self.states.clear()
+
+    def _update(self, state, reading_id, timestamp, values):
+        findings = []
+        elapsed = None
+        if state.last_timestamp is not None:
+            # Rates are per minute; closer readings are compared as if a minute
+            # apart so bursts (bulk flushes, receive-time stamps) do not explode.
+            elapsed = max((timestamp - state.last_timestamp).total_seconds() / 60.0, 1.0)
+
+        for metric, value in values.items():
+            if value is None or math.isnan(value):
+                continue
+            current = state.metrics.get(metric)
+            if current is None:
+                state.metrics[metric] = MetricState(value)
+                continue
+
+            label, max_rate = METRICS[metric]
+            deviation = value - current.mean
+            std = math.sqrt(current.var)
+
+            if current.count >= self.warmup:
+                if std > 0 and abs(deviation) / std > self.z_threshold:
+                    findings.append((f"{label} spike", "medium"))
+                elif elapsed and abs(value - current.last) / elapsed > max_rate:
+                    findings.append((f"{label} sudden change", "medium"))
+                elif std > 0 and abs(current.mean - current.slow_mean) / std > self.drift_threshold:
+                    findings.append((f"{label} drift", "low"))
+
+            current.repeats = current.repeats + 1 if value == current.last else 0
+            if current.repeats == self.stuck_after:
+                findings.append((f"{label} sensor stuck", "low"))
+
+            # Incremental EWMA mean/variance (West, 1979).
+            increment = self.alpha * deviation
+            current.mean += increment
+            current.var = (1 - self.alpha) * (current.var + deviation * increment)
+            current.slow_mean += self.slow_alpha * (value - current.slow_mean)
+            current.last = value
+            current.count += 1
+
+        state.last_timestamp = timestamp
+        state.last_id = reading_id
+        return findings
+
+    # ---------- detection ----------
+
+    def observe(self, reading):
+        """
+        Fold one reading into its plot state. Returns (anomaly_type, severity)
+        for the most severe finding, or None. Readings at or before the
+        plot's last observed one (replays, late data) are ignored.
+        """
+        self.warm([reading.plot_id], before={reading.plot_id: reading.pk})
+
+        with self._lock:
+            state = self.states[reading.plot_id]
+            if reading.pk is not None and reading.pk <= state.last_id:
+                return None
+            if state.last_timestamp is not None and reading.timestamp < state.last_timestamp:
+                return None
+
+            findings = self._update(
+                state,
+                reading.pk or state.last_id,
+                reading.timestamp,
+                {metric: getattr(reading, metric) for metric in METRICS},
+            )
+
+        if not findings:
+            return None
+        return max(findings, key=lambda finding: finding[1] == "medium")
+
+    def observe_batch(self, readings):
+        """
+        observe() over a batch in (plot, timestamp, id) order, warming every
+        unseen plot with a single query. Returns {reading id: (type, severity)}.
+        """
+        before = {}
+        for reading in readings:
+            if reading.plot_id not in before or reading.pk < before[reading.plot_id]:
+                before[reading.plot_id] = reading.pk
+        self.warm(before.keys(), before=before)
+
+        results = {}
+        for reading in sorted(readings, key=lambda r: (r.plot_id, r.timestamp, r.pk)):
+            finding = self.observe(reading)
+            if finding:
+                results[reading.pk] = finding
+        return results
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def streaming_enabled():
+    return getattr(settings, "ML_STREAMING_DETECTORS", True)
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = StreamingDetector()
+    return _detector
@@ -1,3 +1,537 @@
-from django.test import TestCase
+import datetime
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core.models import AgentRecommendation, AnomalyEvent, FarmProfile, FieldPlot, PlotStatus, SensorReading
+from ml.agent_rules import DEFAULT_RECOMMENDATION, RuleEngine, RuleError, compile_rules
+from ml.anomaly_model import (
+    ANOMALY_TYPES,
+    SEVERITIES,
+    detect_anomaly,
+    detect_anomaly_batch,
+    detect_readings_batch,
+)
+from ml.batch_inference import run_to_completion
+from ml.inference_queue import MAX_ATTEMPTS, drain_inference_queue, enqueue_inference, queue_stats, retry_delay
+from ml.models import BatchInferenceRun, InferenceJob
+from ml.services import run_batch_inference, run_bulk_anomaly_inference
+from ml.streaming import PlotState, StreamingDetector
+
+
+def scalar_results(rows):
+    return [
+        detect_anomaly(SimpleNamespace(soil_moisture=soil, air_temperature=air, humidity=hum))
+        for soil, air, hum in rows
+    ]
+
+
+def batch_results(rows):
+    soil, air, hum = zip(*rows)
+    type_codes, severity_codes = detect_anomaly_batch(soil, air, hum)
+    return [
+        (bool(type_code), ANOMALY_TYPES[type_code], SEVERITIES[severity_code])
+        for type_code, severity_code in zip(type_codes, severity_codes)
+    ]
+
+
+class BatchDetectorParityTests(SimpleTestCase):
+    """
+    detect_anomaly_batch must agree with the scalar detect_anomaly rules.
+    """
+
+    def test_threshold_boundaries(self):
+        soil_values = [-1.0, 0.0, 9.99, 10.0, 50.0, 80.0, 80.01, 120.0, float("nan")]
+        air_values = [-0.01, 0.0, 20.0, 45.0, 45.01, float("nan")]
+        humidity_values = [19.99, 20.0, 60.0, 95.0, 95.01, float("nan")]
+        rows = list(itertools.product(soil_values, air_values, humidity_values))
+
+        self.assertEqual(batch_results(rows), scalar_results(rows))
+
+    def test_random_readings(self):
+        rng = random.Random(1234)
+        rows = [
+            (rng.uniform(-10, 110), rng.uniform(-20, 70), rng.uniform(0, 110))
+            for _ in range(5000)
+        ]
+
+        self.assertEqual(batch_results(rows), scalar_results(rows))
+
+    def test_readings_batch_returns_only_anomalies(self):
+        readings = [
+            SimpleNamespace(soil_moisture=40, air_temperature=20, humidity=60),
+            SimpleNamespace(soil_moisture=5, air_temperature=50, humidity=10),
+            SimpleNamespace(soil_moisture=90, air_temperature=20, humidity=60),
+        ]
+
+        detected = detect_readings_batch(readings)
+
+        self.assertEqual(
+            [(reading, anomaly_type, severity) for reading, anomaly_type, severity in detected],
+            [
+                (readings[1], "Temperature anomaly", "high"),
+                (readings[2], "Soil moisture too high", "medium"),
+            ],
+        )
+
+    def test_empty_batch(self):
+        type_codes, severity_codes = detect_anomaly_batch([], [], [])
+
+        self.assertEqual(len(type_codes), 0)
+        self.assertEqual(len(severity_codes), 0)
+        self.assertEqual(detect_readings_batch([]), [])
+
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def reading(pk, soil_moisture, plot_id=1, minutes=None):
+    # The other metrics wobble slightly so they never look stuck.
+    return SimpleNamespace(
+        pk=pk, plot_id=plot_id, timestamp=START + datetime.timedelta(minutes=pk if minutes is None else minutes),
+        soil_moisture=soil_moisture, air_temperature=20 + pk % 2 / 10, humidity=50 + pk % 2 / 10,
+    )
+
+
+class StreamingDetectorTests(SimpleTestCase):
+    """
+    Findings of the per-plot EWMA detectors, on plots already warmed.
+    """
+
+    def setUp(self):
+        self.detector = StreamingDetector()
+        self.detector.states[1] = PlotState()
+
+    def observe(self, readings):
+        return [self.detector.observe(item) for item in readings]
+
+    def test_spike(self):
+        rng = random.Random(7)
+        findings = self.observe(reading(pk, 40 + rng.uniform(-1, 1)) for pk in range(1, 31))
+        self.assertEqual(findings, [None] * 30)
+
+        self.assertEqual(self.detector.observe(reading(31, 60)), ("Soil moisture spike", "medium"))
+
+    def test_stuck_sensor(self):
+        findings = self.observe(reading(pk, 40) for pk in range(1, 14))
+
+        self.assertEqual(findings[12], ("Soil moisture sensor stuck", "low"))
+        self.assertEqual(findings[:12], [None] * 12)
+
+    def test_sudden_change(self):
+        # Swinging by 20 a minute: normal for the spread, too fast for the rate limit.
+        findings = self.observe(reading(pk, 30 + 20 * (pk % 2)) for pk in range(1, 41))
+
+        self.assertIn(("Soil moisture sudden change", "medium"), findings[25:])
+
+    def test_replays_and_late_readings_are_ignored(self):
+        self.observe(reading(pk, 40 + pk % 3) for pk in range(1, 31))
+        state = self.detector.states[1]
+        count = state.metrics["soil_moisture"].count
+
+        self.assertIsNone(self.detector.observe(reading(30, 90)))
+        self.assertIsNone(self.detector.observe(reading(40, 90, minutes=5)))
+        self.assertEqual(state.metrics["soil_moisture"].count, count)
+
+
+class StreamingWarmTests(TestCase):
+    """
+    warm() seeds each plot from its last ``history`` readings, a chunk of
+    plots per query, whatever the number of plots (an OR of one condition
+    per plot used to overflow SQLite's expression depth at 1000).
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="Farm", location="Test")
+        self.plots = FieldPlot.objects.bulk_create(
+            [FieldPlot(farm=farm, name=f"Plot {i}", size_hectares=1) for i in range(1200)]
+        )
+        rng = random.Random(3)
+        self.readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=plot, timestamp=START + datetime.timedelta(minutes=minute),
+                          soil_moisture=rng.uniform(30, 50), air_temperature=20, humidity=50)
+            for plot in self.plots[:3] for minute in range(80)
+        ])
+
+    def replayed(self, readings, history):
+        detector = StreamingDetector(history=history)
+        detector.states[readings[0].plot_id] = PlotState()
+        for item in readings[-history:]:
+            detector.observe(item)
+        return detector.states[readings[0].plot_id]
+
+    def test_matches_replaying_the_last_readings(self):
+        detector = StreamingDetector(history=30)
+        plot = self.plots[0]
+        readings = sorted((r for r in self.readings if r.plot_id == plot.pk), key=lambda r: r.timestamp)
+        before = readings[-5].pk
+
+        detector.warm([plot.pk], before={plot.pk: before})
+
+        warmed = detector.states[plot.pk]
+        expected = self.replayed(readings[:-5], 30)
+        self.assertEqual(warmed.last_id, readings[-6].pk)
+        for metric, state in expected.metrics.items():
+            self.assertEqual(warmed.metrics[metric].count, 30)
+            self.assertAlmostEqual(warmed.metrics[metric].mean, state.mean)
+            self.assertAlmostEqual(warmed.metrics[metric].var, state.var)
+
+    def test_warms_many_plots(self):
+        detector = StreamingDetector()
+        plot_ids = [plot.pk for plot in self.plots]
+
+        detector.warm(plot_ids)
+
+        self.assertEqual(set(detector.states), set(plot_ids))
+        self.assertEqual(detector.states[self.plots[1].pk].metrics["soil_moisture"].count, detector.history)
+        self.assertEqual(detector.states[self.plots[-1].pk].metrics, {})
+        with self.assertNumQueries(0):
+            detector.warm(plot_ids)
+
+
+class StreamingIsolationTests(TestCase):
+    """
+    Re-runs over stored readings use a detector of their own and leave the
+    live detector's per-plot state alone.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="Farm", location="Test")
+        self.plot = FieldPlot.objects.create(farm=farm, name="Plot", size_hectares=1)
+        rng = random.Random(5)
+        # Steady readings, then a spike the streaming detectors catch.
+        self.readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=self.plot, timestamp=START + datetime.timedelta(minutes=minute),
+                          soil_moisture=40 + rng.uniform(-1, 1) if minute < 60 else 65,
+                          air_temperature=20 + minute % 2 / 10, humidity=50 + minute % 2 / 10)
+            for minute in range(61)
+        ])
+        self.live = StreamingDetector()
+        self.live.warm([self.plot.pk], before={self.plot.pk: self.readings[30].pk})
+        patch = mock.patch("ml.services.get_detector", return_value=self.live)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def snapshot(self):
+        state = self.live.states[self.plot.pk]
+        return state.last_id, {metric: (m.count, m.mean, m.var) for metric, m in state.metrics.items()}
+
+    def test_batch_runs_leave_the_live_detector_alone(self):
+        before = self.snapshot()
+
+        run = BatchInferenceRun.objects.create(plot=self.plot, chunk_size=25)
+        self.assertEqual(run_to_completion(run.pk).status, "completed")
+        run_batch_inference(SensorReading.objects.all(), chunk_size=25)
+
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(set(self.live.states), {self.plot.pk})
+        spike = AnomalyEvent.objects.get(reading=self.readings[-1])
+        self.assertTrue(spike.anomaly_type.startswith("Soil moisture"), spike.anomaly_type)
+
+    def test_live_inference_still_uses_the_live_detector(self):
+        before = self.snapshot()
+        run_bulk_anomaly_inference(self.readings[30:])
+        self.assertEqual(self.live.states[self.plot.pk].last_id, self.readings[-1].pk)
+        self.assertNotEqual(self.snapshot(), before)
+
+
+def if_chain_recommendation(anomaly_type, reading):
+    """
+    The hand-written rules DEFAULT_RULES replaced, for the threshold model's types.
+    """
+    a_type = anomaly_type.lower()
+    if "soil moisture too low" in a_type:
+        return (
+            "Start irrigation for this plot and verify the irrigation system.",
+            f"Soil moisture is very low ({reading.soil_moisture}%). "
+            "This may cause water stress and reduce crop yield. "
+            "Irrigation is recommended and the sensor/irrigation lines should be checked.",
+        )
+    if "soil moisture too high" in a_type:
+        return (
+            "Stop irrigation and check drainage conditions.",
+            f"Soil moisture is unusually high ({reading.soil_moisture}%). "
+            "This can increase risk of root diseases. "
+            "Stop irrigation and inspect drainage / water accumulation.",
+        )
+    if "temperature anomaly" in a_type:
+        if reading.air_temperature > 40:
+            return (
+                "Increase irrigation frequency and consider shading during peak heat.",
+                f"Air temperature is extremely high ({reading.air_temperature}°C). "
+                "Heat stress can affect plant growth. "
+                "Increase irrigation, monitor plants, and consider shading if possible.",
+            )
+        return (
+            "Protect crops from cold (cover plants) and monitor temperature.",
+            f"Air temperature is unusually low ({reading.air_temperature}°C). "
+            "Cold stress may damage crops. "
+            "Use protective covers and monitor the plot closely.",
+        )
+    if "humidity anomaly" in a_type:
+        return (
+            "Inspect sensor calibration and monitor for fungal disease risk.",
+            f"Humidity is abnormal ({reading.humidity}%). "
+            "This may indicate sensor issues or conditions favoring fungal diseases. "
+            "Check sensor and monitor crop health.",
+        )
+    return DEFAULT_RECOMMENDATION["action"], DEFAULT_RECOMMENDATION["explanation"]
+
+
+class RuleEngineTests(SimpleTestCase):
+    """
+    Compiled recommendation rules and hot reloading of ML_AGENT_RULES_FILE.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "rules.json")
+        self.engine = RuleEngine(path=self.path, reload_interval=0)
+        self.reading = SimpleNamespace(soil_moisture=5.0, air_temperature=45.0, humidity=50.0)
+        self.mtime = 1_000_000
+
+    def write(self, content):
+        with open(self.path, "w", encoding="utf-8") as handle:
+            handle.write(content if isinstance(content, str) else json.dumps(content))
+        # A distinct mtime per write, however fast the test runs.
+        self.mtime += 1
+        os.utime(self.path, (self.mtime, self.mtime))
+
+    def rule(self, action="Custom", **extra):
+        return {"type": "Soil moisture too low", "action": action, "explanation": "{soil_moisture}", **extra}
+
+    def test_default_rules_match_the_previous_if_chain(self):
+        engine = RuleEngine()
+        for anomaly_type, severity, air_temperature in itertools.product(
+            [name for name in ANOMALY_TYPES if name] + ["Unknown"], SEVERITIES[1:], (-5.0, 40.0, 40.5),
+        ):
+            reading = SimpleNamespace(soil_moisture=5.0, air_temperature=air_temperature, humidity=97.0)
+            self.assertEqual(
+                engine.evaluate(anomaly_type, severity, reading),
+                if_chain_recommendation(anomaly_type, reading),
+                (anomaly_type, severity, air_temperature),
+            )
+
+    def test_hot_reload(self):
+        self.write([self.rule(), self.rule("Critical", severity="high")])
+        self.assertEqual(self.engine.evaluate("Soil moisture too low", "low", self.reading), ("Custom", "5.0"))
+        self.assertEqual(self.engine.evaluate("Soil moisture too low", "HIGH", self.reading)[0], "Critical")
+
+        self.write({"rules": [self.rule("Edited")], "default": {"action": "Look", "explanation": "{anomaly_type}"}})
+        self.assertEqual(self.engine.evaluate("Soil moisture too low", "low", self.reading)[0], "Edited")
+        self.assertEqual(self.engine.evaluate("Other", "low", self.reading), ("Look", "Other"))
+
+        os.remove(self.path)
+        self.assertEqual(
+            self.engine.evaluate("Soil moisture too low", "low", self.reading)[0],
+            "Start irrigation for this plot and verify the irrigation system.",
+        )
+
+    def test_malformed_files_keep_the_previous_rules(self):
+        self.write([self.rule()])
+        self.engine.evaluate("Soil moisture too low", "low", self.reading)
+
+        malformed = [
+            "{not json",
+            {"default": {}},
+            {"rules": "everything"},
+            ["rule"],
+            [self.rule(when=["air_temperature"])],
+            [self.rule(when={"air_temperature": 40})],
+            [self.rule(when={"air_temperature": {"gt": "40"}})],
+            [self.rule(when={"air_temperature": {"gt": True}})],
+            [self.rule(when={"severity": {"eq": 3}})],
+            [self.rule(when={"wind": {"gt": 3}})],
+            [self.rule(when={"humidity": {"between": 3}})],
+            [self.rule(severity=3)],
+            [self.rule(types="Soil moisture too low")],
+            [self.rule(action="{anomaly_type.missing}")],
+            [self.rule(action="{unknown}")],
+            [self.rule(), {"type": "Humidity anomaly", "action": "Only an action"}],
+            {"rules": [self.rule()], "default": "Monitor"},
+        ]
+        for content in malformed:
+            self.write(content)
+            with self.assertLogs("ml.agent_rules", "ERROR"):
+                result = self.engine.evaluate("Soil moisture too low", "low", self.reading)
+            self.assertEqual(result, ("Custom", "5.0"), content)
+
+    def test_predicates(self):
+        table, _ = compile_rules([
+            self.rule("Dry and hot", when={"air_temperature": {"gte": 40}, "soil_moisture": {"lt": 10}}),
+            self.rule("Dry", when={"anomaly_type": {"eq": "Soil moisture too low"}}),
+        ])
+        dry_and_hot, dry = table[("soil moisture too low", None)]
+        values = {"anomaly_type": "Soil moisture too low", "soil_moisture": 5.0, "air_temperature": 40, "humidity": None}
+
+        self.assertTrue(dry_and_hot.matches(values))
+        self.assertFalse(dry_and_hot.matches({**values, "air_temperature": None}))
+        self.assertTrue(dry.matches(values))
+        with self.assertRaises(RuleError):
+            compile_rules([self.rule(when={"soil_moisture": {"lt": None}})])
+
+
+@override_settings(ML_INFERENCE_MODE="queue", ML_INFERENCE_RETRY_SECONDS=30)
+class InferenceQueueTests(TestCase):
+    """
+    Draining, retries with backoff, dead letters and queue stats.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="Farm", location="Test")
+        self.plot = FieldPlot.objects.create(farm=farm, name="Plot", size_hectares=1)
+        self.readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=self.plot, soil_moisture=soil_moisture, air_temperature=20, humidity=50)
+            for soil_moisture in (5, 40, 90)
+        ])
+        enqueue_inference(self.readings)
+
+    def make_due(self):
+        InferenceJob.objects.update(not_before=timezone.now())
+
+    def test_drain_processes_and_deletes_jobs(self):
+        self.assertEqual(enqueue_inference(self.readings[:1]), 1)
+        self.assertEqual(InferenceJob.objects.count(), 3)
+
+        stats = drain_inference_queue(batch_size=2)
+        self.assertEqual((stats["jobs"], stats["failed"], stats["total_processed"]), (2, 0, 2))
+        stats = drain_inference_queue(batch_size=2)
+        self.assertEqual((stats["jobs"], stats["anomalies_detected"]), (1, 1))
+
+        self.assertFalse(InferenceJob.objects.exists())
+        self.assertEqual(drain_inference_queue()["jobs"], 0)
+        self.assertEqual(queue_stats(), {"depth": 0, "retrying": 0, "failed": 0, "lag_seconds": 0.0})
+
+    def test_failed_batches_back_off_then_dead_letter(self):
+        with mock.patch("ml.inference_queue.run_bulk_anomaly_inference", side_effect=RuntimeError("model down")):
+            with self.assertLogs("ml.inference_queue", "ERROR"):
+                self.assertEqual(drain_inference_queue()["failed"], 3)
+            job = InferenceJob.objects.first()
+            self.assertEqual((job.attempts, job.last_error), (1, "model down"))
+            self.assertAlmostEqual((job.not_before - timezone.now()).total_seconds(), 30, delta=5)
+
+            # Backing off: the next polls leave the jobs alone.
+            self.assertEqual(drain_inference_queue()["jobs"], 0)
+            self.assertEqual(queue_stats()["retrying"], 3)
+
+            for attempt in range(2, MAX_ATTEMPTS + 1):
+                self.make_due()
+                with self.assertLogs("ml.inference_queue", "ERROR"):
+                    self.assertEqual(drain_inference_queue()["failed"], 3)
+            self.assertEqual(set(InferenceJob.objects.values_list("attempts", flat=True)), {MAX_ATTEMPTS})
+
+        self.make_due()
+        self.assertEqual(drain_inference_queue()["jobs"], 0)
+        stats = queue_stats()
+        self.assertEqual((stats["depth"], stats["retrying"], stats["failed"], stats["lag_seconds"]), (3, 0, 3, 0.0))
+
+    def test_recovers_after_a_failure(self):
+        with mock.patch("ml.inference_queue.run_bulk_anomaly_inference", side_effect=RuntimeError("model down")):
+            with self.assertLogs("ml.inference_queue", "ERROR"):
+                drain_inference_queue()
+        self.assertEqual(queue_stats()["retrying"], 3)
+
+        self.make_due()
+        self.assertEqual(drain_inference_queue()["total_processed"], 3)
+        self.assertFalse(InferenceJob.objects.exists())
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual([retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)], [30, 60, 120, 240])
+
+
+class BackfillAnomaliesTests(TestCase):
+    """
+    The backfill_anomalies command's --dry-run, --since and --batch-size.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username="farmer", password="secret")
+        farm = FarmProfile.objects.create(user=user, farm_name="Farm", location="Test")
+        self.plots = [FieldPlot.objects.create(farm=farm, name=f"Plot {i}", size_hectares=1) for i in range(2)]
+        # Alternating plots, and a low soil moisture or a high temperature.
+        readings = SensorReading.objects.bulk_create([
+            SensorReading(plot=self.plots[index % 2], soil_moisture=5 if index % 3 else 40,
+                          air_temperature=20 if index % 3 else 50, humidity=50)
+            for index in range(7)
+        ])
+        self.events = AnomalyEvent.objects.bulk_create([
+            AnomalyEvent(reading=reading, anomaly_type="", severity="") for reading in readings
+        ])
+
+    def backfill(self, **options):
+        output = io.StringIO()
+        call_command("backfill_anomalies", stdout=output, **options)
+        return output.getvalue()
+
+    def rows(self):
+        return list(
+            AnomalyEvent.objects.order_by("pk")
+            .values_list("plot_id", "anomaly_type", "severity", "message", "recommendation")
+        )
+
+    def expected(self, event):
+        reading = event.reading
+        high = reading.air_temperature > 45
+        return (
+            reading.plot_id,
+            "Temperature anomaly" if high else "Soil moisture too low",
+            "high" if high else "medium",
+        )
+
+    def test_dry_run_writes_nothing(self):
+        before = self.rows()
+        output = self.backfill(dry_run=True, batch_size=3)
+        self.assertIn("[dry run] Would update 7 anomalies in 3 chunks", output)
+        self.assertEqual(self.rows(), before)
+        self.assertFalse(AgentRecommendation.objects.exists())
+        self.assertFalse(PlotStatus.objects.exists())
+
+    def test_since_leaves_older_events_alone(self):
+        old, new = self.events[:3], self.events[3:]
+        AnomalyEvent.objects.filter(pk__in=[event.pk for event in old]).update(
+            created_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        self.assertIn("Updated 4 anomalies", self.backfill(since="2026-01-01"))
+
+        rows = dict(zip([event.pk for event in self.events], self.rows()))
+        for event in old:
+            self.assertEqual(rows[event.pk], (None, "", "", "", ""))
+        for event in new:
+            self.assertEqual(rows[event.pk][:3], self.expected(event))
+        self.assertEqual(
+            set(AgentRecommendation.objects.values_list("anomaly_id", flat=True)), {event.pk for event in new}
+        )
+
+        with self.assertRaises(CommandError):
+            self.backfill(since="last week")
+
+    def test_chunks_cover_every_event(self):
+        # Three chunks, each written with several UPDATE ... FROM (VALUES ...) statements.
+        with mock.patch("ml.management.commands.backfill_anomalies.UPDATE_BATCH", 2):
+            self.assertIn("Updated 7 anomalies in 3 chunks", self.backfill(batch_size=3))
+
+        for event, row in zip(AnomalyEvent.objects.select_related("reading").order_by("pk"), self.rows()):
+            self.assertEqual(row[:3], self.expected(event))
+            self.assertTrue(row[3] and row[4])
+        self.assertEqual(AgentRecommendation.objects.count(), 7)
+        self.assertEqual(
+            {status.plot_id: status.high_count + status.medium_count for status in PlotStatus.objects.all()},
+            {self.plots[0].pk: 4, self.plots[1].pk: 3},
+        )
+
+        # A second run finds nothing left to fix.
+        self.assertIn("Updated 0 anomalies in 0 chunks", self.backfill(batch_size=3))
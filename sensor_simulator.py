@@ -1,71 +1,140 @@
+"""
+Sensor simulator and ingest load generator.
+
+Simulates soil moisture, air temperature and humidity sensors for any
+number of virtual plots and sends their readings to the API, then reports
+achieved throughput and latency percentiles. With no options it behaves like
+a live field: one reading per plot of the account every 5 seconds.
+
+    python sensor_simulator.py                              # live simulation
+    python sensor_simulator.py --plots 5000 --rate 2000 \\
+        --mode packed --batch 500 --concurrency 8 --duration 60 --quiet
+
+Modes:
+    single  one JSON POST per reading to /api/sensor-readings/
+    bulk    JSON arrays of --batch readings to /api/ingest/
+    packed  binary records (api/packed.py, version 2) to /api/ingest/
+
+Every reading carries its measurement time and a (device_id, sequence)
+idempotency key, so failed requests are retried without double counting.
+"""
+
+import argparse
 import math
 import random
+import struct
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 
-API_URL = "http://127.0.0.1:8000/api/sensor-readings/"
-PLOTS_URL = "http://127.0.0.1:8000/api/plots/"
-TOKEN_URL = "http://127.0.0.1:8000/api/token/"
-REFRESH_URL = "http://127.0.0.1:8000/api/token/refresh/"
+BASE_URL = "http://127.0.0.1:8000"
+READINGS_PATH = "/api/sensor-readings/"
+INGEST_PATH = "/api/ingest/"
+PLOTS_PATH = "/api/plots/"
+TOKEN_PATH = "/api/token/"
+REFRESH_PATH = "/api/token/refresh/"
 
 USERNAME = "agriculture"
 PASSWORD = "soasoa"
 
 PLOT_FALLBACK = [1, 2, 3]
-PLOT_REFRESH_SECONDS = 5
 FREQUENCY_SECONDS = 5
+REQUEST_TIMEOUT_SECONDS = 30
+
+# Packed record layout, see api/packed.py (version 2): plot_id uint32,
+# ts float64, soil_moisture, air_temperature, humidity float32, sequence uint64.
+PACKED_CONTENT_TYPE = "application/vnd.agri.readings; version=2"
+PACKED_RECORD = struct.Struct("<IdfffQ")
+
+base_url = BASE_URL
+verbose = True
 
 access_token = None
 refresh_token = None
+token_lock = threading.Lock()
 plot_profiles = {}
-active_plot_ids = []
-last_plot_refresh = 0.0
 
 
 # ==========================================
-# TOKEN MANAGEMENT
+# HTTP SESSIONS AND TOKENS
 # ==========================================
 
+_local = threading.local()
+
+
+def get_session(pool_size=1):
+    """
+    One keep-alive Session per thread; requests' connection pool is not
+    meant to be shared across threads.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
 def get_tokens():
     global access_token, refresh_token
-    response = requests.post(TOKEN_URL, json={"username": USERNAME, "password": PASSWORD})
+    response = get_session().post(base_url + TOKEN_PATH, json={"username": USERNAME, "password": PASSWORD})
 
     if response.status_code != 200:
-        print("Error obtaining tokens:", response.text)
-        return
+        raise SystemExit(f"Error obtaining tokens: {response.text}")
 
     data = response.json()
     access_token = data.get("access")
     refresh_token = data.get("refresh")
-    print("New tokens obtained.")
-
-
-def refresh_access():
-    global access_token, refresh_token
-    if not refresh_token:
-        get_tokens()
-        return
-
-    response = requests.post(REFRESH_URL, json={"refresh": refresh_token})
-
-    if response.status_code == 200:
-        access_token = response.json().get("access")
-        print("Access token refreshed.")
-    else:
-        print("Refresh failed, obtaining new tokens...")
-        get_tokens()
-
-
-def build_headers():
-    headers = {"Content-Type": "application/json"}
-    if access_token:
-        headers["Authorization"] = f"Bearer {access_token}"
-    return headers
+    if verbose:
+        print("New tokens obtained.")
+
+
+def refresh_access(rejected_token):
+    """
+    Refresh the shared access token after a 401. Threads that hit the 401
+    with an already replaced token just pick up the new one.
+    """
+    global access_token
+    with token_lock:
+        if access_token != rejected_token:
+            return
+        response = get_session().post(base_url + REFRESH_PATH, json={"refresh": refresh_token})
+        if response.status_code == 200:
+            access_token = response.json().get("access")
+            if verbose:
+                print("Access token refreshed.")
+        else:
+            get_tokens()
+
+
+def auth_headers():
+    return {"Authorization": f"Bearer {access_token}"} if access_token else {}
+
+
+def post(path, **kwargs):
+    """
+    POST with the shared token, refreshing it once on 401.
+    """
+    headers = kwargs.pop("headers", {})
+    token = access_token
+    response = get_session().post(
+        base_url + path, headers={**headers, **auth_headers()}, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs
+    )
+    if response.status_code == 401:
+        refresh_access(token)
+        response = get_session().post(
+            base_url + path, headers={**headers, **auth_headers()}, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs
+        )
+    return response
 
 
 # ==========================================
@@ -86,37 +155,35 @@ def parse_plot_ids(payload):
 
 
 def fetch_plot_ids():
-    response = requests.get(PLOTS_URL, headers=build_headers())
+    token = access_token
+    response = get_session().get(base_url + PLOTS_PATH, headers=auth_headers())
 
     if response.status_code == 401:
-        refresh_access()
-        response = requests.get(PLOTS_URL, headers=build_headers())
+        refresh_access(token)
+        response = get_session().get(base_url + PLOTS_PATH, headers=auth_headers())
 
     if response.status_code != 200:
         print("Failed to fetch plots:", response.text)
         return []
 
     try:
-        return parse_plot_ids(response.json())
+        return sorted(set(parse_plot_ids(response.json())))
     except ValueError:
         return []
 
 
-def refresh_plots(force=False):
-    global active_plot_ids, last_plot_refresh
-    now = time.time()
-    if not force and (now - last_plot_refresh) < PLOT_REFRESH_SECONDS:
-        return active_plot_ids
-
-    last_plot_refresh = now
-    plot_ids = fetch_plot_ids()
-    if not plot_ids:
-        plot_ids = active_plot_ids or PLOT_FALLBACK
+def create_plots(count, concurrency):
+    """
+    Create ``count`` throw-away plots for the account, returning their ids.
+    """
+    def create(index):
+        response = post(PLOTS_PATH, json={"name": f"Load plot {index}", "size_hectares": 1})
+        if response.status_code != 201:
+            raise SystemExit(f"Failed to create a plot: {response.text}")
+        return response.json()["id"]
 
-    active_plot_ids = sorted(set(plot_ids))
-    for plot_id in active_plot_ids:
-        ensure_plot_profile(plot_id)
-    return active_plot_ids
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(create, range(count)))
 
 
 # ==========================================
@@ -201,7 +268,8 @@ def inject_anomaly(temp, hum, moist, rng):
         hum += rng.uniform(-20, 20)
         moist += rng.uniform(-10, 10)
 
-    print(f"ANOMALY INJECTED: {anomaly_type.upper()}")
+    if verbose:
+        print(f"ANOMALY INJECTED: {anomaly_type.upper()}")
     return temp, hum, moist
 
 
@@ -250,51 +318,248 @@ def ensure_unique_values(plot_id, temp, hum, moist, seen):
 # SEND DATA
 # ==========================================
 
-def send_sensor_data(plot_id, temp, hum, moist):
-    headers = build_headers()
+def generate_readings(virtual_plots, plot_ids):
+    """
+    Endless stream of (plot_id, ts, soil_moisture, air_temperature,
+    humidity, sequence), one tick of every virtual plot at a time. Virtual
+    plots are spread round-robin over the real plot ids.
+    """
+    sequence = 0
+    t = 0
+    while True:
+        hour = (t % 144) / 6
+        seen = set()
+        for virtual in range(virtual_plots):
+            ensure_plot_profile(virtual)
+            temp, hum, moist = generate_reading(virtual, hour)
+            temp, hum, moist = ensure_unique_values(virtual, temp, hum, moist, seen)
+            sequence += 1
+            yield (
+                plot_ids[virtual % len(plot_ids)], time.time(),
+                round(moist, 2), round(temp, 2), round(hum, 2), sequence,
+            )
+        t += 1
 
-    payload = {
+
+def reading_payload(reading, device_id):
+    plot_id, ts, moist, temp, hum, sequence = reading
+    return {
+        "plot": plot_id,
+        "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
         "soil_moisture": moist,
         "air_temperature": temp,
         "humidity": hum,
-        "plot": plot_id,
+        "device_id": device_id,
+        "sequence": sequence,
     }
 
-    response = requests.post(API_URL, json=payload, headers=headers)
 
-    if response.status_code == 401:
-        print("Token expired, refreshing...")
-        refresh_access()
-        headers = build_headers()
-        response = requests.post(API_URL, json=payload, headers=headers)
+def pack_readings(readings):
+    """readings: iterable of (plot_id, ts, soil_moisture, air_temperature, humidity, sequence)."""
+    return b"".join(PACKED_RECORD.pack(*reading) for reading in readings)
+
+
+def send_batch(mode, batch, device_id):
+    if mode == "single":
+        return post(READINGS_PATH, json=reading_payload(batch[0], device_id))
+    if mode == "bulk":
+        return post(INGEST_PATH, json=[reading_payload(reading, device_id) for reading in batch])
+    return post(
+        INGEST_PATH,
+        data=pack_readings(batch),
+        headers={"Content-Type": PACKED_CONTENT_TYPE, "X-Device-Id": device_id},
+    )
+
+
+class LoadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.sent = 0
+        self.created = 0
+        self.duplicates = 0
+
+    def record(self, mode, latency, readings, response, retries):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            self.sent += readings
+            if response is None or response.status_code != 201:
+                self.failures += 1
+                return
+            self.latencies.append(latency)
+            if mode == "single":
+                self.created += 1
+                return
+            data = response.json()
+            self.created += data.get("created", 0)
+            self.duplicates += data.get("duplicates", 0)
+
+
+def send_with_retries(mode, batch, device_id, retries):
+    """
+    Send one batch, retrying connection errors and 5xx responses. Readings
+    carry idempotency keys, so a retry of a batch that did land is skipped
+    by the server. Returns (response or None, latency of the last attempt,
+    retries used).
+    """
+    for attempt in range(retries + 1):
+        started = time.perf_counter()
+        try:
+            response = send_batch(mode, batch, device_id)
+        except requests.RequestException as exc:
+            response = None
+            if verbose:
+                print(f"Request failed: {exc}")
+        latency = time.perf_counter() - started
+        if response is not None and response.status_code < 500:
+            break
+    return response, latency, attempt
+
+
+def report_request(mode, batch, response, latency):
+    status = response.status_code if response is not None else "error"
+    if mode == "single":
+        plot_id, _, moist, temp, hum, _ = batch[0]
+        print(f"[PLOT {plot_id}] temp={temp}, hum={hum}, moist={moist} -> Status {status}")
+    else:
+        print(f"[{mode.upper()}] {len(batch)} readings -> Status {status} in {latency * 1000:.1f} ms")
+    if response is not None and response.status_code >= 400:
+        print(response.text[:500])
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def print_report(stats, elapsed, target_rate):
+    latencies = sorted(stats.latencies)
+    target = f"{target_rate:.0f}" if target_rate else "unthrottled"
+    print()
+    print(f"requests   {stats.requests} sent, {stats.failures} failed, {stats.retries} retries")
+    print(f"readings   {stats.sent} sent, {stats.created} created, {stats.duplicates} duplicates")
+    print(
+        f"throughput {stats.created / elapsed:.0f} readings/s (target {target}), "
+        f"{stats.requests / elapsed:.1f} requests/s over {elapsed:.1f} s"
+    )
+    print(
+        f"latency    p50 {percentile(latencies, 0.50) * 1000:.1f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms  "
+        f"max {(latencies[-1] if latencies else 0.0) * 1000:.1f} ms"
+    )
+
+
+def run_load(options, plot_ids):
+    batch_size = 1 if options.mode == "single" else options.batch
+    virtual_plots = options.plots or len(plot_ids)
+    target_rate = options.rate if options.rate is not None else virtual_plots / options.interval
+    device_id = options.device_id or f"sim-{int(time.time())}"
+    readings = generate_readings(virtual_plots, plot_ids)
+    stats = LoadStats()
+
+    print(
+        f"{virtual_plots} virtual plots on {len(plot_ids)} plots, mode {options.mode}, batch {batch_size}, "
+        f"concurrency {options.concurrency}, target {target_rate or 'unthrottled'} readings/s, device {device_id}"
+    )
+
+    # Bounds the batches generated ahead of the senders.
+    slots = threading.BoundedSemaphore(options.concurrency * 2)
+
+    def work(batch):
+        try:
+            response, latency, retries = send_with_retries(options.mode, batch, device_id, options.retries)
+            stats.record(options.mode, latency, len(batch), response, retries)
+            if verbose:
+                report_request(options.mode, batch, response, latency)
+        finally:
+            slots.release()
+
+    started = time.perf_counter()
+    deadline = started + options.duration if options.duration else None
+    remaining = options.readings
+    index = 0
+    try:
+        with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+            while remaining is None or remaining > 0:
+                size = batch_size if remaining is None else min(batch_size, remaining)
+                if target_rate:
+                    # Open-loop schedule: batch i is due at i * batch / rate.
+                    delay = started + index * batch_size / target_rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if deadline and time.perf_counter() >= deadline:
+                    break
+                batch = [next(readings) for _ in range(size)]
+                slots.acquire()
+                executor.submit(work, batch)
+                index += 1
+                if remaining is not None:
+                    remaining -= size
+    except KeyboardInterrupt:
+        print("Stopping, waiting for requests in flight...")
+
+    print_report(stats, time.perf_counter() - started, target_rate)
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=BASE_URL, help="API base URL.")
+    parser.add_argument("--username", default=USERNAME)
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--plots", type=int,
+                        help="Virtual plots to simulate (default: one per plot of the account).")
+    parser.add_argument("--create-plots", action="store_true",
+                        help="Create plots until every virtual plot has its own.")
+    parser.add_argument("--mode", choices=["single", "bulk", "packed"], default="single")
+    parser.add_argument("--batch", type=int, default=500, help="Readings per request in bulk/packed mode.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight.")
+    parser.add_argument("--rate", type=float,
+                        help="Target readings/s, 0 for as fast as possible "
+                             "(default: one reading per virtual plot every --interval seconds).")
+    parser.add_argument("--interval", type=float, default=FREQUENCY_SECONDS,
+                        help="Seconds between readings of one virtual plot.")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    parser.add_argument("--readings", type=int, help="Stop after sending this many readings.")
+    parser.add_argument("--retries", type=int, default=2, help="Retries on connection errors and 5xx.")
+    parser.add_argument("--device-id", help="Idempotency device id (default: unique per run).")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final report.")
+    options = parser.parse_args(argv)
+
+    if options.batch < 1 or options.concurrency < 1 or options.interval <= 0:
+        parser.error("--batch, --concurrency and --interval must be positive.")
+    if options.plots is not None and options.plots < 1:
+        parser.error("--plots must be positive.")
+    return options
+
+
+def main(argv=None):
+    global base_url, verbose, USERNAME, PASSWORD
+    options = parse_args(argv)
+    base_url = options.url.rstrip("/")
+    verbose = not options.quiet
+    USERNAME, PASSWORD = options.username, options.password
 
-    print(f"[PLOT {plot_id}] temp={temp}, hum={hum}, moist={moist} -> Status {response.status_code}")
+    get_tokens()
+    plot_ids = fetch_plot_ids()
+    if options.create_plots and options.plots and len(plot_ids) < options.plots:
+        plot_ids += create_plots(options.plots - len(plot_ids), options.concurrency)
+    if not plot_ids:
+        plot_ids = PLOT_FALLBACK
+
+    run_load(options, plot_ids)
 
 
 # ==========================================
-# MAIN LOOP
+# MAIN
 # ==========================================
 
 if __name__ == "__main__":
-    print("Starting sensor simulator with per-plot data isolation...")
-    get_tokens()
-
-    t = 0
-    refresh_plots(force=True)
-
-    while True:
-        hour = (t % 144) / 6
-        plot_ids = refresh_plots()
-
-        readings_by_plot = {}
-        for plot_id in plot_ids:
-            readings_by_plot[plot_id] = generate_reading(plot_id, hour)
-
-        seen = set()
-        for plot_id in plot_ids:
-            temp, hum, moist = readings_by_plot[plot_id]
-            temp, hum, moist = ensure_unique_values(plot_id, temp, hum, moist, seen)
-            send_sensor_data(plot_id, round(temp, 2), round(hum, 2), round(moist, 2))
-
-        t += 1
-        time.sleep(FREQUENCY_SECONDS)
+    main()